@@ -0,0 +1,181 @@
+import math
+from datetime import datetime
+
+class EwmaStats:
+    """
+    Exponentially weighted running mean and variance of one series, updated in O(1).
+
+    The variance starts from zero, so early on it is scaled up by the weight it is
+    still missing; otherwise ordinary moves right after the start would score
+    as outliers.
+    """
+
+    __slots__ = ('alpha', 'mean', 'variance', 'count', 'decay')
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.variance = 0.0
+        self.count = 0
+        self.decay = 1.0  # (1 - alpha) ** updates, the weight missing from the variance
+
+    def std(self):
+        """
+        Returns the bias-corrected standard deviation, or 0.0 before any variance.
+        """
+        if self.decay >= 1.0:
+            return 0.0
+        return math.sqrt(self.variance / (1.0 - self.decay))
+
+    def update(self, value):
+        """
+        Adds a value and returns its z-score against the statistics before it.
+
+        Returns:
+            float: The z-score, or None while there is no variance yet.
+        """
+        if self.count == 0:
+            self.mean = value
+            self.count = 1
+            return None
+        delta = value - self.mean
+        deviation = self.std()
+        zscore = delta / deviation if deviation > 0 else None
+        self.mean += self.alpha * delta
+        self.variance = (1.0 - self.alpha) * (self.variance + self.alpha * delta * delta)
+        self.decay *= 1.0 - self.alpha
+        self.count += 1
+        return zscore
+
+class SeriesState:
+    """
+    Running statistics of the returns and volumes of one ticker at one bar interval.
+    """
+
+    __slots__ = ('returns', 'volumes', 'last_timestamp', 'last_close', 'last_volume')
+
+    def __init__(self, alpha):
+        self.returns = EwmaStats(alpha)
+        self.volumes = EwmaStats(alpha)
+        self.last_timestamp = None
+        self.last_close = None
+        self.last_volume = None
+
+class AnomalyDetector:
+    """
+    Flags unusual moves in the stream of stock data records as they arrive.
+
+    Every ticker keeps an EWMA mean and variance of its bar returns and of its
+    traded volume, per bar interval, so each record is scored and absorbed in
+    O(1). A record whose return or volume deviates from the running mean by more
+    than the threshold (in standard deviations) raises an alert, once the
+    statistics have seen `warmup` records. After an alert, further alerts of the
+    ticker are suppressed for `cooldown` seconds of record time, while its
+    statistics keep updating.
+
+    Intraday records are complete bars. Daily records are the running day's bar,
+    sent repeatedly; their return is measured from the previous record and their
+    volume is the volume traded since it.
+
+    The first record of a day is measured against the previous session: its
+    return holds the overnight gap and, for daily records, its volume is the
+    day's total so far. Its return is therefore not scored, and neither is the
+    volume of a daily record; the record only becomes the base of the next one.
+    """
+
+    def __init__(self, alpha=0.05, return_threshold=4.0, volume_threshold=4.0, warmup=20, cooldown=900):
+        """
+        Args:
+            alpha (float): Weight of the newest value in the running statistics.
+            return_threshold (float): Absolute z-score of a return that raises an alert.
+            volume_threshold (float): Z-score of a volume that raises an alert; only
+                unusually high volume is flagged.
+            warmup (int): Records a series needs before it can raise alerts.
+            cooldown (float): Seconds after an alert during which a ticker raises no other.
+        """
+        self.alpha = alpha
+        self.return_threshold = return_threshold
+        self.volume_threshold = volume_threshold
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self._series = {}
+        self._last_alert = {}
+        self.suppressed = 0
+
+    @classmethod
+    def from_config(cls, anomaly_config):
+        """
+        Creates the detector from the `data_analyzer.anomaly` configuration section.
+        """
+        return cls(
+            alpha=anomaly_config.get('alpha', 0.05),
+            return_threshold=anomaly_config.get('return_threshold', 4.0),
+            volume_threshold=anomaly_config.get('volume_threshold', 4.0),
+            warmup=anomaly_config.get('warmup', 20),
+            cooldown=anomaly_config.get('cooldown', 900)
+        )
+
+    def observe(self, record):
+        """
+        Scores a stock data record and updates the statistics of its ticker.
+
+        Args:
+            record (dict): A stock data record with ticker, close, volume and an ISO timestamp.
+
+        Returns:
+            dict: A compact alert event, or None.
+        """
+        close = record.get('close')
+        if close is None:
+            return None
+        ticker = record['ticker']
+        interval = record.get('interval') or '1d'
+        key = (ticker, interval)
+        state = self._series.get(key)
+        if state is None:
+            state = self._series[key] = SeriesState(self.alpha)
+        timestamp = datetime.fromisoformat(record['timestamp']).replace(tzinfo=None)
+        if state.last_timestamp is not None and timestamp <= state.last_timestamp:
+            # Replays and out-of-order records would distort the statistics
+            return None
+
+        volume = record.get('volume') or 0
+        same_day = state.last_timestamp is not None and state.last_timestamp.date() == timestamp.date()
+        change = close / state.last_close - 1.0 if same_day and state.last_close else None
+        if interval == '1d':
+            traded = max(volume - (state.last_volume or 0), 0) if same_day else None
+        else:
+            traded = volume
+        state.last_timestamp, state.last_close, state.last_volume = timestamp, close, volume
+
+        returns_ready = state.returns.count >= self.warmup
+        volumes_ready = state.volumes.count >= self.warmup
+        return_z = state.returns.update(change) if change is not None else None
+        volume_z = state.volumes.update(float(traded)) if traded is not None else None
+        reasons = []
+        if returns_ready and return_z is not None and abs(return_z) >= self.return_threshold:
+            reasons.append('return')
+        if volumes_ready and volume_z is not None and volume_z >= self.volume_threshold:
+            reasons.append('volume')
+        if not reasons:
+            return None
+
+        last_alert = self._last_alert.get(ticker)
+        if last_alert is not None and (timestamp - last_alert).total_seconds() < self.cooldown:
+            self.suppressed += 1
+            return None
+        self._last_alert[ticker] = timestamp
+        return {
+            'ticker': ticker,
+            'timestamp': record['timestamp'],
+            'interval': interval,
+            'reasons': reasons,
+            'close': close,
+            'return': change,
+            'return_z': return_z,
+            'volume': traded,
+            'volume_z': volume_z,
+        }
+
+    def __len__(self):
+        return len(self._series)
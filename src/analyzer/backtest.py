@@ -0,0 +1,355 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python src/analyzer/backtest.py --years 10 --fast 5 50 5 --slow 10 200 20 --workers 32 --store
+# deactivate
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from multiprocessing import shared_memory
+import numpy as np
+from psycopg2.extras import execute_values
+
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from db.pool import get_db_connection
+
+# Load configuration from JSON file
+config_path = os.path.join(os.path.dirname(__file__), '../../config/config.json')
+with open(config_path, 'r') as config_file:
+    config = json.load(config_file)
+
+backtest_config = config.get('backtest', {})
+
+STRATEGY = 'ma_crossover'
+TRADING_DAYS = 252
+
+CLOSES_QUERY = """
+SELECT ticker, date, close
+FROM stock_data
+WHERE ticker = ANY(%s) AND date >= %s AND date < %s
+ORDER BY ticker, date
+"""
+
+INSERT_RUN_QUERY = """
+INSERT INTO backtest_runs (strategy, start_date, end_date, ticker_count, cost_bps)
+VALUES (%s, %s, %s, %s, %s)
+RETURNING id
+"""
+
+INSERT_RESULTS_QUERY = """
+INSERT INTO backtest_results (run_id, fast_window, slow_window, total_return, annual_return,
+                              sharpe, max_drawdown, turnover)
+VALUES %s
+"""
+
+def load_close_matrix(tickers, start, end):
+    """
+    Loads the daily closes of many tickers with a single query into a days x tickers matrix.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        start (date): First day of the history.
+        end (date): Day after the last day of the history.
+
+    Returns:
+        tuple: The ticker symbols, the trading days and the float matrix, NaN where a
+            ticker has no bar on a day.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CLOSES_QUERY, (list(tickers), start, end))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    return rows_to_close_matrix(rows)
+
+def rows_to_close_matrix(rows):
+    """
+    Pivots (ticker, date, close) rows into a days x tickers matrix of closes.
+    """
+    if not rows:
+        return [], [], np.empty((0, 0))
+    symbols, columns = np.unique(np.array([row[0] for row in rows]), return_inverse=True)
+    days, index = np.unique(np.array([row[1] for row in rows]), return_inverse=True)
+    matrix = np.full((len(days), len(symbols)), np.nan)
+    matrix[index, columns] = np.array([row[2] for row in rows], dtype=float)
+    return symbols.tolist(), days.tolist(), matrix
+
+def forward_fill(matrix):
+    """
+    Carries the last close of every ticker over the days it has no bar; leading gaps stay NaN.
+    """
+    index = np.where(np.isnan(matrix), 0, np.arange(len(matrix))[:, None])
+    np.maximum.accumulate(index, axis=0, out=index)
+    return matrix[index, np.arange(matrix.shape[1])]
+
+class RollingMeans:
+    """
+    Moving averages of every column of a close matrix for any window, from one cumulative sum.
+
+    A window's averages are computed on first use and cached, so a sweep over many
+    parameter pairs computes each distinct window once.
+    """
+
+    def __init__(self, closes):
+        """
+        Args:
+            closes (numpy.ndarray): Days x tickers matrix of forward-filled closes.
+        """
+        valid = ~np.isnan(closes)
+        zeros = np.zeros((1, closes.shape[1]))
+        self.sums = np.vstack((zeros, np.cumsum(np.where(valid, closes, 0.0), axis=0)))
+        self.counts = np.vstack((zeros, np.cumsum(valid, axis=0)))
+        self._cache = {}
+
+    def __call__(self, window):
+        if window not in self._cache:
+            means = np.full(self.sums.shape, np.nan)[1:]
+            if window <= len(means):
+                total = self.sums[window:] - self.sums[:-window]
+                full = (self.counts[window:] - self.counts[:-window]) == window
+                means[window - 1:] = np.where(full, total / window, np.nan)
+            self._cache[window] = means
+        return self._cache[window]
+
+def crossover_positions(means, fast, slow):
+    """
+    Long while the fast moving average is above the slow one, flat otherwise.
+
+    Returns:
+        numpy.ndarray: Days x tickers matrix of positions (0 or 1) held after each close.
+    """
+    # Comparisons with NaN are False, so there is no position before both averages exist
+    return (means(fast) > means(slow)).astype(float)
+
+def strategy_returns(closes, positions, cost_bps=0.0):
+    """
+    Daily returns of holding `positions`, net of trading costs, and the traded volume.
+
+    The position taken at a close earns the return to the next close, so a signal
+    is never traded on the bar it was computed from.
+
+    Args:
+        closes (numpy.ndarray): Days x tickers matrix of forward-filled closes.
+        positions (numpy.ndarray): Days x tickers matrix of positions.
+        cost_bps (float): Cost of trading one unit of position, in basis points.
+
+    Returns:
+        tuple: The (days - 1) x tickers matrix of net returns, the matching matrix of
+            position changes and the mask of ticker-days with a return.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        asset_returns = closes[1:] / closes[:-1] - 1.0
+    active = ~np.isnan(asset_returns)
+    trades = np.abs(np.diff(positions, axis=0, prepend=0.0))[:-1]
+    returns = np.where(active, positions[:-1] * np.nan_to_num(asset_returns) - trades * cost_bps / 1e4, 0.0)
+    return returns, np.where(active, trades, 0.0), active
+
+def performance(returns, periods=TRADING_DAYS):
+    """
+    Summarizes a daily return series.
+
+    Returns:
+        dict: Total and annualized return, annualized Sharpe ratio and maximum drawdown.
+    """
+    if len(returns) == 0:
+        return {'total_return': 0.0, 'annual_return': 0.0, 'sharpe': 0.0, 'max_drawdown': 0.0}
+    equity = np.cumprod(1.0 + returns)
+    total_return = equity[-1] - 1.0
+    deviation = returns.std()
+    annual_return = (1.0 + total_return) ** (periods / len(returns)) - 1.0 if total_return > -1 else -1.0
+    return {
+        'total_return': float(total_return),
+        'annual_return': float(annual_return),
+        'sharpe': float(returns.mean() / deviation * np.sqrt(periods)) if deviation > 0 else 0.0,
+        'max_drawdown': float((equity / np.maximum.accumulate(equity) - 1.0).min()),
+    }
+
+def evaluate(closes, means, fast, slow, cost_bps=0.0):
+    """
+    Backtests one parameter pair on an equally weighted portfolio of every ticker.
+
+    Returns:
+        dict: The parameters, the performance of the portfolio and its annual turnover,
+            i.e. the average number of full position changes per ticker and year.
+    """
+    returns, trades, active = strategy_returns(closes, crossover_positions(means, fast, slow), cost_bps)
+    # Equal weights over the tickers that have a return on the day
+    held = active.sum(axis=1)
+    portfolio = returns.sum(axis=1) / np.maximum(held, 1)
+    years = len(returns) / TRADING_DAYS
+    result = {'fast_window': fast, 'slow_window': slow}
+    result.update(performance(portfolio))
+    result['turnover'] = float(trades.sum() / max(closes.shape[1], 1) / years) if years > 0 else 0.0
+    return result
+
+def sweep(closes, pairs, cost_bps=0.0):
+    """
+    Backtests several parameter pairs over one close matrix, sharing the moving averages.
+
+    Returns:
+        list: The result of `evaluate` for every pair.
+    """
+    means = RollingMeans(closes)
+    return [evaluate(closes, means, fast, slow, cost_bps) for fast, slow in pairs]
+
+def _sweep_shared(name, shape, pairs, cost_bps):
+    """
+    Worker entry point: attaches to the shared close matrix and backtests a group of pairs.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        closes = np.ndarray(shape, dtype=float, buffer=block.buf)
+        results = sweep(closes, pairs, cost_bps)
+        # The buffer cannot be released while an array still points into it
+        del closes
+        return results
+    finally:
+        block.close()
+
+def parameter_pairs(fast_windows, slow_windows):
+    """
+    Returns every (fast, slow) pair of the two window lists with fast < slow.
+    """
+    return [(fast, slow) for fast in fast_windows for slow in slow_windows if fast < slow]
+
+def run_sweep(closes, pairs, cost_bps=0.0, workers=None, pairs_per_task=4):
+    """
+    Backtests many parameter pairs in parallel.
+
+    The close matrix is written once into shared memory; each worker process attaches
+    to it and receives only its group of pairs. Pairs are grouped by fast window so
+    a task computes each of its moving averages once.
+
+    Args:
+        closes (numpy.ndarray): Days x tickers matrix of forward-filled closes.
+        pairs (list): (fast, slow) window pairs.
+        cost_bps (float): Cost of trading one unit of position, in basis points.
+        workers (int): Number of worker processes; defaults to the number of CPUs,
+            and 1 runs the sweep in this process.
+        pairs_per_task (int): Number of pairs backtested by one task.
+
+    Returns:
+        list: The result of `evaluate` for every pair, in the order of `pairs`.
+    """
+    workers = workers or os.cpu_count()
+    if workers <= 1 or len(pairs) <= 1:
+        return sweep(closes, pairs, cost_bps)
+
+    order = sorted(range(len(pairs)), key=lambda i: pairs[i])
+    groups = [order[start:start + pairs_per_task] for start in range(0, len(order), pairs_per_task)]
+    block = shared_memory.SharedMemory(create=True, size=max(closes.nbytes, 1))
+    try:
+        shared = np.ndarray(closes.shape, dtype=float, buffer=block.buf)
+        shared[:] = closes
+        del shared
+        # Spawned workers do not inherit the parent's threads, sockets or locks
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_sweep_shared, block.name, closes.shape, [pairs[i] for i in group], cost_bps)
+                       for group in groups]
+            results = [None] * len(pairs)
+            for group, future in zip(groups, futures):
+                for i, result in zip(group, future.result()):
+                    results[i] = result
+    finally:
+        block.close()
+        block.unlink()
+    return results
+
+def store_backtest(start, end, ticker_count, cost_bps, results):
+    """
+    Stores a sweep as one backtest run with a result row per parameter pair.
+
+    Returns:
+        int: The id of the run.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(INSERT_RUN_QUERY, (STRATEGY, start, end, ticker_count, cost_bps))
+        run_id = cursor.fetchone()[0]
+        execute_values(cursor, INSERT_RESULTS_QUERY, [
+            (run_id, r['fast_window'], r['slow_window'], r['total_return'], r['annual_return'],
+             r['sharpe'], r['max_drawdown'], r['turnover'])
+            for r in results
+        ], page_size=max(len(results), 1))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return run_id
+
+def run_backtest(tickers, start, end, pairs, cost_bps=0.0, workers=None, pairs_per_task=4, store=False):
+    """
+    Loads the history once and sweeps the crossover strategy over every parameter pair.
+
+    Returns:
+        dict: The results sorted by Sharpe ratio, the run id if stored, and timings.
+    """
+    started = time.perf_counter()
+    symbols, days, closes = load_close_matrix(tickers, start, end)
+    closes = forward_fill(closes)
+    loaded = time.perf_counter()
+    results = run_sweep(closes, pairs, cost_bps, workers, pairs_per_task)
+    elapsed = time.perf_counter() - loaded
+    print(f"Backtested {len(pairs)} parameter pairs on {len(symbols)} tickers x {len(days)} days "
+          f"in {elapsed:.1f}s (history loaded in {loaded - started:.1f}s)")
+    run_id = store_backtest(start, end, len(symbols), cost_bps, results) if store else None
+    return {
+        'run_id': run_id,
+        'results': sorted(results, key=lambda r: r['sharpe'], reverse=True),
+        'elapsed': elapsed,
+    }
+
+def window_range(values):
+    """
+    Expands a [start, stop, step] window specification into a list of windows.
+    """
+    if len(values) == 1:
+        return [values[0]]
+    step = values[2] if len(values) > 2 else 1
+    return list(range(values[0], values[1] + 1, step))
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the moving-average crossover over stored history.")
+    parser.add_argument('--tickers', nargs='*', help="Tickers to backtest (default: data_collector.stocks)")
+    parser.add_argument('--years', type=int, default=backtest_config.get('years', 10), help="Years of history")
+    parser.add_argument('--fast', type=int, nargs='+', default=backtest_config.get('fast_windows', [5]),
+                        help="Fast windows as START [STOP [STEP]]")
+    parser.add_argument('--slow', type=int, nargs='+', default=backtest_config.get('slow_windows', [10]),
+                        help="Slow windows as START [STOP [STEP]]")
+    parser.add_argument('--cost-bps', type=float, default=backtest_config.get('cost_bps', 5.0),
+                        help="Trading cost per unit of position, in basis points")
+    parser.add_argument('--workers', type=int, default=backtest_config.get('workers'),
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument('--store', action='store_true', help="Store the results in backtest_results")
+    parser.add_argument('--top', type=int, default=10, help="Number of best parameter pairs to print")
+    args = parser.parse_args()
+
+    end = date.today()
+    start = end - timedelta(days=round(365.25 * args.years))
+    pairs = parameter_pairs(window_range(args.fast), window_range(args.slow))
+    report = run_backtest(args.tickers or config['data_collector']['stocks'], start, end, pairs,
+                          cost_bps=args.cost_bps, workers=args.workers,
+                          pairs_per_task=backtest_config.get('pairs_per_task', 4), store=args.store)
+    if report['run_id'] is not None:
+        print(f"Stored as backtest run {report['run_id']}")
+    print(f"{'fast':>5} {'slow':>5} {'return':>9} {'annual':>8} {'sharpe':>7} {'drawdown':>9} {'turnover':>9}")
+    for r in report['results'][:args.top]:
+        print(f"{r['fast_window']:>5} {r['slow_window']:>5} {r['total_return']:>9.2%} {r['annual_return']:>8.2%} "
+              f"{r['sharpe']:>7.2f} {r['max_drawdown']:>9.2%} {r['turnover']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
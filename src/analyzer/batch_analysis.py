@@ -0,0 +1,137 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python src/analyzer/batch_analysis.py --chunk-size 1000
+# deactivate
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from analyzer.data_analyzer import WARM_START_QUERY, config, data_analyzer_config, get_parallel_analyzer
+from analyzer.parallel import run_parallel_analysis
+from db.pool import get_db_connection
+from analyzer.storage import store_analysis_rows
+
+WINDOWS = (5, 10)
+
+def load_closes(tickers, days):
+    """
+    Loads the trailing `days` closes of many tickers with a single query.
+
+    The query reads each ticker's newest rows from the covering index with a
+    LATERAL LIMIT, so a whole-universe run does not scan every ticker's history.
+
+    Returns:
+        list: (ticker, date, close) rows ordered by ticker and date.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(WARM_START_QUERY, (list(tickers), days))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+def rows_to_matrix(rows, days):
+    """
+    Arranges (ticker, date, close) rows into a tickers x days matrix of closes.
+
+    Each ticker's closes are right-aligned, so the last column holds every ticker's
+    latest close; tickers with a shorter history are padded with NaN on the left.
+
+    Args:
+        rows (list): (ticker, date, close) rows ordered by ticker and date, at most `days` per ticker.
+        days (int): Number of columns.
+
+    Returns:
+        tuple: The ticker symbols and the float matrix.
+    """
+    if not rows:
+        return [], np.empty((0, days))
+    tickers = np.array([row[0] for row in rows])
+    closes = np.array([row[2] for row in rows], dtype=float)
+    symbols, starts, inverse, counts = np.unique(tickers, return_index=True, return_inverse=True,
+                                                 return_counts=True)
+    # Position of every row within its ticker, shifted so the newest lands in the last column
+    positions = np.arange(len(rows)) - starts[inverse] + (days - counts[inverse])
+    matrix = np.full((len(symbols), days), np.nan)
+    matrix[inverse, positions] = closes
+    return symbols.tolist(), matrix
+
+def latest_moving_averages(matrix, windows=WINDOWS):
+    """
+    Computes the latest moving averages of every row of a close matrix at once.
+
+    Returns:
+        dict: For every window, an array with one average per row; NaN where the
+            history is shorter than the window.
+    """
+    return {window: matrix[:, -window:].mean(axis=1) for window in windows}
+
+def build_results(symbols, averages, analysis_date):
+    """
+    Builds the (ticker, analysis_date, analysis_type, values) rows of `store_analysis_rows`.
+    """
+    # One row of (ma5, ma10) per ticker, NaN where the history is too short
+    matrix = np.column_stack([averages[window] for window in WINDOWS])
+    values = np.where(np.isnan(matrix), None, matrix).tolist()
+    return [(ticker, analysis_date, 'moving_average', values[i]) for i, ticker in enumerate(symbols)]
+
+def run_batch_analysis(tickers, chunk_size=1000):
+    """
+    Analyzes the whole universe, one chunk of tickers per query and bulk insert.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        chunk_size (int): Number of tickers loaded and stored together.
+
+    Returns:
+        dict: The number of tickers analyzed, the elapsed seconds and the tickers per second.
+    """
+    days = max(WINDOWS)
+    analysis_date = datetime.now().date().isoformat()
+    analyzed = 0
+    started = time.perf_counter()
+    for start in range(0, len(tickers), chunk_size):
+        symbols, matrix = rows_to_matrix(load_closes(tickers[start:start + chunk_size], days), days)
+        if symbols:
+            store_analysis_rows(build_results(symbols, latest_moving_averages(matrix), analysis_date))
+        analyzed += len(symbols)
+    elapsed = time.perf_counter() - started
+    rate = analyzed / elapsed if elapsed > 0 else 0.0
+    print(f"Batch analysis of {analyzed} tickers took {elapsed:.2f}s ({rate:.0f} tickers/s)")
+    return {'tickers': analyzed, 'elapsed': elapsed, 'rate': rate}
+
+def run_scheduled_batch_analysis():
+    """
+    Runs the batch analysis over the configured universe; used by the analyzer's schedule.
+    """
+    batch_config = data_analyzer_config.get('batch', {})
+    try:
+        run_batch_analysis(config['data_collector']['stocks'], batch_config.get('chunk_size', 1000))
+        # The other indicators need the full bars, so they run on the process pool if there is one
+        indicators = [name for name in data_analyzer_config.get('indicators', []) if name != 'moving_average']
+        analyzer = get_parallel_analyzer()
+        if indicators and analyzer is not None:
+            run_parallel_analysis(analyzer, config['data_collector']['stocks'], indicators, store_analysis_rows,
+                                  data_analyzer_config['parallel'].get('chunk_size', 5000))
+    except Exception as e:
+        print(f"Batch analysis failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze every ticker in vectorized batches.")
+    parser.add_argument('--tickers', nargs='*', help="Tickers to analyze (default: data_collector.stocks)")
+    parser.add_argument('--chunk-size', type=int, default=data_analyzer_config.get('batch', {}).get('chunk_size', 1000),
+                        help="Tickers per query and bulk insert")
+    args = parser.parse_args()
+    run_batch_analysis(args.tickers or config['data_collector']['stocks'], args.chunk_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import time
+
+class TickerCoalescer:
+    """
+    Collapses any number of updates per ticker into at most one analysis per interval.
+
+    Incoming updates only mark their ticker dirty. A dirty ticker becomes due once
+    `interval` seconds have passed since its last analysis, so the analysis work per
+    interval is bounded by the number of tickers, not by the number of messages.
+    Updates that arrive while a ticker is being analyzed mark it dirty again.
+    """
+
+    def __init__(self, interval):
+        """
+        Args:
+            interval (float): Minimum seconds between two analyses of the same ticker.
+        """
+        self.interval = interval
+        self.dirty = {}
+        self.last_run = {}
+
+    def mark(self, tickers):
+        """
+        Marks tickers as updated, keeping the order in which they were first marked.
+        """
+        for ticker in tickers:
+            self.dirty.setdefault(ticker, None)
+
+    def due(self, now=None):
+        """
+        Returns the dirty tickers whose interval has passed and clears their dirty mark.
+
+        Args:
+            now (float): Current time.monotonic() value; defaults to now.
+
+        Returns:
+            list: The tickers to analyze now.
+        """
+        now = time.monotonic() if now is None else now
+        due = [ticker for ticker in self.dirty
+               if ticker not in self.last_run or now - self.last_run[ticker] >= self.interval]
+        for ticker in due:
+            del self.dirty[ticker]
+            self.last_run[ticker] = now
+        return due
+
+    def pending(self):
+        """
+        Returns the number of dirty tickers waiting for their interval.
+        """
+        return len(self.dirty)
@@ -0,0 +1,236 @@
+import os
+from datetime import date
+import numpy as np
+
+class RollingCovariance:
+    """
+    Rolling covariance and correlation of the daily returns of a fixed ticker universe.
+
+    The latest `window` return vectors are kept in a ring buffer together with the
+    running sum of the returns and of their outer products. Adding a day is a
+    rank-one update of the cross-product matrix and evicting the oldest day the
+    matching downdate, so a day costs O(n^2) instead of the O(window * n^2) of a
+    recomputation. The sums are recomputed from the buffer once per lap so
+    floating-point drift cannot build up.
+
+    Closes arrive per ticker through `observe`; the closes of a day are committed
+    as one return vector when the first close of a later day arrives. A ticker
+    without a close on a day carries its previous close, i.e. a zero return.
+    """
+
+    def __init__(self, tickers, window=60, min_periods=20):
+        """
+        Args:
+            tickers (list): The ticker universe, in matrix order.
+            window (int): Number of daily returns in the rolling window.
+            min_periods (int): Returns needed before correlations are reported.
+        """
+        self.tickers = list(tickers)
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.window = window
+        self.min_periods = min_periods
+        size = len(self.tickers)
+        self.buffer = np.zeros((window, size))
+        self.head = 0  # Row the next return vector is written to
+        self.count = 0
+        self.sums = np.zeros(size)
+        self.products = np.zeros((size, size))
+        self.last_closes = np.full(size, np.nan)
+        self.day = None
+        self.closes = np.full(size, np.nan)  # Closes of the day in progress
+        self._correlation = None
+
+    def observe(self, ticker, day, close):
+        """
+        Records the latest close of a ticker on a day.
+
+        Returns:
+            bool: True if the close started a new day and the previous day was committed.
+        """
+        i = self.index.get(ticker)
+        if i is None or close is None:
+            return False
+        committed = False
+        if self.day is None:
+            self.day = day
+        elif day > self.day:
+            self.commit_day()
+            self.day = day
+            committed = True
+        elif day < self.day:
+            return False
+        self.closes[i] = close
+        return committed
+
+    def commit_day(self):
+        """
+        Turns the closes of the day in progress into a return vector and adds it to the window.
+        """
+        closes = np.where(np.isnan(self.closes), self.last_closes, self.closes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = closes / self.last_closes - 1.0
+        had_history = not np.isnan(self.last_closes).all()
+        self.last_closes = closes
+        self.closes = np.full(len(self.tickers), np.nan)
+        if had_history:
+            self.add(np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0))
+
+    def add(self, returns):
+        """
+        Adds one day's return vector, evicting the oldest one once the window is full.
+        """
+        if self.count == self.window:
+            oldest = self.buffer[self.head]
+            self.sums -= oldest
+            self.products -= np.outer(oldest, oldest)
+        self.sums += returns
+        self.products += np.outer(returns, returns)
+        self.buffer[self.head] = returns
+        self.head = (self.head + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        if self.head == 0:
+            rows = self.buffer[:self.count]
+            self.sums = rows.sum(axis=0)
+            self.products = rows.T @ rows
+        self._correlation = None
+
+    def covariance(self):
+        """
+        Returns the sample covariance matrix of the returns in the window, or None before two days.
+        """
+        if self.count < 2:
+            return None
+        return (self.products - np.outer(self.sums, self.sums) / self.count) / (self.count - 1)
+
+    def correlation(self):
+        """
+        Returns the correlation matrix, computed once per update; NaN for tickers without
+        variance. None before `min_periods` returns.
+        """
+        if self.count < max(self.min_periods, 2):
+            return None
+        if self._correlation is None:
+            covariance = self.covariance()
+            deviation = np.sqrt(np.clip(np.diag(covariance), 0.0, None))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                correlation = covariance / np.outer(deviation, deviation)
+            self._correlation = np.clip(correlation, -1.0, 1.0)
+        return self._correlation
+
+    def peers(self, ticker, k=10):
+        """
+        Returns the k tickers most correlated with a ticker as (peer, correlation) tuples.
+        """
+        correlation = self.correlation()
+        if correlation is None or ticker not in self.index:
+            return []
+        return [(self.tickers[j], value) for j, value in top_correlated(correlation, self.index[ticker], k)]
+
+    def warm_start(self, closes):
+        """
+        Replaces the state with a history of closes.
+
+        Args:
+            closes (numpy.ndarray): Days x tickers matrix of forward-filled closes, oldest first.
+        """
+        self.__init__(self.tickers, self.window, self.min_periods)
+        if len(closes) == 0:
+            return
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = closes[1:] / closes[:-1] - 1.0
+        for row in np.nan_to_num(returns[-self.window:], nan=0.0, posinf=0.0, neginf=0.0):
+            self.add(row)
+        self.last_closes = closes[-1].copy()
+
+    def save(self, path):
+        """
+        Writes a snapshot of the state to an .npz file atomically.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, tickers=np.array(self.tickers), window=self.window, min_periods=self.min_periods,
+                 buffer=self.buffer, head=self.head, count=self.count, last_closes=self.last_closes,
+                 day=np.array('' if self.day is None else self.day.isoformat()), closes=self.closes)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Restores a snapshot written by `save`.
+        """
+        with np.load(path) as snapshot:
+            rolling = cls(snapshot['tickers'].tolist(), int(snapshot['window']), int(snapshot['min_periods']))
+            rolling.buffer = snapshot['buffer']
+            rolling.head = int(snapshot['head'])
+            rolling.count = int(snapshot['count'])
+            rolling.last_closes = snapshot['last_closes']
+            rolling.closes = snapshot['closes']
+            day = str(snapshot['day'])
+        rolling.day = date.fromisoformat(day) if day else None
+        rows = rolling.buffer[:rolling.count]
+        rolling.sums = rows.sum(axis=0)
+        rolling.products = rows.T @ rows
+        return rolling
+
+def top_correlated(correlation, i, k=10):
+    """
+    Returns the k columns most correlated with column i, highest first.
+
+    Args:
+        correlation (numpy.ndarray): The correlation matrix.
+        i (int): Index of the ticker whose peers are wanted.
+        k (int): Number of peers.
+
+    Returns:
+        list: (index, correlation) tuples.
+    """
+    row = np.where(np.isnan(correlation[i]), -np.inf, correlation[i])
+    row[i] = -np.inf
+    k = min(k, int(np.isfinite(row).sum()))
+    if k <= 0:
+        return []
+    # Partial selection of the k largest, then only those are sorted
+    best = np.argpartition(row, -k)[-k:]
+    best = best[np.argsort(row[best])[::-1]]
+    return [(int(j), float(row[j])) for j in best]
+
+class CorrelationSnapshotCache:
+    """
+    Correlation matrix of the latest snapshot file, kept in memory for readers such as
+    the API server and reloaded only when the file changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self.tickers = {}
+        self.names = []
+        self.correlation = None
+
+    def get(self):
+        """
+        Returns the ticker index and the correlation matrix, or (None, None) without a snapshot.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+        if mtime != self._mtime:
+            rolling = RollingCovariance.load(self.path)
+            self.names = rolling.tickers
+            self.tickers = dict(rolling.index)
+            self.correlation = rolling.correlation()
+            self._mtime = mtime
+        return self.tickers, self.correlation
+
+    def peers(self, ticker, k=10):
+        """
+        Returns the k tickers most correlated with a ticker as (peer, correlation) tuples,
+        or None if the ticker is not in the snapshot.
+        """
+        tickers, correlation = self.get()
+        if correlation is None or ticker not in tickers:
+            return None
+        return [(self.names[j], value) for j, value in top_correlated(correlation, tickers[ticker], k)]
@@ -5,10 +5,22 @@
 
 import json
 import pika
-import psycopg2
 import os
-from datetime import datetime
-import pandas as pd
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from messaging.codec import decode_message
+from db.pool import get_db_connection, register_prepared
+from analyzer.coalescer import TickerCoalescer
+from analyzer.incremental import MovingAverageEngine
+from analyzer.indicators import INDICATORS, PriceArray, compute, lookback
+from analyzer.storage import analysis_row, store_analysis_rows, sync_analysis_types
+from analyzer.anomaly import AnomalyDetector
+from collector.publisher import PersistentPublisher
 
 # Load configuration from JSON file
 config_path = os.path.join(os.path.dirname(__file__), '../../config/config.json')
@@ -18,7 +30,6 @@ with open(config_path, 'r') as config_file:
 # Configuration parameters
 rabbitmq_config = config['rabbitmq']
 data_analyzer_config = config['data_analyzer']
-db_config = config['data_recorder']['database']
 
 # RabbitMQ connection parameters
 RABBITMQ_USER = rabbitmq_config['user']
@@ -26,27 +37,54 @@ RABBITMQ_PASS = rabbitmq_config['password']
 RABBITMQ_HOST = rabbitmq_config['host']
 RABBITMQ_PORT = rabbitmq_config['port']
 EXCHANGE = 'stockvision_exchange'
-QUEUE = 'stock_data_queue'
+EXCHANGE_TYPE = 'topic'
+ROUTING_KEY = 'stock.data'
+# The analyzer gets its own copy of every message instead of competing with the recorder
+QUEUE = 'stock_analysis_queue'
+# Alerts go back to the exchange, for consumers that bind their own queues to this key
+ALERT_ROUTING_KEY = 'stock.alert'
 
-# PostgreSQL connection parameters
-DB_HOST = db_config['host']
-DB_PORT = db_config['port']
-DB_USER = db_config['user']
-DB_PASSWORD = db_config['password']
-DB_NAME = db_config['dbname']
+# Analyze every ticker at most once per interval, however many updates arrive
+coalescer = TickerCoalescer(data_analyzer_config.get('analysis_interval', 300))
 
-# PostgreSQL connection setup
-def get_db_connection():
-    """
-    Establishes and returns a connection to the PostgreSQL database.
-    """
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        dbname=DB_NAME
-    )
+# Indicators computed for every analyzed ticker; moving averages come from the engine
+INDICATOR_TYPES = [name for name in data_analyzer_config.get('indicators', ['moving_average'])
+                   if name != 'moving_average']
+unknown = set(INDICATOR_TYPES) - set(INDICATORS)
+if unknown:
+    raise ValueError(f"Unknown indicators in data_analyzer.indicators: {sorted(unknown)}")
+
+# Moving averages kept up to date from the message stream
+engine = MovingAverageEngine(windows=(5, 10))
+
+# Process pool for large sets of due tickers, created on first use
+parallel_config = data_analyzer_config.get('parallel', {})
+_parallel_analyzer = None
+
+# Rolling return correlations of the universe, set up by start_correlations if enabled
+correlation_config = data_analyzer_config.get('correlation', {})
+correlations = None
+
+# Streaming detection of unusual moves, and the publisher of its alerts, created on first use
+anomaly_config = data_analyzer_config.get('anomaly', {})
+detector = AnomalyDetector.from_config(anomaly_config) if anomaly_config.get('enabled', False) else None
+_alert_publisher = None
+
+# Hot query of every analysis, prepared once per pooled connection
+register_prepared('analyzer_recent_stock_data', """
+    SELECT date, open, high, low, close, volume
+    FROM stock_data
+    WHERE ticker = $1
+    ORDER BY date DESC
+    LIMIT 30
+""")
+register_prepared('analyzer_price_history', """
+    SELECT date, open, high, low, close, volume
+    FROM stock_data
+    WHERE ticker = $1
+    ORDER BY date DESC
+    LIMIT $2
+""")
 
 # RabbitMQ connection setup
 def get_rabbitmq_connection():
@@ -60,110 +98,333 @@ def get_rabbitmq_connection():
         credentials=credentials
     ))
 
-# Function to perform analysis on stock data
-def analyze_stock_data(ticker):
+# Latest closes of many tickers at once, used to warm-start the engine. Each
+# ticker reads only its newest rows from the covering (ticker, date DESC) index,
+# so the cost does not grow with the length of the history
+WARM_START_QUERY = """
+SELECT tickers.ticker, recent.date, recent.close
+FROM (SELECT DISTINCT unnest(%s::varchar[]) AS ticker) tickers
+CROSS JOIN LATERAL (
+    SELECT date, close
+    FROM stock_data
+    WHERE stock_data.ticker = tickers.ticker
+    ORDER BY date DESC
+    LIMIT %s
+) recent
+ORDER BY tickers.ticker, recent.date
+"""
+
+def warm_start_engine(tickers):
     """
-    Retrieves the last 30 days of stock data for a given ticker, performs analysis
-    (calculates moving averages), and returns the analysis result.
+    Loads the recent closes of many tickers into the engine with a single query.
+
+    Args:
+        tickers (list): The stock ticker symbols.
     """
     conn = get_db_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute(WARM_START_QUERY, (list(tickers), engine.size))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    history = {}
+    for ticker, date, close in rows:
+        history.setdefault(ticker, []).append((date, close))
+    for ticker, closes in history.items():
+        engine.warm_start(ticker, closes)
+    print(f"Warm-started moving averages of {len(history)} tickers")
 
-    # Query to get the last 30 days of stock data
-    query = """
-    SELECT date, open, high, low, close, volume
-    FROM stock_data
-    WHERE ticker = %s
-    ORDER BY date DESC
-    LIMIT 30
+def moving_average_result(ticker):
     """
-    cursor.execute(query, (ticker,))
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    Returns the analysis result of a ticker from the engine's current state.
+    """
+    analysis_result = {
+        'ticker': ticker,
+        'analysis_date': datetime.now().date().isoformat(),
+    }
+    analysis_result.update(engine.averages(ticker))
+    return analysis_result
+
+# Function to perform analysis on stock data
+def analyze_stock_data(ticker):
+    """
+    Retrieves the last 30 days of stock data for a given ticker, warm-starts the
+    moving-average engine with them in chronological order, and returns the analysis result.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Query to get the last 30 days of stock data
+        conn.execute_prepared(cursor, 'analyzer_recent_stock_data', (ticker,))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
 
     if not rows:
         print(f"No data found for ticker {ticker}")
         return None
 
-    # Convert the data to a DataFrame
-    df = pd.DataFrame(rows, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
-    df['date'] = pd.to_datetime(df['date'])
+    # The query returns the newest rows first; the averages need them oldest first
+    closes = sorted((date, close) for date, open, high, low, close, volume in rows)
+    engine.warm_start(ticker, closes)
+    return moving_average_result(ticker)
 
-    # Perform analysis (e.g., calculate moving averages)
-    df['ma5'] = df['close'].rolling(window=5).mean()
-    df['ma10'] = df['close'].rolling(window=10).mean()
+def analyze_indicators(ticker, names):
+    """
+    Computes registered indicators of a ticker from one read of its price history.
 
-    # Handle NaN values
-    ma5 = df['ma5'].iloc[-1]
-    ma10 = df['ma10'].iloc[-1]
-    if pd.isna(ma5):
-        ma5 = None
-    if pd.isna(ma10):
-        ma10 = None
+    Args:
+        ticker (str): The stock ticker symbol.
+        names (list): Analysis types of the indicators.
 
-    # Prepare analysis results
-    analysis_result = {
-        'ticker': ticker,
-        'analysis_date': datetime.now().date().isoformat(),
-        'ma5': ma5,
-        'ma10': ma10
-    }
+    Returns:
+        list: One analysis result per indicator, with its analysis type in 'analysis_type'.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        conn.execute_prepared(cursor, 'analyzer_price_history', (ticker, lookback(names)))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    if not rows:
+        return []
 
-    return analysis_result
+    # Oldest first, in one array shared by every indicator
+    prices = PriceArray.from_rows(sorted(rows))
+    analysis_date = datetime.now().date().isoformat()
+    results = []
+    for name, values in compute(prices, names).items():
+        result = {'ticker': ticker, 'analysis_date': analysis_date, 'analysis_type': name}
+        result.update(values)
+        results.append(result)
+    return results
 
 # Function to store analysis results into the PostgreSQL database
-def store_analysis_result(result):
+def store_analysis_result(result, analysis_type='moving_average'):
     """
-    Stores the analysis result in the PostgreSQL database.
+    Stores the analysis result in the PostgreSQL database, updating the ticker's row
+    of the day in analysis_values and its latest result in analysis_latest.
+
+    Args:
+        result (dict): The analysis result, with its ticker and analysis date.
+        analysis_type (str): Type of the analysis, e.g. 'moving_average' or 'rsi'.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    insert_query = """
-    INSERT INTO stock_analysis (ticker, analysis_date, analysis_type, result)
-    VALUES (%s, %s, %s, %s)
-    """
-    cursor.execute(insert_query, (
-        result['ticker'],
-        result['analysis_date'],
-        'moving_average',
-        json.dumps(result)
-    ))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    store_analysis_rows([analysis_row(result, analysis_type)])
     print(f"Stored analysis result for {result['ticker']} on {result['analysis_date']}")
 
 # Function to process messages from RabbitMQ
 def callback(ch, method, properties, body):
     """
     Callback function to process messages received from RabbitMQ.
-    Extracts the ticker from the message, performs analysis, and stores the results.
+    Extracts the tickers from the message and marks them for analysis.
+    """
+    # A message holds one JSON record or many records in the binary format
+    tickers = []
+    alerts = []
+    for stock_data in decode_message(body, properties):
+        if detector is not None:
+            alert = detector.observe(stock_data)
+            if alert:
+                alerts.append(alert)
+        # Intraday bars do not change the daily history the analysis is based on
+        if stock_data.get('interval'):
+            continue
+        ticker = stock_data['ticker']
+        # Tickers the engine does not know yet are warm-started from the database when due
+        if ticker in engine and 'close' in stock_data:
+            engine.update(ticker, datetime.fromisoformat(stock_data['timestamp']).date(), stock_data['close'])
+        tickers.append(ticker)
+        if correlations is not None and 'close' in stock_data:
+            day = datetime.fromisoformat(stock_data['timestamp']).date()
+            # The first close of a new day commits the previous one; keep a snapshot of every day
+            if correlations.observe(ticker, day, stock_data['close']):
+                correlations.save(correlation_config['snapshot_path'])
+    coalescer.mark(tickers)
+    if alerts:
+        publish_alerts(alerts)
+
+def get_alert_publisher():
+    """
+    Returns the long-lived publisher of alert events, creating it on first use.
+    """
+    global _alert_publisher
+    if _alert_publisher is None:
+        _alert_publisher = PersistentPublisher(get_rabbitmq_connection, EXCHANGE, ALERT_ROUTING_KEY)
+    return _alert_publisher
+
+def publish_alerts(alerts):
+    """
+    Publishes alert events to the exchange under the `stock.alert` routing key and
+    confirms them together.
+
+    Args:
+        alerts (list): Alert events of the AnomalyDetector.
+
+    Returns:
+        int: The number of alerts confirmed by the broker.
     """
-    stock_data = json.loads(body)
-    ticker = stock_data['ticker']
-    print(f"Received message for ticker: {ticker}")
+    publisher = get_alert_publisher()
+    properties = pika.BasicProperties(content_type='application/json')
+    try:
+        for alert in alerts:
+            publisher.publish(json.dumps(alert), properties=properties)
+        confirmed = publisher.commit()
+    except Exception as e:
+        # Alerts are only useful while fresh, so they are not kept for a later retry
+        print(f"Error publishing alerts: {e}; dropped {publisher.discard_pending()} alerts")
+        return 0
+    for alert in alerts:
+        print(f"Alert for {alert['ticker']} at {alert['timestamp']}: unusual {' and '.join(alert['reasons'])}")
+    return confirmed
+
+def get_parallel_analyzer():
+    """
+    Returns the process pool of the analyzer, or None unless `data_analyzer.parallel.workers` is above 1.
+    """
+    global _parallel_analyzer
+    if _parallel_analyzer is None and parallel_config.get('workers', 1) > 1:
+        from analyzer.parallel import ParallelAnalyzer
+        _parallel_analyzer = ParallelAnalyzer(parallel_config['workers'], parallel_config.get('tickers_per_task', 250))
+    return _parallel_analyzer
+
+def run_due_analyses():
+    """
+    Analyzes the updated tickers whose analysis interval has passed and stores the results
+    of all of them with one bulk upsert, in a single transaction.
+
+    A ticker whose analysis fails is logged and marked again, so it is retried after
+    its interval while the consumer keeps running; if the write fails, every due
+    ticker is.
+
+    Returns:
+        int: The number of tickers analyzed.
+    """
+    tickers = coalescer.due()
+    # Large sets of due tickers are handed to the process pool
+    analyzer = get_parallel_analyzer() if INDICATOR_TYPES else None
+    in_parallel = analyzer is not None and len(tickers) >= parallel_config.get('min_tickers', 500)
+    rows = []
+    failed = []
+    for ticker in tickers:
+        try:
+            # Perform analysis, reading the database only for tickers the engine has not seen yet
+            analysis_result = moving_average_result(ticker) if ticker in engine else analyze_stock_data(ticker)
+            if analysis_result:
+                rows.append(analysis_row(analysis_result, 'moving_average'))
+            if INDICATOR_TYPES and not in_parallel:
+                for result in analyze_indicators(ticker, INDICATOR_TYPES):
+                    rows.append(analysis_row(result, result['analysis_type']))
+        except Exception as e:
+            print(f"Error analyzing {ticker}: {e}")
+            failed.append(ticker)
+    if in_parallel:
+        try:
+            rows.extend(analyzer.analyze(tickers, INDICATOR_TYPES) or [])
+        except Exception as e:
+            print(f"Error analyzing indicators of {len(tickers)} tickers: {e}")
+            failed = list(tickers)
+    if rows:
+        try:
+            store_analysis_rows(rows)
+        except Exception as e:
+            print(f"Error storing {len(rows)} analysis results: {e}")
+            failed = list(tickers)
+    coalescer.mark(failed)
+    if tickers:
+        print(f"Analyzed {len(tickers)} tickers; {coalescer.pending()} waiting for their interval")
+    return len(tickers)
+
+def start_correlations(tickers):
+    """
+    Sets up the rolling correlations of the universe if `data_analyzer.correlation` is enabled,
+    from the latest snapshot if it covers the same tickers, or else from the stored history.
+
+    Returns:
+        RollingCovariance: The correlations, or None.
+    """
+    global correlations
+    if not correlation_config.get('enabled', False):
+        return None
+    from analyzer.correlation import RollingCovariance
+    from analyzer.backtest import forward_fill, load_close_matrix
+
+    path = correlation_config['snapshot_path']
+    window = correlation_config.get('window', 60)
+    if os.path.exists(path):
+        snapshot = RollingCovariance.load(path)
+        if snapshot.tickers == list(tickers) and snapshot.window == window:
+            correlations = snapshot
+            print(f"Restored correlations of {len(tickers)} tickers from {path}")
+            return correlations
+
+    correlations = RollingCovariance(tickers, window, correlation_config.get('min_periods', 20))
+    # Enough calendar days to cover the window's trading days
+    end = datetime.now().date()
+    symbols, days, closes = load_close_matrix(tickers, end - timedelta(days=window * 2 + 14), end)
+    history = np.full((len(days), len(tickers)), np.nan)
+    for column, ticker in enumerate(symbols):
+        history[:, correlations.index[ticker]] = closes[:, column]
+    correlations.warm_start(forward_fill(history)[-(window + 1):])
+    correlations.save(path)
+    print(f"Warm-started correlations of {len(tickers)} tickers over {correlations.count} days")
+    return correlations
+
+def start_batch_schedule():
+    """
+    Schedules the vectorized whole-universe analysis if `data_analyzer.batch` is enabled.
+
+    Returns:
+        BackgroundScheduler: The running scheduler, or None.
+    """
+    batch_config = data_analyzer_config.get('batch', {})
+    if not batch_config.get('enabled', False):
+        return None
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from analyzer.batch_analysis import run_scheduled_batch_analysis
 
-    # Perform analysis
-    analysis_result = analyze_stock_data(ticker)
-    if analysis_result:
-        store_analysis_result(analysis_result)
+    scheduler = BackgroundScheduler(job_defaults={'coalesce': True, 'max_instances': 1})
+    scheduler.add_job(run_scheduled_batch_analysis, 'interval', seconds=batch_config.get('schedule_interval', 3600))
+    scheduler.start()
+    return scheduler
 
 # Function to start consuming messages from RabbitMQ
 def start_analyzing():
     """
-    Starts consuming messages from the RabbitMQ queue and processes them using the callback function.
+    Starts consuming messages from the analyzer's RabbitMQ queue, marking updated tickers with
+    the callback function and running the analyses that are due in between.
     """
     connection = get_rabbitmq_connection()
     channel = connection.channel()
+    channel.exchange_declare(exchange=EXCHANGE, exchange_type=EXCHANGE_TYPE, durable=True)
     channel.queue_declare(queue=QUEUE, durable=True)
-    channel.basic_consume(queue=QUEUE, on_message_callback=callback, auto_ack=True)
+    channel.queue_bind(exchange=EXCHANGE, queue=QUEUE, routing_key=ROUTING_KEY)
+    sync_analysis_types()
+    warm_start_engine(config['data_collector']['stocks'])
+    start_correlations(config['data_collector']['stocks'])
+    scheduler = start_batch_schedule()
     print(f"Waiting for messages from {QUEUE}. To exit press CTRL+C")
     try:
-        channel.start_consuming()
+        # Updates only mark tickers, so losing unprocessed ones on a crash costs nothing
+        for method, properties, body in channel.consume(QUEUE, auto_ack=True, inactivity_timeout=1):
+            if method is not None:
+                callback(channel, method, properties, body)
+            run_due_analyses()
     except KeyboardInterrupt:
-        channel.stop_consuming()
+        channel.cancel()
     finally:
+        if scheduler is not None:
+            scheduler.shutdown(wait=False)
+        if _parallel_analyzer is not None:
+            _parallel_analyzer.close()
+        if correlations is not None:
+            correlations.save(correlation_config['snapshot_path'])
+        if _alert_publisher is not None:
+            _alert_publisher.close()
         connection.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+class RingBuffer:
+    """
+    Fixed-size ring buffer of the latest daily closes of one ticker, with a running
+    sum over each moving-average window.
+
+    Appending a new day, or revising the close of the latest day, updates every
+    running sum in O(1) per window, without touching older values.
+    """
+
+    def __init__(self, size, windows):
+        """
+        Args:
+            size (int): Number of closes kept; at least the largest window.
+            windows (tuple): Lengths of the moving-average windows.
+        """
+        self.size = size
+        self.windows = windows
+        self.values = [0.0] * size
+        self.count = 0
+        self.head = 0  # Slot the next value is written to
+        self.sums = {window: 0.0 for window in windows}
+        self.last_date = None
+
+    def _at(self, offset):
+        """
+        Returns the value `offset` positions back from the latest one (0 is the latest).
+        """
+        return self.values[(self.head - 1 - offset) % self.size]
+
+    def append(self, value):
+        for window in self.windows:
+            if self.count >= window:
+                self.sums[window] -= self._at(window - 1)
+            self.sums[window] += value
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        if self.head == 0:
+            # Recompute the sums once per lap so floating-point drift cannot build up
+            for window in self.windows:
+                self.sums[window] = sum(self._at(offset) for offset in range(min(window, self.count)))
+
+    def replace_last(self, value):
+        delta = value - self._at(0)
+        for window in self.windows:
+            self.sums[window] += delta
+        self.values[(self.head - 1) % self.size] = value
+
+    def mean(self, window):
+        """
+        Returns the moving average over the latest `window` closes, or None if there are fewer.
+        """
+        if self.count < window:
+            return None
+        return self.sums[window] / window
+
+class MovingAverageEngine:
+    """
+    Incremental moving averages of the daily close for every ticker.
+
+    Every ticker keeps a ring buffer of its latest closes, in chronological order.
+    A record of a new day appends to it; further records of the same day (the
+    collector sends the running day's bar repeatedly) revise the latest close.
+    Records older than the latest day are ignored. Running sums make every update
+    O(1), so no database read is needed once a ticker has been warm-started.
+    """
+
+    def __init__(self, windows=(5, 10)):
+        """
+        Args:
+            windows (tuple): Lengths of the moving-average windows, e.g. (5, 10) for MA5 and MA10.
+        """
+        self.windows = tuple(windows)
+        self.size = max(self.windows)
+        self.buffers = {}
+
+    def __contains__(self, ticker):
+        return ticker in self.buffers
+
+    def warm_start(self, ticker, rows):
+        """
+        Replaces the state of a ticker with its recent history.
+
+        Args:
+            ticker (str): The stock ticker symbol.
+            rows (list): (date, close) tuples in chronological order.
+        """
+        buffer = RingBuffer(self.size, self.windows)
+        self.buffers[ticker] = buffer
+        for day, close in rows[-self.size:]:
+            buffer.append(float(close))
+            buffer.last_date = day
+
+    def update(self, ticker, day, close):
+        """
+        Applies the close of one day to a ticker in O(1).
+
+        Args:
+            ticker (str): The stock ticker symbol.
+            day (date): The trading day of the close.
+            close (float): The close, or latest price, of that day.
+
+        Returns:
+            bool: False if the record was older than the latest day and ignored.
+        """
+        buffer = self.buffers.get(ticker)
+        if buffer is None:
+            buffer = self.buffers[ticker] = RingBuffer(self.size, self.windows)
+        if buffer.last_date is not None:
+            if day < buffer.last_date:
+                return False
+            if day == buffer.last_date:
+                buffer.replace_last(float(close))
+                return True
+        buffer.append(float(close))
+        buffer.last_date = day
+        return True
+
+    def averages(self, ticker):
+        """
+        Returns the moving averages of a ticker, e.g. {'ma5': 101.2, 'ma10': None}.
+        """
+        buffer = self.buffers[ticker]
+        return {f'ma{window}': buffer.mean(window) for window in self.windows}
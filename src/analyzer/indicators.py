@@ -0,0 +1,210 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Columns of the shared price array
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# Registered indicators by analysis type
+INDICATORS = {}
+
+# Rows of an exponential recurrence that are solved in closed form at a time;
+# short enough that the growing weights cannot overflow or lose precision
+EWM_BLOCK = 128
+
+class Indicator:
+    """
+    A registered indicator: a function of the price columns, the names of its
+    outputs and the number of trailing rows (its lookback) it needs for a stable
+    latest value.
+    """
+
+    def __init__(self, name, func, outputs, lookback, description):
+        self.name = name
+        self.func = func
+        self.outputs = tuple(outputs)
+        self.lookback = lookback
+        self.description = description
+
+    def __call__(self, prices):
+        return self.func(prices)
+
+def register(name, outputs, lookback, description=''):
+    """
+    Decorator that registers an indicator function under an analysis type.
+
+    The function receives a PriceArray and returns a dict of output series, all of
+    the length of the price array.
+
+    Args:
+        name (str): Analysis type the results are stored under.
+        outputs (tuple): Names of the output series, in their storage order.
+        lookback (int): Trailing rows needed to compute the latest value.
+        description (str): Description of the analysis type.
+    """
+    def decorator(func):
+        INDICATORS[name] = Indicator(name, func, outputs, lookback, description)
+        return func
+    return decorator
+
+class PriceArray:
+    """
+    Daily bars of one ticker in a single (days x 5) float array, oldest first.
+
+    The columns are exposed as views, so every indicator reads the same memory.
+    """
+
+    def __init__(self, data):
+        """
+        Args:
+            data (numpy.ndarray): Array of shape (days, 5) with the PRICE_FIELDS columns.
+        """
+        self.data = np.asarray(data, dtype=float)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds the array from (date, open, high, low, close, volume) rows in chronological order.
+        """
+        data = np.array([row[1:6] for row in rows], dtype=float).reshape(-1, len(PRICE_FIELDS))
+        return cls(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getattr__(self, name):
+        if name in PRICE_FIELDS:
+            return self.data[:, PRICE_FIELDS.index(name)]
+        raise AttributeError(name)
+
+def ewm(values, alpha):
+    """
+    Exponentially weighted mean y[t] = alpha * x[t] + (1 - alpha) * y[t - 1], y[0] = x[0]
+    (pandas' ewm(adjust=False)), solved in closed form block by block instead of a
+    Python loop over the rows. NaN values at the start are skipped.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return out
+    first = valid[0]
+    decay = 1.0 - alpha
+    previous = values[first]
+    out[first] = previous
+    for start in range(first + 1, len(values), EWM_BLOCK):
+        block = values[start:start + EWM_BLOCK]
+        powers = decay ** np.arange(1, len(block) + 1)
+        # y[k] = decay^(k+1) * previous + alpha * sum_j decay^(k-j) x[j]
+        out[start:start + len(block)] = powers * (previous + alpha * np.cumsum(block / powers))
+        previous = out[start + len(block) - 1]
+    return out
+
+def rolling(values, window):
+    """
+    Returns a read-only (len - window + 1, window) view of the trailing windows, without copying.
+    """
+    return sliding_window_view(values, window)
+
+def _pad(values, length):
+    """
+    Left-pads a series computed over full windows to the length of the price array.
+    """
+    return np.concatenate((np.full(length - len(values), np.nan), values))
+
+def rolling_mean(values, window):
+    if len(values) < window:
+        return np.full(len(values), np.nan)
+    return _pad(rolling(values, window).mean(axis=1), len(values))
+
+def rolling_std(values, window):
+    if len(values) < window:
+        return np.full(len(values), np.nan)
+    return _pad(rolling(values, window).std(axis=1, ddof=1), len(values))
+
+@register('moving_average', outputs=('ma5', 'ma10'), lookback=10,
+          description="Simple moving averages of the close over 5 and 10 days")
+def moving_average(prices):
+    return {'ma5': rolling_mean(prices.close, 5), 'ma10': rolling_mean(prices.close, 10)}
+
+@register('ema', outputs=('ema12', 'ema26'), lookback=80,
+          description="Exponential moving averages of the close over 12 and 26 days")
+def ema(prices):
+    return {'ema12': ewm(prices.close, 2 / 13), 'ema26': ewm(prices.close, 2 / 27)}
+
+@register('rsi', outputs=('rsi14',), lookback=60,
+          description="14-day relative strength index with Wilder smoothing")
+def rsi(prices, period=14):
+    change = np.diff(prices.close, prepend=np.nan)
+    gain = ewm(np.clip(change, 0, None), 1 / period)
+    loss = ewm(np.clip(-change, 0, None), 1 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    return {'rsi14': value}
+
+@register('macd', outputs=('macd', 'signal', 'histogram'), lookback=100,
+          description="MACD (12, 26) with a 9-day signal line")
+def macd(prices):
+    line = ewm(prices.close, 2 / 13) - ewm(prices.close, 2 / 27)
+    signal = ewm(line, 2 / 10)
+    return {'macd': line, 'signal': signal, 'histogram': line - signal}
+
+@register('bollinger', outputs=('middle', 'upper', 'lower'), lookback=20,
+          description="Bollinger Bands over 20 days at 2 standard deviations")
+def bollinger(prices, window=20, width=2.0):
+    middle = rolling_mean(prices.close, window)
+    deviation = rolling_std(prices.close, window)
+    return {'middle': middle, 'upper': middle + width * deviation, 'lower': middle - width * deviation}
+
+@register('atr', outputs=('atr14',), lookback=60,
+          description="14-day average true range with Wilder smoothing")
+def atr(prices, period=14):
+    previous_close = np.concatenate(([np.nan], prices.close[:-1]))
+    true_range = np.fmax(prices.high - prices.low,
+                         np.fmax(np.abs(prices.high - previous_close), np.abs(prices.low - previous_close)))
+    return {'atr14': ewm(true_range, 1 / period)}
+
+@register('vwap', outputs=('vwap20',), lookback=20,
+          description="Volume-weighted average of the typical price over 20 days")
+def vwap(prices, window=20):
+    typical = (prices.high + prices.low + prices.close) / 3.0
+    if len(typical) < window:
+        return {'vwap20': np.full(len(typical), np.nan)}
+    traded = rolling(typical * prices.volume, window).sum(axis=1)
+    volume = rolling(prices.volume, window).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.where(volume > 0, traded / volume, np.nan)
+    return {'vwap20': _pad(value, len(typical))}
+
+@register('volatility', outputs=('volatility20',), lookback=21,
+          description="Annualized standard deviation of daily log returns over 20 days")
+def volatility(prices, window=20):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(prices.close), prepend=np.nan)
+    return {'volatility20': rolling_std(returns, window) * np.sqrt(252)}
+
+def lookback(names):
+    """
+    Returns the number of trailing rows needed by a set of indicators.
+    """
+    return max(INDICATORS[name].lookback for name in names)
+
+def compute(prices, names):
+    """
+    Computes several indicators over one shared price array.
+
+    Args:
+        prices (PriceArray): The daily bars of one ticker.
+        names (list): Analysis types of the indicators.
+
+    Returns:
+        dict: For every analysis type, the latest value of each output; None where
+            the history is too short.
+    """
+    results = {}
+    for name in names:
+        outputs = INDICATORS[name](prices)
+        results[name] = {
+            output: (None if len(series) == 0 or np.isnan(series[-1]) else float(series[-1]))
+            for output, series in outputs.items()
+        }
+    return results
@@ -0,0 +1,260 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python src/analyzer/parallel.py --workers 32
+# deactivate
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+import numpy as np
+
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from db.pool import get_db_connection
+from analyzer.indicators import INDICATORS, PRICE_FIELDS, PriceArray, compute, lookback
+
+# Trailing daily bars of many tickers at once; each ticker reads only its newest
+# rows from the covering (ticker, date DESC) index
+PRICE_HISTORY_QUERY = """
+SELECT tickers.ticker, recent.open, recent.high, recent.low, recent.close, recent.volume
+FROM (SELECT DISTINCT unnest(%s::varchar[]) AS ticker) tickers
+CROSS JOIN LATERAL (
+    SELECT date, open, high, low, close, volume
+    FROM stock_data
+    WHERE stock_data.ticker = tickers.ticker
+    ORDER BY date DESC
+    LIMIT %s
+) recent
+ORDER BY tickers.ticker, recent.date
+"""
+
+def load_price_history(tickers, days):
+    """
+    Loads the trailing `days` bars of many tickers with a single query.
+
+    Returns:
+        list: (ticker, open, high, low, close, volume) rows ordered by ticker and date.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(PRICE_HISTORY_QUERY, (list(tickers), days))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+def fill_cube(cube, rows):
+    """
+    Writes (ticker, open, high, low, close, volume) rows into a tickers x days x fields array.
+
+    Each ticker's bars are right-aligned, so the last day holds every ticker's latest
+    bar; tickers with a shorter history are padded with NaN on the left.
+
+    Args:
+        cube (numpy.ndarray): Float array of shape (tickers, days, len(PRICE_FIELDS)) to fill.
+        rows (list): Rows ordered by ticker and date, at most `days` per ticker.
+
+    Returns:
+        list: The ticker symbols, in the order of the first axis.
+    """
+    cube.fill(np.nan)
+    if not rows:
+        return []
+    tickers = np.array([row[0] for row in rows])
+    values = np.array([row[1:] for row in rows], dtype=float)
+    symbols, starts, inverse, counts = np.unique(tickers, return_index=True, return_inverse=True,
+                                                 return_counts=True)
+    positions = np.arange(len(rows)) - starts[inverse] + (cube.shape[1] - counts[inverse])
+    cube[inverse, positions] = values
+    return symbols.tolist()
+
+def analyze_cube(cube, start, end, names):
+    """
+    Computes indicators for the tickers [start, end) of a price array.
+
+    Returns:
+        list: (index, results) tuples, with the results of `compute`, or None for a
+            ticker without any bar.
+    """
+    results = []
+    for index in range(start, end):
+        bars = cube[index]
+        valid = np.flatnonzero(~np.isnan(bars[:, PRICE_FIELDS.index('close')]))
+        if len(valid) == 0:
+            results.append((index, None))
+            continue
+        # A view of the shared array; the padding is sliced off, not copied away
+        results.append((index, compute(PriceArray(bars[valid[0]:]), names)))
+    return results
+
+def _analyze_shared(name, shape, start, end, names):
+    """
+    Worker entry point: attaches to the shared price array and analyzes one slice of it.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        cube = np.ndarray(shape, dtype=float, buffer=block.buf)
+        results = analyze_cube(cube, start, end, names)
+        # The buffer cannot be released while an array still points into it
+        del cube
+        return results
+    finally:
+        block.close()
+
+def build_rows(symbols, results, analysis_date):
+    """
+    Builds the (ticker, analysis_date, analysis_type, values) rows of `store_analysis_rows`
+    for every indicator result.
+    """
+    rows = []
+    for index, indicators in results:
+        if indicators is None:
+            continue
+        ticker = symbols[index]
+        for name, values in indicators.items():
+            rows.append((ticker, analysis_date, name, [values[output] for output in INDICATORS[name].outputs]))
+    return rows
+
+class ParallelAnalyzer:
+    """
+    Computes indicators for many tickers on a pool of worker processes.
+
+    The price history of all tickers is written once into a shared-memory array;
+    workers attach to it by name and receive only the bounds of their slice, so
+    no price data is pickled. Every worker runs its own interpreter, so the
+    analysis neither holds nor waits for the GIL of the services in backend.py.
+    """
+
+    def __init__(self, workers=None, tickers_per_task=250):
+        """
+        Args:
+            workers (int): Number of worker processes; defaults to the number of CPUs.
+            tickers_per_task (int): Maximum number of tickers analyzed by one task.
+        """
+        self.workers = workers or os.cpu_count()
+        self.tickers_per_task = tickers_per_task
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Spawned workers do not inherit the parent's threads, sockets or locks
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def slices(self, count):
+        """
+        Splits `count` tickers into contiguous slices, at least one per worker while
+        there are enough tickers, and at most `tickers_per_task` tickers each.
+
+        Returns:
+            list: (start, end) bounds.
+        """
+        size = max(1, min(self.tickers_per_task, -(-count // self.workers)))
+        return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+    def analyze(self, tickers, names, rows=None, analysis_date=None):
+        """
+        Analyzes many tickers in parallel.
+
+        Args:
+            tickers (list): The stock ticker symbols.
+            names (list): Analysis types of the indicators.
+            rows (list): Preloaded price history rows; loaded from the database if None.
+            analysis_date (str): ISO date of the results; defaults to today.
+
+        Returns:
+            list: (ticker, analysis_date, analysis_type, values) rows for one bulk write.
+        """
+        days = lookback(names)
+        if rows is None:
+            rows = load_price_history(tickers, days)
+        analysis_date = analysis_date or datetime.now().date().isoformat()
+        count = len({row[0] for row in rows})
+        if count == 0:
+            return []
+
+        shape = (count, days, len(PRICE_FIELDS))
+        block = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+        try:
+            cube = np.ndarray(shape, dtype=float, buffer=block.buf)
+            symbols = fill_cube(cube, rows)
+            del cube
+            executor = self._get_executor()
+            futures = [executor.submit(_analyze_shared, block.name, shape, start, end, list(names))
+                       for start, end in self.slices(count)]
+            results = [result for future in futures for result in future.result()]
+        finally:
+            block.close()
+            block.unlink()
+        return build_rows(symbols, results, analysis_date)
+
+    def close(self):
+        """
+        Shuts down the worker processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+def run_parallel_analysis(analyzer, tickers, names, store, chunk_size=5000):
+    """
+    Analyzes the whole universe on the process pool, one chunk of tickers per query and bulk write.
+
+    Args:
+        analyzer (ParallelAnalyzer): The process pool.
+        tickers (list): The stock ticker symbols.
+        names (list): Analysis types of the indicators.
+        store (callable): Writes a list of analysis rows in one transaction.
+        chunk_size (int): Number of tickers loaded and stored together.
+
+    Returns:
+        dict: The number of tickers analyzed, the elapsed seconds and the tickers per second.
+    """
+    analysis_date = datetime.now().date().isoformat()
+    analyzed = 0
+    started = time.perf_counter()
+    for start in range(0, len(tickers), chunk_size):
+        chunk = tickers[start:start + chunk_size]
+        rows = analyzer.analyze(chunk, names, analysis_date=analysis_date)
+        if rows:
+            store(rows)
+        analyzed += len({row[0] for row in rows})
+    elapsed = time.perf_counter() - started
+    rate = analyzed / elapsed if elapsed > 0 else 0.0
+    print(f"Parallel analysis of {analyzed} tickers on {analyzer.workers} processes took "
+          f"{elapsed:.2f}s ({rate:.0f} tickers/s)")
+    return {'tickers': analyzed, 'elapsed': elapsed, 'rate': rate}
+
+def main():
+    from analyzer.data_analyzer import config, data_analyzer_config
+    from analyzer.storage import store_analysis_rows
+
+    parallel_config = data_analyzer_config.get('parallel', {})
+    parser = argparse.ArgumentParser(description="Analyze every ticker on a pool of worker processes.")
+    parser.add_argument('--tickers', nargs='*', help="Tickers to analyze (default: data_collector.stocks)")
+    parser.add_argument('--indicators', nargs='*', help="Indicators to compute (default: data_analyzer.indicators)")
+    workers = parallel_config.get('workers', 1)
+    parser.add_argument('--workers', type=int, default=workers if workers > 1 else None,
+                        help="Worker processes (default: data_analyzer.parallel.workers, or one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=parallel_config.get('chunk_size', 5000),
+                        help="Tickers per query and bulk write")
+    args = parser.parse_args()
+
+    analyzer = ParallelAnalyzer(args.workers, parallel_config.get('tickers_per_task', 250))
+    try:
+        run_parallel_analysis(analyzer, args.tickers or config['data_collector']['stocks'],
+                              args.indicators or data_analyzer_config.get('indicators', ['moving_average']),
+                              store_analysis_rows, args.chunk_size)
+    finally:
+        analyzer.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import math
+from psycopg2.extras import execute_values
+from db.pool import get_db_connection
+from analyzer.indicators import INDICATORS
+
+# Every run of an analysis replaces its row for the day instead of appending one
+UPSERT_VALUES_QUERY = """
+INSERT INTO analysis_values (ticker, analysis_date, analysis_type, outputs)
+VALUES %s
+ON CONFLICT (ticker, analysis_type, analysis_date) DO UPDATE
+SET outputs = EXCLUDED.outputs,
+    updated_at = CURRENT_TIMESTAMP
+"""
+
+# The newest result of every ticker and analysis type; older dates never overwrite it
+UPSERT_LATEST_QUERY = """
+INSERT INTO analysis_latest (ticker, analysis_date, analysis_type, outputs)
+VALUES %s
+ON CONFLICT (ticker, analysis_type) DO UPDATE
+SET analysis_date = EXCLUDED.analysis_date,
+    outputs = EXCLUDED.outputs,
+    updated_at = CURRENT_TIMESTAMP
+WHERE analysis_latest.analysis_date <= EXCLUDED.analysis_date
+"""
+
+# Array literals of NULLs only would otherwise be typed text[]
+ROW_TEMPLATE = "(%s, %s, %s, %s::double precision[])"
+
+ANALYSIS_TYPES_QUERY = """
+INSERT INTO analysis_types (type_name, description, value_names)
+VALUES %s
+ON CONFLICT (type_name) DO UPDATE
+SET description = EXCLUDED.description,
+    value_names = EXCLUDED.value_names
+"""
+
+def result_values(analysis_type, result):
+    """
+    Returns the outputs of an analysis result as a list in the order of its analysis type.
+
+    Args:
+        analysis_type (str): The registered analysis type.
+        result (dict): The analysis result, keyed by output name.
+
+    Returns:
+        list: Floats, None where an output has no value.
+    """
+    values = []
+    for name in INDICATORS[analysis_type].outputs:
+        value = result.get(name)
+        values.append(None if value is None or math.isnan(value) else float(value))
+    return values
+
+def values_to_result(analysis_type, values):
+    """
+    Maps stored output values back to their names, e.g. {'ma5': ..., 'ma10': ...}.
+    """
+    return dict(zip(INDICATORS[analysis_type].outputs, values))
+
+def analysis_row(result, analysis_type):
+    """
+    Converts an analysis result into a (ticker, analysis_date, analysis_type, values) row.
+    """
+    return (result['ticker'], result['analysis_date'], analysis_type, result_values(analysis_type, result))
+
+def store_analysis_rows(rows):
+    """
+    Upserts analysis rows into the time series and the latest-value table in one transaction.
+
+    Args:
+        rows (list): (ticker, analysis_date, analysis_type, values) rows; of several rows
+            with the same key the last one wins.
+
+    Returns:
+        int: The number of rows written.
+    """
+    # A statement may not update the same row twice
+    unique = list({(row[0], row[2], row[1]): row for row in rows}.values())
+    if not unique:
+        return 0
+    latest = {}
+    for row in unique:
+        key = (row[0], row[2])
+        if key not in latest or str(row[1]) >= str(latest[key][1]):
+            latest[key] = row
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        execute_values(cursor, UPSERT_VALUES_QUERY, unique, template=ROW_TEMPLATE, page_size=len(unique))
+        execute_values(cursor, UPSERT_LATEST_QUERY, list(latest.values()), template=ROW_TEMPLATE,
+                       page_size=len(latest))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return len(unique)
+
+def sync_analysis_types():
+    """
+    Records every registered analysis type with the names of its outputs in analysis_types,
+    so the stored value arrays can be read without the Python registry.
+    """
+    rows = [(name, indicator.description, list(indicator.outputs)) for name, indicator in INDICATORS.items()]
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        execute_values(cursor, ANALYSIS_TYPES_QUERY, rows)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
@@ -1,7 +1,10 @@
 from flask import Blueprint, jsonify, request
-import psycopg2
 import os
 import json
+from db.pool import get_db_connection, register_prepared
+from analyzer.indicators import INDICATORS
+from analyzer.storage import values_to_result
+from analyzer.correlation import CorrelationSnapshotCache
 
 # Define the API blueprint
 api_blueprint = Blueprint('api', __name__)
@@ -11,27 +14,43 @@ config_path = os.path.join(os.path.dirname(__file__), '../../config/config.json'
 with open(config_path, 'r') as config_file:
     config = json.load(config_file)
 
-# Database configuration parameters
-db_config = config['data_recorder']['database']
+# Correlation matrix of the analyzer's latest snapshot, reloaded when the snapshot changes
+correlation_cache = CorrelationSnapshotCache(
+    config['data_analyzer'].get('correlation', {}).get('snapshot_path', 'snapshots/correlation.npz')
+)
 
-# PostgreSQL connection parameters
-DB_HOST = db_config['host']
-DB_PORT = db_config['port']
-DB_USER = db_config['user']
-DB_PASSWORD = db_config['password']
-DB_NAME = db_config['dbname']
-
-def get_db_connection():
-    """
-    Establishes and returns a connection to the PostgreSQL database.
-    """
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        dbname=DB_NAME
-    )
+# Hot queries of the API, prepared once per pooled connection
+register_prepared('api_stock_data', """
+    SELECT ticker, date, open, high, low, close, volume
+    FROM stock_data
+    WHERE ticker = $1
+    ORDER BY date DESC
+    LIMIT 50
+""")
+register_prepared('api_analysis_results', """
+    SELECT ticker, analysis_date, outputs
+    FROM analysis_values
+    WHERE ticker = $1 AND analysis_type = $2
+    ORDER BY analysis_date DESC
+    LIMIT 50
+""")
+register_prepared('api_backtest_run', """
+    SELECT id, strategy, start_date, end_date, ticker_count, cost_bps, created_at
+    FROM backtest_runs
+    WHERE id = COALESCE($1, (SELECT max(id) FROM backtest_runs))
+""")
+register_prepared('api_backtest_results', """
+    SELECT fast_window, slow_window, total_return, annual_return, sharpe, max_drawdown, turnover
+    FROM backtest_results
+    WHERE run_id = $1
+    ORDER BY sharpe DESC
+    LIMIT $2
+""")
+register_prepared('api_analysis_latest', """
+    SELECT ticker, analysis_type, analysis_date, outputs
+    FROM analysis_latest
+    WHERE ticker = $1
+""")
 
 @api_blueprint.route('/stock_data', methods=['GET'])
 def get_stock_data():
@@ -49,20 +68,13 @@ def get_stock_data():
         return jsonify({'error': 'Ticker is required'}), 400
 
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    query = """
-    SELECT ticker, date, open, high, low, close, volume
-    FROM stock_data
-    WHERE ticker = %s
-    ORDER BY date DESC
-    LIMIT 50
-    """
-    cursor.execute(query, (ticker,))
-    rows = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
+    try:
+        cursor = conn.cursor()
+        conn.execute_prepared(cursor, 'api_stock_data', (ticker,))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
 
     stock_data = []
     for row in rows:
@@ -86,6 +98,7 @@ def get_analysis_results():
 
     Query Parameters:
         ticker (str): The stock ticker symbol.
+        type (str): The analysis type, e.g. 'rsi' or 'macd' (default: 'moving_average').
 
     Returns:
         JSON: A list of analysis results for the specified ticker.
@@ -93,35 +106,155 @@ def get_analysis_results():
     ticker = request.args.get('ticker')
     if not ticker:
         return jsonify({'error': 'Ticker is required'}), 400
+    analysis_type = request.args.get('type', 'moving_average')
+    if analysis_type not in INDICATORS:
+        return jsonify({'error': f"Unknown analysis type, expected one of {sorted(INDICATORS)}"}), 400
 
     conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        cursor = conn.cursor()
+        conn.execute_prepared(cursor, 'api_analysis_results', (ticker, analysis_type))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
 
-    query = """
-    SELECT ticker, analysis_date, result
-    FROM stock_analysis
-    WHERE ticker = %s AND analysis_type = 'moving_average'
-    ORDER BY analysis_date DESC
-    LIMIT 50
+    analysis_results = []
+    for row in rows:
+        ticker, analysis_date, outputs = row
+        analysis_result = {
+            'ticker': ticker,
+            'analysis_date': analysis_date
+        }
+        # The indicator's outputs, e.g. ma5 and ma10 for moving averages
+        analysis_result.update(values_to_result(analysis_type, outputs))
+        analysis_results.append(analysis_result)
+
+    return jsonify(analysis_results)
+
+@api_blueprint.route('/analysis_latest', methods=['GET'])
+def get_analysis_latest():
     """
-    cursor.execute(query, (ticker,))
-    rows = cursor.fetchall()
+    API endpoint to retrieve the newest result of every analysis type for a given ticker.
 
-    cursor.close()
-    conn.close()
+    Query Parameters:
+        ticker (str): The stock ticker symbol.
 
-    analysis_results = []
+    Returns:
+        JSON: The newest analysis results keyed by analysis type, each with its
+            analysis date and outputs.
+    """
+    ticker = request.args.get('ticker')
+    if not ticker:
+        return jsonify({'error': 'Ticker is required'}), 400
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        conn.execute_prepared(cursor, 'api_analysis_latest', (ticker,))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    latest_results = {}
     for row in rows:
-        ticker, analysis_date, result = row
-        if isinstance(result, str):
-            result_json = json.loads(result)
-        else:
-            result_json = result
-        analysis_results.append({
+        ticker, analysis_type, analysis_date, outputs = row
+        if analysis_type not in INDICATORS:
+            continue
+        latest_result = {
             'ticker': ticker,
-            'analysis_date': analysis_date,
-            'ma5': result_json['ma5'],
-            'ma10': result_json['ma10']
+            'analysis_date': analysis_date
+        }
+        latest_result.update(values_to_result(analysis_type, outputs))
+        latest_results[analysis_type] = latest_result
+
+    return jsonify(latest_results)
+
+@api_blueprint.route('/backtest_results', methods=['GET'])
+def get_backtest_results():
+    """
+    API endpoint to retrieve the results of a stored backtest run, best Sharpe ratio first.
+
+    Query Parameters:
+        run_id (int): The backtest run (default: the latest run).
+        limit (int): Maximum number of parameter pairs (default: 100).
+
+    Returns:
+        JSON: The run and its results per parameter pair.
+    """
+    try:
+        run_id = request.args.get('run_id', type=int)
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'error': 'run_id and limit must be integers'}), 400
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        conn.execute_prepared(cursor, 'api_backtest_run', (run_id,))
+        run = cursor.fetchone()
+        rows = []
+        if run:
+            conn.execute_prepared(cursor, 'api_backtest_results', (run[0], limit))
+            rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    if not run:
+        return jsonify({'error': 'Backtest run not found'}), 404
+
+    run_id, strategy, start_date, end_date, ticker_count, cost_bps, created_at = run
+    results = []
+    for row in rows:
+        fast_window, slow_window, total_return, annual_return, sharpe, max_drawdown, turnover = row
+        results.append({
+            'fast_window': fast_window,
+            'slow_window': slow_window,
+            'total_return': total_return,
+            'annual_return': annual_return,
+            'sharpe': sharpe,
+            'max_drawdown': max_drawdown,
+            'turnover': turnover
         })
 
-    return jsonify(analysis_results)
+    return jsonify({
+        'run_id': run_id,
+        'strategy': strategy,
+        'start_date': start_date,
+        'end_date': end_date,
+        'ticker_count': ticker_count,
+        'cost_bps': cost_bps,
+        'created_at': created_at,
+        'results': results
+    })
+
+@api_blueprint.route('/correlated_peers', methods=['GET'])
+def get_correlated_peers():
+    """
+    API endpoint to retrieve the tickers whose daily returns are most correlated with a given ticker.
+
+    Query Parameters:
+        ticker (str): The stock ticker symbol.
+        k (int): Number of peers (default: 10).
+
+    Returns:
+        JSON: The peers, highest correlation first.
+    """
+    ticker = request.args.get('ticker')
+    if not ticker:
+        return jsonify({'error': 'Ticker is required'}), 400
+    k = request.args.get('k', 10, type=int)
+
+    tickers, correlation = correlation_cache.get()
+    if correlation is None:
+        return jsonify({'error': 'No correlation snapshot is available yet'}), 503
+    peers = correlation_cache.peers(ticker, k)
+    if peers is None:
+        return jsonify({'error': f"Ticker {ticker} is not in the correlation universe"}), 404
+
+    return jsonify({
+        'ticker': ticker,
+        'peers': [{'ticker': peer, 'correlation': value} for peer, value in peers]
+    })
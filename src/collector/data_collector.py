@@ -6,10 +6,20 @@
 import json
 import time
 import pika
-import yfinance as yf
-from datetime import datetime
-from apscheduler.schedulers.blocking import BlockingScheduler
 import os
+import sys
+
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from collector.publisher import PersistentPublisher
+from collector.engine import CollectionEngine, TokenBucket
+from collector.sources import create_source
+from collector.delta_cache import LastBarCache
+from collector.watermarks import WatermarkStore
+from collector.sharding import select_shard, shard_for, shard_settings
+from collector.scheduler import AdaptiveScheduler, MarketCalendar, session_intervals, REGULAR, EXTENDED
+from messaging.codec import encode_messages, validate_record
 
 # Load configuration from JSON file
 config_path = os.path.join(os.path.dirname(__file__), '../../config/config.json')
@@ -51,18 +61,35 @@ def setup_rabbitmq():
     # Declare exchange
     channel.exchange_declare(exchange=EXCHANGE, exchange_type=EXCHANGE_TYPE, durable=True)
 
-    # Declare queue
-    channel.queue_declare(queue=QUEUE, durable=True)
+    # Recorder workers consume queues of their own, which they declare themselves;
+    # a shared queue that nobody reads would grow without bound
+    if config.get('data_recorder', {}).get('workers', 1) <= 1:
+        # Declare queue
+        channel.queue_declare(queue=QUEUE, durable=True)
 
-    # Bind queue to exchange with routing key
-    channel.queue_bind(exchange=EXCHANGE, queue=QUEUE, routing_key=ROUTING_KEY)
+        # Bind queue to exchange with routing key
+        channel.queue_bind(exchange=EXCHANGE, queue=QUEUE, routing_key=ROUTING_KEY)
 
     connection.close()
     print("RabbitMQ setup completed.")
 
+_source = None
+
+def get_source():
+    """
+    Returns the configured market data source, creating it on first use.
+
+    Returns:
+        MarketDataSource: The source selected by `data_collector.source`.
+    """
+    global _source
+    if _source is None:
+        _source = create_source(data_collector_config)
+    return _source
+
 def fetch_stock_data(ticker):
     """
-    Fetches the latest stock data for a given ticker using Yahoo Finance API.
+    Fetches the latest stock data for a given ticker from the configured market data source.
     
     Args:
         ticker (str): The stock ticker symbol.
@@ -70,62 +97,381 @@ def fetch_stock_data(ticker):
     Returns:
         dict: A dictionary containing the stock data.
     """
-    stock = yf.Ticker(ticker)
-    hist = stock.history(period="1d")
-    if hist.empty:
-        print(f"No data found for ticker {ticker}")
-        return None
-    data = {
-        'ticker': ticker,
-        'open': float(hist['Open'].iloc[-1]),
-        'high': float(hist['High'].iloc[-1]),
-        'low': float(hist['Low'].iloc[-1]),
-        'close': float(hist['Close'].iloc[-1]),
-        'volume': int(hist['Volume'].iloc[-1]),
-        'timestamp': datetime.now().isoformat()
-    }
-    return data
-
-def publish_stock_data(data):
-    """
-    Publishes the stock data to the RabbitMQ exchange.
+    return get_source().fetch(ticker)
+
+def get_tickers():
+    """
+    Returns the tickers collected by this instance: the configured universe, or the
+    part of it owned by this instance's shard when several collectors share the load.
+
+    Returns:
+        list: The stock ticker symbols.
+    """
+    shard_index, shard_count = shard_settings(data_collector_config)
+    return select_shard(data_collector_config['stocks'], shard_index, shard_count)
+
+def chunk_tickers(tickers, size):
+    """
+    Splits the ticker universe into consecutive chunks of at most `size` symbols.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        size (int): Maximum number of tickers per chunk; 0 or less means a single chunk.
+
+    Returns:
+        list: A list of ticker lists.
+    """
+    tickers = list(tickers)
+    if size <= 0:
+        return [tickers]
+    return [tickers[i:i + size] for i in range(0, len(tickers), size)]
+
+def fetch_stock_data_batch(tickers):
+    """
+    Fetches the latest stock data for many tickers with a single request to the configured source.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+
+    Returns:
+        list: A list of dictionaries containing the stock data, one per ticker with data.
+    """
+    return get_source().fetch_batch(tickers)
+
+_publisher = None
+
+def get_publisher():
+    """
+    Returns the long-lived publisher shared by every collection cycle, creating it on first use.
+
+    Returns:
+        PersistentPublisher: The publisher bound to the stock data exchange.
+    """
+    global _publisher
+    if _publisher is None:
+        _publisher = PersistentPublisher(lambda: get_rabbitmq_connection(), EXCHANGE, ROUTING_KEY)
+    return _publisher
+
+_delta_cache = None
+
+def get_delta_cache():
+    """
+    Returns the cache of last published bars, or None if delta suppression is disabled.
+
+    Returns:
+        LastBarCache: The cache used to suppress unchanged quotes.
+    """
+    global _delta_cache
+    delta_config = data_collector_config.get('delta_suppression', {})
+    if _delta_cache is None and delta_config.get('enabled', False):
+        _delta_cache = LastBarCache(
+            snapshot_path=delta_config.get('snapshot_path'),
+            snapshot_interval=delta_config.get('snapshot_interval', 60)
+        )
+    return _delta_cache
+
+# Records waiting to be packed into messages
+_outbox = []
+
+def publish_stock_data(data, commit=True):
+    """
+    Publishes the stock data to the RabbitMQ exchange over the shared publisher channel.
+    Quotes whose OHLCV did not change since they were last published are suppressed.
+
+    Records are packed into messages in the configured `wire_format`; a binary
+    message is sent as soon as it holds `max_records_per_message` records.
+    Records that cannot be encoded or stored, like a ticker longer than the
+    database column, are logged and skipped instead of failing their whole message.
     
     Args:
         data (dict): The stock data to be published.
+        commit (bool): Wait for the broker to confirm the message. Collection cycles pass
+            False and confirm all their messages at once with `commit_published`.
+
+    Returns:
+        bool: False if the quote was suppressed or skipped.
     """
-    connection = get_rabbitmq_connection()
-    channel = connection.channel()
+    try:
+        validate_record(data)
+    except ValueError as e:
+        print(f"Skipping invalid stock data: {e}")
+        return False
+
+    cache = get_delta_cache()
+    # Intraday bars are deduplicated by their watermark instead
+    if cache is not None and 'interval' not in data:
+        if not cache.is_changed(data):
+            cache.suppress()
+            return False
+        cache.stage(data)
+
+    _outbox.append(data)
+    if commit:
+        commit_published()
+    elif len(_outbox) >= data_collector_config.get('max_records_per_message', 500):
+        flush_outbox()
+    return True
+
+def flush_outbox():
+    """
+    Encodes the records waiting in the outbox and hands the messages to the publisher.
+    """
+    if not _outbox:
+        return
+    records = list(_outbox)
+    _outbox.clear()
+    publisher = get_publisher()
+    # Every message carries its partition, which the consistent-hash exchange of
+    # the recorder workers routes on; unstamped messages would be dropped there
+    partitions = max(data_collector_config.get('partitions', 1), 1)
+    messages = encode_messages(
+        records,
+        wire_format=data_collector_config.get('wire_format', 'binary'),
+        max_records=data_collector_config.get('max_records_per_message', 500),
+        partition=lambda ticker: shard_for(ticker, partitions)
+    )
+    for body, properties in messages:
+        publisher.publish(body, properties=properties)
+        # print(f"Published message to {ROUTING_KEY}: {body}")
+
+def commit_published():
+    """
+    Publishes the remaining records and confirms every message since the last commit in one round trip.
+    Unconfirmed messages are dropped on failure, since the next cycle refetches them.
+
+    Returns:
+        int: The number of messages confirmed by the broker.
+    """
+    publisher = get_publisher()
+    cache = get_delta_cache()
+    watermarks = get_watermarks()
+    try:
+        flush_outbox()
+        confirmed = publisher.commit()
+    except Exception as e:
+        print(f"Error publishing stock data: {e}; dropped {publisher.discard_pending()} messages")
+        if cache is not None:
+            cache.discard()
+        watermarks.discard()
+        return 0
+    if cache is not None:
+        cache.confirm()
+    watermarks.confirm()
+    return confirmed
+
+def collect_and_publish_stock_data_batch(tickers=None):
+    """
+    Collects and publishes stock data for all configured tickers using multi-symbol
+    downloads of `batch_size` tickers each, reporting the timing of every chunk.
+
+    Args:
+        tickers (list): Collect only these tickers instead of the whole universe.
+    """
+    if tickers is None:
+        tickers = get_tickers()
+    chunks = chunk_tickers(tickers, data_collector_config.get('batch_size', 0))
+    for index, chunk in enumerate(chunks, start=1):
+        started = time.perf_counter()
+        records = fetch_stock_data_batch(chunk)
+        fetched = time.perf_counter()
+        for data in records:
+            publish_stock_data(data, commit=False)
+        commit_published()
+        published = time.perf_counter()
+        print(f"Chunk {index}/{len(chunks)}: {len(records)}/{len(chunk)} tickers, "
+              f"fetch {fetched - started:.2f}s, publish {published - fetched:.2f}s")
 
-    message = json.dumps(data)
-    channel.basic_publish(
-        exchange=EXCHANGE,
-        routing_key=ROUTING_KEY,
-        body=message
+_engine = None
+
+def get_engine():
+    """
+    Returns the concurrent collection engine, creating its thread pool and rate limiters on first use.
+
+    Returns:
+        CollectionEngine: The engine used by the concurrent collection mode.
+    """
+    global _engine
+    if _engine is None:
+        rate_limiters = {
+            source: TokenBucket(limit['rate'], limit.get('burst'))
+            for source, limit in data_collector_config.get('rate_limits', {}).items()
+        }
+        _engine = CollectionEngine(
+            fetch_stock_data,
+            max_workers=data_collector_config.get('max_workers', 8),
+            request_timeout=data_collector_config.get('request_timeout', 10),
+            max_retries=data_collector_config.get('max_retries', 1),
+            rate_limiters=rate_limiters
+        )
+    return _engine
+
+def collect_and_publish_stock_data_concurrent(tickers=None):
+    """
+    Collects stock data for all configured tickers through the concurrent engine,
+    publishing each record as soon as it arrives and confirming the cycle at the end.
+
+    Args:
+        tickers (list): Collect only these tickers instead of the whole universe.
+    """
+    stats = get_engine().run(
+        get_tickers() if tickers is None else tickers,
+        lambda data: publish_stock_data(data, commit=False),
+        source=get_source().name,
+        cycle_timeout=data_collector_config['schedule_interval'] * 0.9
     )
-    connection.close()
-    # print(f"Published message to {ROUTING_KEY}: {message}")
+    confirmed = commit_published()
+    print(f"Collected {stats['collected']} tickers in {stats['elapsed']:.2f}s "
+          f"({stats['empty']} empty, {stats['retried']} retried, {stats['deferred']} deferred, {confirmed} messages)")
 
-def collect_and_publish_stock_data():
+def collect_and_publish_stock_data(tickers=None):
     """
     Collects and publishes stock data for all tickers specified in the configuration.
+
+    Args:
+        tickers (list): Collect only these tickers, e.g. one slice of the universe
+            spread over the schedule interval, instead of the whole universe.
     """
-    for ticker in data_collector_config['stocks']:
-        data = fetch_stock_data(ticker)
-        if data:  # Ensure data is not None
-            # print(f"Received data: {data}")  # Print the data for debugging
-            publish_stock_data(data)
+    if tickers is None:
+        tickers = get_tickers()
+    cache = get_delta_cache()
+    suppressed = cache.suppressed if cache is not None else 0
+
+    collection_mode = data_collector_config.get('collection_mode', 'sequential')
+    if collection_mode == 'batch':
+        collect_and_publish_stock_data_batch(tickers)
+    elif collection_mode == 'concurrent':
+        collect_and_publish_stock_data_concurrent(tickers)
+    else:
+        for ticker in tickers:
+            data = fetch_stock_data(ticker)
+            if data:  # Ensure data is not None
+                # print(f"Received data: {data}")  # Print the data for debugging
+                publish_stock_data(data, commit=False)
+        commit_published()
+
+    if cache is not None and cache.suppressed > suppressed:
+        stats = cache.stats()
+        print(f"Suppressed {cache.suppressed - suppressed} unchanged quotes "
+              f"(total published {stats['published']}, suppressed {stats['suppressed']})")
+
+_watermarks = None
+
+def get_watermarks():
+    """
+    Returns the per-ticker watermarks of published intraday bars, creating them on first use.
+
+    Returns:
+        WatermarkStore: The watermarks of the intraday collection mode.
+    """
+    global _watermarks
+    if _watermarks is None:
+        _watermarks = WatermarkStore(data_collector_config.get('intraday', {}).get('snapshot_path'))
+    return _watermarks
+
+def collect_and_publish_intraday_bars(tickers=None):
+    """
+    Publishes, for every ticker, the completed intraday bars newer than its watermark
+    as one batch per cycle, and advances the watermarks once the batch is confirmed.
+
+    Args:
+        tickers (list): Collect only these tickers instead of the whole universe.
+    """
+    if tickers is None:
+        tickers = get_tickers()
+    interval = data_collector_config.get('intraday', {}).get('interval', '1m')
+    source = get_source()
+    watermarks = get_watermarks()
+    bars = 0
+    started = time.perf_counter()
+    for ticker in tickers:
+        try:
+            records = source.fetch_intraday(ticker, interval, since=watermarks.get(ticker))
+        except Exception as e:
+            print(f"Error fetching {interval} bars for {ticker}: {e}")
+            continue
+        for data in records:
+            publish_stock_data(data, commit=False)
+        if records:
+            watermarks.stage(ticker, records[-1]['timestamp'])
+            bars += len(records)
+    messages = commit_published()
+    print(f"Published {bars} new {interval} bars in {messages} messages in {time.perf_counter() - started:.2f}s")
+
+def replay_and_publish():
+    """
+    Streams the recorded bars of the replay source through RabbitMQ at the configured
+    speed-up factor, confirming each timestamp group, and reports the achieved throughput.
+    """
+    source = get_source()
+    bars = 0
+    messages = 0
+    started = time.perf_counter()
+    for records in source.stream(get_tickers() or None):
+        for data in records:
+            publish_stock_data(data, commit=False)
+        bars += len(records)
+        messages += commit_published()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"Replayed {bars} bars in {messages} messages in {elapsed:.2f}s "
+          f"({bars / elapsed:.0f} bars/s, {messages / elapsed:.0f} msg/s)")
+
+def build_scheduler():
+    """
+    Builds the market-calendar-aware scheduler of the collection jobs.
+
+    Daily quotes are collected every `schedule.regular_interval` seconds (default
+    `schedule_interval`) during regular hours, at `extended_interval` in pre/post-market
+    hours and at `closed_interval` while the market is closed; a missing interval stops
+    collection in that session. Intraday bars are collected during trading hours only.
+
+    Returns:
+        AdaptiveScheduler: The scheduler, not started yet.
+    """
+    schedule_config = data_collector_config.get('schedule', {})
+    scheduler = AdaptiveScheduler(
+        MarketCalendar.from_config(schedule_config),
+        check_interval=schedule_config.get('check_interval', 60),
+        misfire_grace_time=schedule_config.get('misfire_grace_time', 30)
+    )
+    scheduler.add_job(
+        'quotes',
+        collect_and_publish_stock_data,
+        session_intervals(schedule_config, data_collector_config['schedule_interval']),
+        tickers=get_tickers,
+        slices=schedule_config.get('slices', 1),
+        jitter=schedule_config.get('jitter', 0),
+        # Collect a baseline right away, even while the market is closed
+        run_at_start=True
+    )
+    intraday_config = data_collector_config.get('intraday', {})
+    if intraday_config.get('enabled', False):
+        interval = intraday_config.get('schedule_interval', 60)
+        scheduler.add_job(
+            'intraday',
+            collect_and_publish_intraday_bars,
+            {REGULAR: interval, EXTENDED: interval},
+            tickers=get_tickers,
+            slices=schedule_config.get('slices', 1),
+            jitter=schedule_config.get('jitter', 0)
+        )
+    return scheduler
 
 def start_producing():
     """
     Starts the data collector service, which sets up RabbitMQ, collects and publishes
-    initial stock data, and schedules periodic data collection.
+    initial stock data, and schedules periodic data collection following the
+    trading sessions of the exchange.
     """
     setup_rabbitmq()
-    collect_and_publish_stock_data()
-    
-    scheduler = BlockingScheduler()
-    scheduler.add_job(collect_and_publish_stock_data, 'interval', seconds=data_collector_config['schedule_interval'])
-    print(f"Starting data collector with interval {data_collector_config['schedule_interval']} seconds")
+    shard_index, shard_count = shard_settings(data_collector_config)
+    if shard_count > 1:
+        print(f"Collector shard {shard_index + 1}/{shard_count} owns {len(get_tickers())} tickers")
+    if get_source().name == 'replay':
+        replay_and_publish()
+        return
+
+    scheduler = build_scheduler()
+    print(f"Starting data collector with interval {data_collector_config['schedule_interval']} seconds during regular hours")
     try:
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+
+class LastBarCache:
+    """
+    In-memory cache of the last bar published for every ticker.
+
+    Records whose OHLCV values match the last published bar are suppressed.
+    Bars are first staged when published and only become the reference once the
+    broker has confirmed them, so a failed cycle does not suppress its retry.
+    The cache can be snapshotted to a JSON file to survive restarts.
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, snapshot_path=None, snapshot_interval=60):
+        """
+        Args:
+            snapshot_path (str): JSON file used to persist the cache; None keeps it in memory only.
+            snapshot_interval (float): Minimum number of seconds between two snapshots.
+        """
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.published = 0
+        self.suppressed = 0
+        self._bars = {}
+        self._staged = {}
+        self._last_snapshot = 0.0
+        if snapshot_path:
+            self.load()
+
+    def _bar(self, data):
+        return tuple(data.get(field) for field in self.FIELDS)
+
+    def is_changed(self, data):
+        """
+        Returns True if the record differs from the last bar published for its ticker.
+
+        Args:
+            data (dict): The stock data record.
+        """
+        ticker = data['ticker']
+        last = self._staged.get(ticker, self._bars.get(ticker))
+        return last != self._bar(data)
+
+    def stage(self, data):
+        """
+        Remembers a published record until its delivery is confirmed.
+        """
+        self._staged[data['ticker']] = self._bar(data)
+
+    def suppress(self):
+        """
+        Counts a record that was not published because it did not change.
+        """
+        self.suppressed += 1
+
+    def confirm(self):
+        """
+        Makes every staged record the reference bar of its ticker, and snapshots the cache if due.
+        """
+        self.published += len(self._staged)
+        self._bars.update(self._staged)
+        self._staged = {}
+        if self.snapshot_path and time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.save()
+
+    def discard(self):
+        """
+        Forgets staged records whose delivery failed, so they are published again.
+        """
+        self._staged = {}
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of published and suppressed records and the number of cached tickers.
+        """
+        return {'published': self.published, 'suppressed': self.suppressed, 'tickers': len(self._bars)}
+
+    def save(self):
+        """
+        Writes the cache to the snapshot file atomically.
+        """
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w') as snapshot_file:
+            json.dump(self._bars, snapshot_file)
+        os.replace(tmp_path, self.snapshot_path)
+        self._last_snapshot = time.monotonic()
+
+    def load(self):
+        """
+        Restores the cache from the snapshot file, if there is one.
+        """
+        try:
+            with open(self.snapshot_path, 'r') as snapshot_file:
+                bars = json.load(snapshot_file)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"Ignoring unreadable snapshot {self.snapshot_path}: {e}")
+            return
+        self._bars = {ticker: tuple(bar) for ticker, bar in bars.items()}
+        print(f"Loaded last published bars of {len(self._bars)} tickers from {self.snapshot_path}")
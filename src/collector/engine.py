@@ -0,0 +1,168 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when no token could be taken from a rate limiter before the request timeout.
+    """
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that allows `rate` requests per second with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): Maximum number of tokens; defaults to `rate`.
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """
+        Takes one token, waiting for the bucket to refill if necessary.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait; None waits forever.
+
+        Returns:
+            bool: True if a token was taken, False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_time = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait_time > deadline:
+                return False
+            time.sleep(wait_time)
+
+class CollectionEngine:
+    """
+    Fetches tickers concurrently through a bounded thread pool.
+
+    Every request takes a token from the rate limiter of its upstream source and
+    is abandoned once it runs longer than `request_timeout`. Failed requests are
+    retried up to `max_retries` times within the cycle; tickers that still fail,
+    or that did not finish before the cycle deadline, are deferred and fetched
+    first in the next cycle. Results are handed to `on_result` on the calling
+    thread as soon as each request completes.
+    """
+
+    def __init__(self, fetch, max_workers=8, request_timeout=10.0, max_retries=1, rate_limiters=None):
+        """
+        Args:
+            fetch (callable): Takes a ticker and returns a stock data dict or None.
+            max_workers (int): Size of the thread pool.
+            request_timeout (float): Seconds a single request may take, including waiting for a token.
+            max_retries (int): Retries per ticker within one cycle.
+            rate_limiters (dict): Maps a source name to its TokenBucket.
+        """
+        self.fetch = fetch
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.rate_limiters = rate_limiters or {}
+        self.deferred = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='collector')
+
+    def _fetch_one(self, ticker, source, started):
+        limiter = self.rate_limiters.get(source)
+        if limiter is not None and not limiter.acquire(timeout=self.request_timeout):
+            raise RateLimitExceeded(f"No {source} rate limit token for {ticker}")
+        started[ticker] = time.monotonic()
+        return self.fetch(ticker)
+
+    def run(self, tickers, on_result, source='yahoo', cycle_timeout=None):
+        """
+        Runs one collection cycle.
+
+        Args:
+            tickers (list): The stock ticker symbols to fetch.
+            on_result (callable): Called with each stock data dict as it arrives.
+            source (str): The upstream source, used to select the rate limiter.
+            cycle_timeout (float): Seconds after which unfinished tickers are deferred.
+
+        Returns:
+            dict: Counts of collected, empty, retried and deferred tickers and the elapsed time.
+        """
+        cycle_started = time.monotonic()
+        deadline = None if cycle_timeout is None else cycle_started + cycle_timeout
+        # Tickers deferred by the previous cycle go first
+        ordered = list(dict.fromkeys(self.deferred + list(tickers)))
+        self.deferred = []
+        stats = {'collected': 0, 'empty': 0, 'retried': 0, 'deferred': 0}
+
+        attempts = {}
+        started = {}
+        pending = {}
+
+        def submit(ticker):
+            attempts[ticker] = attempts.get(ticker, 0) + 1
+            started.pop(ticker, None)
+            future = self._executor.submit(self._fetch_one, ticker, source, started)
+            pending[future] = ticker
+
+        def defer(ticker, reason):
+            print(f"Deferring {ticker} to the next cycle: {reason}")
+            self.deferred.append(ticker)
+            stats['deferred'] += 1
+
+        for ticker in ordered:
+            submit(ticker)
+
+        while pending:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                for future, ticker in pending.items():
+                    future.cancel()
+                    defer(ticker, "cycle deadline reached")
+                break
+
+            done, _ = wait(list(pending), timeout=min(1.0, self.request_timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                ticker = pending.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    if attempts[ticker] <= self.max_retries:
+                        stats['retried'] += 1
+                        submit(ticker)
+                    else:
+                        defer(ticker, e)
+                    continue
+                if data:
+                    stats['collected'] += 1
+                    on_result(data)
+                else:
+                    stats['empty'] += 1
+
+            # Abandon requests that are stuck; their threads finish on their own
+            now = time.monotonic()
+            for future, ticker in list(pending.items()):
+                if ticker in started and now - started[ticker] > self.request_timeout:
+                    del pending[future]
+                    defer(ticker, f"timed out after {self.request_timeout}s")
+
+        stats['elapsed'] = time.monotonic() - cycle_started
+        return stats
+
+    def shutdown(self):
+        """
+        Stops the thread pool without waiting for abandoned requests.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,156 @@
+import threading
+from pika.exceptions import AMQPConnectionError, AMQPChannelError
+
+class PersistentPublisher:
+    """
+    Long-lived RabbitMQ publisher that owns a single connection and channel.
+
+    The connection is opened lazily on the first publish and re-opened when the
+    broker drops it. The channel runs in AMQP transaction mode: messages are
+    pipelined with `publish` and confirmed together by `commit`, which costs a
+    single round trip no matter how many messages were published. pika's
+    BlockingChannel waits for every publisher confirm individually, so the
+    transaction is what lets a full cycle be confirmed in one round trip.
+
+    Messages published since the last commit are kept until the broker confirms
+    them, and are replayed on a fresh channel if the connection drops. A commit
+    that fails in flight is retried, so delivery is at-least-once.
+    """
+
+    def __init__(self, connection_factory, exchange, routing_key):
+        """
+        Args:
+            connection_factory (callable): Returns a new pika.BlockingConnection.
+            exchange (str): The exchange messages are published to.
+            routing_key (str): The default routing key.
+        """
+        self.connection_factory = connection_factory
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self._connection = None
+        self._channel = None
+        self._pending = []
+        self._lock = threading.RLock()
+
+    def is_open(self):
+        """
+        Returns True if the connection and channel are usable.
+        """
+        return (self._channel is not None and self._channel.is_open
+                and self._connection is not None and self._connection.is_open)
+
+    def _reconnect(self):
+        """
+        Opens a new connection and transactional channel, and replays every pending message on it.
+        """
+        self._close_quietly()
+        self._connection = self.connection_factory()
+        self._channel = self._connection.channel()
+        self._channel.tx_select()
+        for message in self._pending:
+            self._send(self._channel, message)
+
+    def _close_quietly(self):
+        """
+        Closes the current connection, ignoring errors from an already broken connection.
+        """
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except Exception as e:
+                print(f"Error closing RabbitMQ connection: {e}")
+
+    def _send(self, channel, message):
+        routing_key, body, properties = message
+        channel.basic_publish(exchange=self.exchange, routing_key=routing_key, body=body, properties=properties)
+
+    def publish(self, body, routing_key=None, properties=None):
+        """
+        Publishes a message without waiting for the broker; call `commit` to confirm it.
+
+        Args:
+            body (str or bytes): The message body.
+            routing_key (str): Overrides the default routing key.
+            properties (pika.BasicProperties): Optional message properties.
+        """
+        message = (routing_key or self.routing_key, body, properties)
+        with self._lock:
+            self._pending.append(message)
+            try:
+                if self.is_open():
+                    self._send(self._channel, message)
+                else:
+                    self._reconnect()
+            except (AMQPConnectionError, AMQPChannelError) as e:
+                # The message stays pending and is replayed by the next commit
+                print(f"Publish failed, will retry on commit: {e}")
+                self._close_quietly()
+
+    def commit(self, retries=1):
+        """
+        Confirms every message published since the last commit in a single round trip.
+
+        Args:
+            retries (int): How many times to reconnect and replay pending messages on failure.
+
+        Returns:
+            int: The number of messages confirmed by the broker.
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            for attempt in range(retries + 1):
+                try:
+                    if not self.is_open():
+                        # Uncommitted messages died with the old channel
+                        self._reconnect()
+                    self._channel.tx_commit()
+                    confirmed = len(self._pending)
+                    self._pending = []
+                    return confirmed
+                except (AMQPConnectionError, AMQPChannelError) as e:
+                    print(f"Commit failed (attempt {attempt + 1}): {e}")
+                    self._close_quietly()
+                    if attempt == retries:
+                        raise
+
+    def discard_pending(self):
+        """
+        Drops every unconfirmed message, e.g. when the data will be refetched next cycle anyway.
+
+        Returns:
+            int: The number of messages discarded.
+        """
+        with self._lock:
+            discarded = len(self._pending)
+            self._pending = []
+            self._close_quietly()
+            return discarded
+
+    def publish_batch(self, bodies, routing_key=None, properties=None):
+        """
+        Publishes many messages and confirms them together.
+
+        Args:
+            bodies (iterable): The message bodies.
+            routing_key (str): Overrides the default routing key.
+            properties (pika.BasicProperties): Optional properties shared by all messages.
+
+        Returns:
+            int: The number of messages confirmed by the broker.
+        """
+        with self._lock:
+            for body in bodies:
+                self.publish(body, routing_key=routing_key, properties=properties)
+            return self.commit()
+
+    def close(self):
+        """
+        Commits any pending messages and closes the connection.
+        """
+        with self._lock:
+            try:
+                self.commit()
+            finally:
+                self._close_quietly()
@@ -1,14 +1,214 @@
+import os
+import sys
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
 from apscheduler.schedulers.blocking import BlockingScheduler
-from data_collector import collect_and_publish_stock_data
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.triggers.interval import IntervalTrigger
+
+# Trading sessions of an exchange day
+REGULAR = 'regular'
+EXTENDED = 'extended'
+CLOSED = 'closed'
+
+def _parse_time(value):
+    return time.fromisoformat(value)
+
+class MarketCalendar:
+    """
+    Trading sessions of one exchange: regular hours, extended (pre/post-market)
+    hours and closed, with weekends and configured holidays closed all day.
+    """
+
+    def __init__(self, timezone='America/New_York', regular_hours=('09:30', '16:00'),
+                 extended_hours=('04:00', '20:00'), holidays=()):
+        """
+        Args:
+            timezone (str): IANA timezone of the exchange.
+            regular_hours (tuple): Opening and closing time of the regular session.
+            extended_hours (tuple): Start of pre-market and end of after-hours trading.
+            holidays (iterable): ISO dates on which the exchange is closed.
+        """
+        self.timezone = ZoneInfo(timezone)
+        self.regular_open, self.regular_close = map(_parse_time, regular_hours)
+        self.extended_open, self.extended_close = map(_parse_time, extended_hours)
+        self.holidays = {date.fromisoformat(day) for day in holidays}
+
+    @classmethod
+    def from_config(cls, schedule_config):
+        """
+        Creates the calendar from the `data_collector.schedule` configuration section.
+        """
+        return cls(
+            timezone=schedule_config.get('timezone', 'America/New_York'),
+            regular_hours=schedule_config.get('regular_hours', ('09:30', '16:00')),
+            extended_hours=schedule_config.get('extended_hours', ('04:00', '20:00')),
+            holidays=schedule_config.get('holidays', ())
+        )
+
+    def now(self):
+        return datetime.now(self.timezone)
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays
+
+    def session(self, now=None):
+        """
+        Returns the session at a point in time.
+
+        Args:
+            now (datetime): An aware datetime; defaults to the current time.
+
+        Returns:
+            str: REGULAR, EXTENDED or CLOSED.
+        """
+        local = (now or self.now()).astimezone(self.timezone)
+        if not self.is_trading_day(local.date()):
+            return CLOSED
+        clock = local.time()
+        if self.regular_open <= clock < self.regular_close:
+            return REGULAR
+        if self.extended_open <= clock < self.extended_close:
+            return EXTENDED
+        return CLOSED
+
+class AdaptiveScheduler:
+    """
+    Runs collection jobs at an interval that depends on the trading session.
+
+    Every job is split into `slices` interleaved ticker slices whose runs are
+    spread evenly over the interval, with random jitter, so the load on the
+    upstream API and the pipeline is smooth instead of bursty. A job whose
+    interval for a session is None does not run in that session. The session is
+    checked every `check_interval` seconds and the jobs are rescheduled when it
+    changes.
+
+    All jobs share a single worker thread, so runs never overlap; runs that were
+    missed while another run was busy are coalesced into one.
+    """
+
+    def __init__(self, calendar, check_interval=60, misfire_grace_time=30, scheduler=None):
+        """
+        Args:
+            calendar (MarketCalendar): The exchange calendar.
+            check_interval (float): Seconds between two session checks.
+            misfire_grace_time (float): Seconds a late run may still start.
+            scheduler (BaseScheduler): The APScheduler scheduler; defaults to a BlockingScheduler.
+        """
+        self.calendar = calendar
+        self.check_interval = check_interval
+        self.session = None
+        self.scheduler = scheduler or BlockingScheduler(
+            executors={'default': ThreadPoolExecutor(1)},
+            job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': misfire_grace_time}
+        )
+        self._jobs = []
+
+    def add_job(self, name, func, intervals, tickers=None, slices=1, jitter=0, run_at_start=False):
+        """
+        Registers a collection job.
+
+        Args:
+            name (str): Unique job name.
+            func (callable): Called with the list of tickers of a slice, or without
+                arguments when `tickers` is None.
+            intervals (dict): Seconds between runs for each session; None or a missing
+                session means the job does not run in it.
+            tickers (callable): Returns the tickers to split into slices.
+            slices (int): Number of ticker slices spread over the interval.
+            jitter (float): Maximum random delay in seconds added to every run.
+            run_at_start (bool): Also run every slice once as soon as the scheduler
+                starts, whatever the session, instead of waiting a whole interval.
+        """
+        slices = max(1, slices) if tickers is not None else 1
+        self._jobs.append({'name': name, 'func': func, 'intervals': intervals, 'tickers': tickers,
+                           'slices': slices, 'jitter': jitter, 'run_at_start': run_at_start})
+
+    def _run_slice(self, job, index):
+        if job['tickers'] is None:
+            job['func']()
+            return
+        tickers = job['tickers']()[index::job['slices']]
+        if tickers:
+            job['func'](tickers)
+
+    def apply_session(self, session, now=None):
+        """
+        Reschedules every job for a session.
+
+        Args:
+            session (str): REGULAR, EXTENDED or CLOSED.
+            now (datetime): Start of the schedule; defaults to the current time.
+        """
+        now = now or self.calendar.now()
+        for job in self._jobs:
+            interval = job['intervals'].get(session)
+            for index in range(job['slices']):
+                job_id = f"{job['name']}-{index}"
+                if self.scheduler.get_job(job_id):
+                    self.scheduler.remove_job(job_id)
+                if not interval:
+                    continue
+                trigger = IntervalTrigger(
+                    seconds=interval,
+                    start_date=now + timedelta(seconds=interval * index / job['slices']),
+                    jitter=job['jitter'] or None
+                )
+                self.scheduler.add_job(self._run_slice, trigger, args=(job, index), id=job_id)
+
+    def check_session(self, now=None):
+        """
+        Reschedules the jobs if the trading session changed since the last check.
+
+        Returns:
+            str: The current session.
+        """
+        session = self.calendar.session(now)
+        if session != self.session:
+            print(f"Market session is now {session}; rescheduling collection jobs")
+            self.session = session
+            self.apply_session(session, now)
+        return session
+
+    def start(self):
+        """
+        Schedules the jobs for the current session, runs the jobs registered with
+        `run_at_start` once right away, and starts the scheduler.
+        """
+        self.check_session()
+        now = self.calendar.now()
+        for job in self._jobs:
+            if not job['run_at_start']:
+                continue
+            for index in range(job['slices']):
+                self.scheduler.add_job(self._run_slice, 'date', run_date=now, args=(job, index),
+                                       id=f"{job['name']}-{index}-start")
+        self.scheduler.add_job(self.check_session, 'interval', seconds=self.check_interval, id='session-check')
+        self.scheduler.start()
+
+def session_intervals(schedule_config, default_interval):
+    """
+    Reads the collection interval of each session from the `data_collector.schedule` section.
+
+    Args:
+        schedule_config (dict): The schedule configuration.
+        default_interval (float): Interval used during regular hours if none is configured.
+
+    Returns:
+        dict: Seconds between runs for each session, None where collection stops.
+    """
+    return {
+        REGULAR: schedule_config.get('regular_interval', default_interval),
+        EXTENDED: schedule_config.get('extended_interval'),
+        CLOSED: schedule_config.get('closed_interval'),
+    }
 
 def main():
-    scheduler = BlockingScheduler()
-    scheduler.add_job(collect_and_publish_stock_data, 'interval', seconds=60)
-    print("Starting scheduler")
-    try:
-        scheduler.start()
-    except (KeyboardInterrupt, SystemExit):
-        print("Scheduler stopped.")
+    # Make the src directory importable when this file is run as a script
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    from collector.data_collector import start_producing
+
+    start_producing()
 
 if __name__ == "__main__":
     main()
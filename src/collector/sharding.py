@@ -0,0 +1,84 @@
+import hashlib
+import os
+
+def ticker_key(ticker):
+    """
+    Returns a stable 64-bit hash of a ticker symbol.
+
+    Python's built-in hash() is salted per process, so an explicit digest is used
+    to make every collector instance agree on the key.
+
+    Args:
+        ticker (str): The stock ticker symbol.
+
+    Returns:
+        int: The 64-bit key.
+    """
+    return int.from_bytes(hashlib.blake2b(ticker.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def jump_consistent_hash(key, num_buckets):
+    """
+    Maps a 64-bit key to one of `num_buckets` buckets (Lamping and Veach, 2014).
+
+    When the number of buckets grows from N to N + 1, only 1/(N + 1) of the keys
+    move, and all of them move to the new bucket.
+
+    Args:
+        key (int): A 64-bit key.
+        num_buckets (int): The number of buckets.
+
+    Returns:
+        int: The bucket index in [0, num_buckets).
+    """
+    if num_buckets < 1:
+        raise ValueError("num_buckets must be at least 1")
+    bucket, candidate = -1, 0
+    while candidate < num_buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+def shard_for(ticker, shard_count):
+    """
+    Returns the index of the shard that owns a ticker.
+    """
+    return jump_consistent_hash(ticker_key(ticker), shard_count)
+
+def select_shard(tickers, shard_index, shard_count):
+    """
+    Returns the tickers owned by one shard, in their configured order.
+
+    Args:
+        tickers (list): The full ticker universe.
+        shard_index (int): The index of this collector instance.
+        shard_count (int): The number of collector instances.
+
+    Returns:
+        list: The tickers this instance collects.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} is outside 0..{shard_count - 1}")
+    if shard_count == 1:
+        return list(tickers)
+    return [ticker for ticker in tickers if shard_for(ticker, shard_count) == shard_index]
+
+def shard_settings(config, environ=os.environ):
+    """
+    Reads the shard index and count of this instance.
+
+    The STOCKVISION_SHARD_INDEX and STOCKVISION_SHARD_COUNT environment variables
+    override the `shard` section of the Data Collector configuration, so several
+    instances can share one config file.
+
+    Args:
+        config (dict): The `data_collector` configuration section.
+        environ (dict): The environment to read overrides from.
+
+    Returns:
+        tuple: (shard_index, shard_count).
+    """
+    shard_config = config.get('shard', {})
+    shard_index = int(environ.get('STOCKVISION_SHARD_INDEX', shard_config.get('index', 0)))
+    shard_count = int(environ.get('STOCKVISION_SHARD_COUNT', shard_config.get('count', 1)))
+    return shard_index, shard_count
@@ -0,0 +1,319 @@
+import glob
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+# Columns of a Yahoo Finance price frame, mapped to the message fields
+OHLCV_FIELDS = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
+
+# Length of the supported intraday bar intervals
+INTRADAY_INTERVALS = {'1m': pd.Timedelta(minutes=1), '5m': pd.Timedelta(minutes=5)}
+
+# Accepted column names of recorded market data files
+REPLAY_COLUMN_ALIASES = {'symbol': 'ticker', 'date': 'timestamp', 'datetime': 'timestamp'}
+
+def frame_to_records(frame, tickers, timestamp):
+    """
+    Converts a multi-symbol Yahoo Finance download into per-ticker stock data records.
+
+    The latest valid bar of every ticker is selected column-wise and the wide
+    (field, ticker) frame is pivoted into one row per ticker, so no Python loop
+    runs over the rows of the frame.
+
+    Args:
+        frame (pandas.DataFrame): The frame returned by `yf.download`.
+        tickers (list): The tickers that were requested.
+        timestamp (str): ISO timestamp stamped on every record.
+
+    Returns:
+        list: A list of stock data dictionaries, one per ticker with data.
+    """
+    if frame is None or frame.empty:
+        return []
+    if not isinstance(frame.columns, pd.MultiIndex):
+        # Single-symbol downloads come back with flat columns
+        frame = pd.concat({tickers[0]: frame}, axis=1).swaplevel(0, 1, axis=1)
+
+    # Last non-missing value of every (field, ticker) column, then one row per ticker
+    latest = frame.ffill().iloc[-1].unstack(level=0)
+    bars = latest.reindex(columns=list(OHLCV_FIELDS)).dropna(subset=['Close'])
+    bars = bars.rename(columns=OHLCV_FIELDS).astype(float)
+    bars['volume'] = bars['volume'].fillna(0).astype('int64')
+    bars.insert(0, 'ticker', bars.index.astype(str))
+    bars['timestamp'] = timestamp
+    return bars.to_dict('records')
+
+class MarketDataSource:
+    """
+    Interface of a market data backend used by the Data Collector.
+
+    Sources return stock data dictionaries with the fields ticker, open, high,
+    low, close, volume and an ISO timestamp.
+    """
+
+    name = None
+
+    def fetch(self, ticker):
+        """
+        Fetches the latest bar of one ticker.
+
+        Args:
+            ticker (str): The stock ticker symbol.
+
+        Returns:
+            dict: The stock data, or None if the source has no data for the ticker.
+        """
+        raise NotImplementedError
+
+    def fetch_batch(self, tickers):
+        """
+        Fetches the latest bar of many tickers.
+
+        Args:
+            tickers (list): The stock ticker symbols.
+
+        Returns:
+            list: The stock data dictionaries of the tickers with data.
+        """
+        return [data for data in map(self.fetch, tickers) if data]
+
+    def fetch_intraday(self, ticker, interval, since=None):
+        """
+        Fetches the completed intraday bars of one ticker that are newer than a watermark.
+
+        Args:
+            ticker (str): The stock ticker symbol.
+            interval (str): The bar interval, '1m' or '5m'.
+            since (str): ISO timestamp of the newest bar already published, or None.
+
+        Returns:
+            list: Stock data dictionaries in bar order, each with an `interval` field.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not provide intraday bars")
+
+def bars_to_records(hist, ticker, interval, since=None, now=None):
+    """
+    Converts an intraday history frame into records of the bars that completed after `since`.
+
+    Bar timestamps are the exchange's wall-clock start time of the bar. The bar that
+    is still forming is left out so it is published once, with its final values.
+
+    Args:
+        hist (pandas.DataFrame): Bars indexed by their start time.
+        ticker (str): The stock ticker symbol.
+        interval (str): The bar interval, '1m' or '5m'.
+        since (str): ISO timestamp of the newest bar already published, or None.
+        now (pandas.Timestamp): Current time in the timezone of the index; defaults to now.
+
+    Returns:
+        list: Stock data dictionaries in bar order.
+    """
+    if hist.empty:
+        return []
+    index = hist.index
+    if now is None:
+        now = pd.Timestamp.now(tz=index.tz)
+    wall_clock = index.tz_localize(None) if index.tz is not None else index
+    keep = (index + INTRADAY_INTERVALS[interval]) <= now
+    if since is not None:
+        keep &= wall_clock > pd.Timestamp(since)
+    bars = hist.loc[keep, list(OHLCV_FIELDS)].rename(columns=OHLCV_FIELDS).astype(float)
+    bars['volume'] = bars['volume'].fillna(0).astype('int64')
+    bars.insert(0, 'ticker', ticker)
+    bars['timestamp'] = wall_clock[keep].strftime('%Y-%m-%dT%H:%M:%S')
+    bars['interval'] = interval
+    return bars.dropna(subset=['close']).to_dict('records')
+
+class YahooFinanceSource(MarketDataSource):
+    """
+    Live market data from the Yahoo Finance API.
+    """
+
+    name = 'yahoo'
+
+    def __init__(self, request_timeout=10):
+        """
+        Args:
+            request_timeout (float): HTTP timeout in seconds for each request.
+        """
+        self.request_timeout = request_timeout
+
+    def fetch(self, ticker):
+        stock = yf.Ticker(ticker)
+        hist = stock.history(period="1d", timeout=self.request_timeout)
+        if hist.empty:
+            print(f"No data found for ticker {ticker}")
+            return None
+        data = {
+            'ticker': ticker,
+            'open': float(hist['Open'].iloc[-1]),
+            'high': float(hist['High'].iloc[-1]),
+            'low': float(hist['Low'].iloc[-1]),
+            'close': float(hist['Close'].iloc[-1]),
+            'volume': int(hist['Volume'].iloc[-1]),
+            'timestamp': datetime.now().isoformat()
+        }
+        return data
+
+    def fetch_batch(self, tickers):
+        tickers = list(tickers)
+        frame = yf.download(
+            tickers=tickers,
+            period="1d",
+            group_by='column',
+            threads=True,
+            progress=False,
+            timeout=self.request_timeout
+        )
+        records = frame_to_records(frame, tickers, datetime.now().isoformat())
+        missing = len(tickers) - len(records)
+        if missing:
+            print(f"No data found for {missing} of {len(tickers)} tickers")
+        return records
+
+    def fetch_intraday(self, ticker, interval, since=None):
+        stock = yf.Ticker(ticker)
+        if since is None:
+            hist = stock.history(period="1d", interval=interval, timeout=self.request_timeout)
+        else:
+            # Only the bars after the watermark bar are requested; yfinance reads a naive
+            # start as wall-clock time of the exchange, like the watermark itself. Yahoo
+            # only serves a few days of minute bars, so never ask for more
+            start = max(pd.Timestamp(since) + INTRADAY_INTERVALS[interval],
+                        pd.Timestamp.now() - pd.Timedelta(days=6))
+            hist = stock.history(start=start.to_pydatetime(), interval=interval, timeout=self.request_timeout)
+        return bars_to_records(hist, ticker, interval, since)
+
+class ReplaySource(MarketDataSource):
+    """
+    Replays recorded OHLCV bars from CSV or Parquet files.
+
+    Files need the columns ticker (or symbol), timestamp (or date/datetime), open,
+    high, low, close and volume. Bars are replayed in timestamp order, one group of
+    bars sharing a timestamp at a time, and the gaps between timestamps are
+    compressed by `speedup`: 1 replays in real time, 100 a hundred times faster and
+    0 as fast as possible. Replayed records keep their recorded timestamp.
+    """
+
+    name = 'replay'
+
+    def __init__(self, paths, speedup=0, loop=False):
+        """
+        Args:
+            paths (list): File paths or glob patterns of .csv and .parquet files.
+            speedup (float): Replay speed factor; 0 or less disables pacing.
+            loop (bool): Restart from the first bar after the last one.
+        """
+        self.speedup = float(speedup or 0)
+        self.loop = loop
+        self.frame = self._load(paths)
+        timestamps = self.frame['timestamp'].to_numpy()
+        # Start offsets of every group of bars that share a timestamp
+        self._boundaries = np.concatenate((
+            [0], np.flatnonzero(timestamps[1:] != timestamps[:-1]) + 1, [len(timestamps)]
+        ))
+        self._position = 0
+        self._latest = {}
+
+    @staticmethod
+    def _load(paths):
+        files = sorted({path for pattern in paths for path in glob.glob(pattern)})
+        if not files:
+            raise FileNotFoundError(f"No replay files match {paths}")
+        frames = []
+        for path in files:
+            if path.endswith('.parquet'):
+                frame = pd.read_parquet(path)
+            else:
+                frame = pd.read_csv(path)
+            frame.columns = [REPLAY_COLUMN_ALIASES.get(c.lower(), c.lower()) for c in frame.columns]
+            frames.append(frame[['ticker', 'timestamp', 'open', 'high', 'low', 'close', 'volume']])
+        frame = pd.concat(frames, ignore_index=True)
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+        frame['volume'] = frame['volume'].fillna(0).astype('int64')
+        frame = frame.dropna(subset=['close']).sort_values('timestamp', kind='stable')
+        return frame.reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _next_group(self):
+        """
+        Returns the next group of bars sharing a timestamp, or None when the files are exhausted.
+        """
+        if self._position >= len(self._boundaries) - 1:
+            if not self.loop or len(self.frame) == 0:
+                return None
+            self._position = 0
+        start, end = self._boundaries[self._position], self._boundaries[self._position + 1]
+        self._position += 1
+        group = self.frame.iloc[start:end]
+        records = group.assign(timestamp=group['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S')).to_dict('records')
+        self._latest.update((record['ticker'], record) for record in records)
+        return group['timestamp'].iloc[0], records
+
+    def stream(self, tickers=None):
+        """
+        Yields the recorded bars group by group, sleeping between groups to honour the speed-up factor.
+
+        Args:
+            tickers (list): Only replay these tickers; None replays every ticker in the files.
+
+        Yields:
+            list: The stock data dictionaries of one timestamp.
+        """
+        wanted = None if tickers is None else set(tickers)
+        previous = None
+        next_due = time.monotonic()
+        while True:
+            group = self._next_group()
+            if group is None:
+                return
+            timestamp, records = group
+            if self.speedup > 0 and previous is not None and timestamp > previous:
+                next_due += (timestamp - previous).total_seconds() / self.speedup
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            previous = timestamp
+            if wanted is not None:
+                records = [record for record in records if record['ticker'] in wanted]
+            if records:
+                yield records
+
+    def fetch(self, ticker):
+        """
+        Returns the most recently replayed bar of a ticker.
+        """
+        return self._latest.get(ticker)
+
+    def fetch_batch(self, tickers):
+        """
+        Advances the replay by one timestamp and returns its bars for the given tickers.
+        """
+        group = self._next_group()
+        if group is None:
+            return []
+        wanted = set(tickers)
+        return [record for record in group[1] if record['ticker'] in wanted]
+
+def create_source(config):
+    """
+    Creates the market data source selected by the Data Collector configuration.
+
+    Args:
+        config (dict): The `data_collector` configuration section.
+
+    Returns:
+        MarketDataSource: The configured source.
+    """
+    source = config.get('source', 'yahoo')
+    if source == 'yahoo':
+        return YahooFinanceSource(request_timeout=config.get('request_timeout', 10))
+    if source == 'replay':
+        replay_config = config.get('replay', {})
+        return ReplaySource(replay_config['paths'], speedup=replay_config.get('speedup', 0),
+                            loop=replay_config.get('loop', False))
+    raise ValueError(f"Unknown market data source: {source}")
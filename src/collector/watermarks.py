@@ -0,0 +1,78 @@
+import json
+import os
+
+class WatermarkStore:
+    """
+    Per-ticker watermark of the newest intraday bar that has been published.
+
+    Like LastBarCache, new watermarks are staged while their bars are in flight
+    and only advance once the broker has confirmed them, so bars of a failed
+    cycle are fetched again. Watermarks are ISO timestamps and can be persisted
+    to a JSON file so a restarted collector resumes where it stopped.
+    """
+
+    def __init__(self, snapshot_path=None):
+        """
+        Args:
+            snapshot_path (str): JSON file used to persist the watermarks; None keeps them in memory only.
+        """
+        self.snapshot_path = snapshot_path
+        self._watermarks = {}
+        self._staged = {}
+        if snapshot_path:
+            self.load()
+
+    def get(self, ticker):
+        """
+        Returns the watermark of a ticker, or None if no bar was published yet.
+        """
+        return self._staged.get(ticker, self._watermarks.get(ticker))
+
+    def stage(self, ticker, timestamp):
+        """
+        Moves a ticker's pending watermark forward to `timestamp`.
+        """
+        current = self.get(ticker)
+        if current is None or timestamp > current:
+            self._staged[ticker] = timestamp
+
+    def confirm(self):
+        """
+        Advances the watermarks of every confirmed bar and persists them.
+        """
+        if not self._staged:
+            return
+        self._watermarks.update(self._staged)
+        self._staged = {}
+        if self.snapshot_path:
+            self.save()
+
+    def discard(self):
+        """
+        Forgets pending watermarks whose bars were not delivered.
+        """
+        self._staged = {}
+
+    def save(self):
+        """
+        Writes the watermarks to the snapshot file atomically.
+        """
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w') as snapshot_file:
+            json.dump(self._watermarks, snapshot_file)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def load(self):
+        """
+        Restores the watermarks from the snapshot file, if there is one.
+        """
+        try:
+            with open(self.snapshot_path, 'r') as snapshot_file:
+                self._watermarks = json.load(snapshot_file)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"Ignoring unreadable snapshot {self.snapshot_path}: {e}")
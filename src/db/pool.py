@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+import weakref
+import psycopg2
+from psycopg2 import extensions
+
+# Load configuration from JSON file
+config_path = os.path.join(os.path.dirname(__file__), '../../config/config.json')
+with open(config_path, 'r') as config_file:
+    config = json.load(config_file)
+
+# PostgreSQL connection parameters, shared by every service
+db_config = config['data_recorder']['database']
+pool_config = config.get('database_pool', {})
+
+class PoolTimeout(Exception):
+    """
+    Raised when no pooled connection became free within the checkout timeout.
+    """
+
+class PooledConnection:
+    """
+    Proxy of a pooled psycopg2 connection.
+
+    It behaves like the connection it wraps, except that `close` hands the
+    connection back to the pool instead of closing it, so existing code written
+    as connect/use/close reuses connections without changes. Callers close it in
+    a `finally` block or use it as a context manager; a proxy that is garbage
+    collected without being closed still returns its connection.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._finalizer = weakref.finalize(self, pool.release, conn)
+        self._finalizer.atexit = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        self.close()
+
+    def execute_prepared(self, cursor, name, params=()):
+        """
+        Executes a registered hot query as a server-side prepared statement.
+
+        The statement is prepared once per connection and reused by every later
+        checkout of that connection, which saves parsing and planning the query.
+
+        Args:
+            cursor (psycopg2.extensions.cursor): A cursor of this connection.
+            name (str): Name the query was registered under with `register_prepared`.
+            params (tuple): The query parameters.
+        """
+        self._pool.prepare(self._conn, cursor, name)
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def close(self):
+        """
+        Returns the connection to the pool. Calling it again has no effect.
+        """
+        if self._conn is not None:
+            self._conn = None
+            self._finalizer()
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections shared by every service of the process.
+
+    `minconn` connections are opened up front and up to `maxconn` are opened on
+    demand; every returned connection stays open for the next checkout. A
+    checkout blocks until a connection is free, for at most `checkout_timeout`
+    seconds, instead of opening more connections than the database allows.
+    Connections that sat idle for longer than `health_check_interval` seconds are
+    checked with a trivial query on checkout and replaced if the server dropped them.
+    """
+
+    def __init__(self, db_params, minconn=1, maxconn=10, health_check_interval=30, checkout_timeout=10):
+        """
+        Args:
+            db_params (dict): Keyword arguments of `psycopg2.connect`.
+            minconn (int): Connections opened up front.
+            maxconn (int): Maximum number of connections.
+            health_check_interval (float): Idle seconds after which a connection is checked on checkout.
+            checkout_timeout (float): Seconds to wait for a free connection.
+        """
+        self.db_params = db_params
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self.pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # Reentrant, since a leaked proxy can be collected, and release its
+        # connection, while this thread holds the lock
+        self._lock = threading.RLock()
+        # State of a connection lives as long as the connection object itself, so
+        # a new connection never inherits the statements of a closed one
+        self._last_used = weakref.WeakKeyDictionary()
+        self._prepared = weakref.WeakKeyDictionary()
+        self._idle = [psycopg2.connect(**db_params) for _ in range(minconn)]
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(conn)
+        if last_used is None or time.monotonic() - last_used < self.health_check_interval:
+            # Freshly opened or recently used
+            return True
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._last_used.pop(conn, None)
+            self._prepared.pop(conn, None)
+        if not conn.closed:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def connection(self):
+        """
+        Checks out a healthy connection.
+
+        Returns:
+            PooledConnection: The connection; close it to return it to the pool.
+
+        Raises:
+            PoolTimeout: If every connection stayed busy for `checkout_timeout` seconds.
+        """
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolTimeout(f"No database connection became free within {self.checkout_timeout} seconds")
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    # Every slot holds at most one connection, so this stays within maxconn
+                    return PooledConnection(self, psycopg2.connect(**self.db_params))
+                if self._healthy(conn):
+                    return PooledConnection(self, conn)
+                print("Replacing a broken database connection")
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        """
+        Takes a connection back; the pool rolls back any transaction left open.
+        """
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            with self._lock:
+                self._last_used[conn] = time.monotonic()
+                self._idle.append(conn)
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def prepare(self, conn, cursor, name):
+        """
+        Prepares a registered query on a connection unless it already was.
+        """
+        with self._lock:
+            prepared = self._prepared.setdefault(conn, set())
+            if name in prepared:
+                return
+        cursor.execute(f"PREPARE {name} AS {PREPARED_QUERIES[name]}")
+        with self._lock:
+            prepared.add(name)
+
+    def close(self):
+        """
+        Closes the idle connections of the pool.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+# Hot queries that are executed as prepared statements, by name
+PREPARED_QUERIES = {}
+
+def register_prepared(name, query):
+    """
+    Registers a query for `PooledConnection.execute_prepared`.
+
+    Args:
+        name (str): Statement name, a valid SQL identifier.
+        query (str): The query, with $1, $2, ... placeholders.
+    """
+    PREPARED_QUERIES[name] = query
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Returns the connection pool of this process, creating it on first use.
+
+    Connections cannot be shared with a forked child, so a child process gets a pool of its own.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(
+                db_config,
+                minconn=pool_config.get('minconn', 1),
+                maxconn=pool_config.get('maxconn', 10),
+                health_check_interval=pool_config.get('health_check_interval', 30),
+                checkout_timeout=pool_config.get('checkout_timeout', 10)
+            )
+        return _pool
+
+def get_db_connection():
+    """
+    Checks out a connection to the PostgreSQL database from the shared pool.
+
+    Returns:
+        PooledConnection: A connection object to interact with the PostgreSQL database;
+            closing it returns it to the pool.
+    """
+    return get_pool().connection()
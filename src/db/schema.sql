@@ -2,8 +2,11 @@
 
 -- Table: stock_data
 -- This table stores raw stock data retrieved from the Yahoo Finance API.
+-- It is range-partitioned by month; src/db/schema_manager.py creates the monthly
+-- partitions ahead of time and archives expired ones. There is no default
+-- partition, so the planner can scan the partitions in date order; a row needs
+-- the partition of its month, which the backfill creates for older months.
 CREATE TABLE stock_data (
-    id SERIAL PRIMARY KEY,                  -- Unique identifier for each record
     ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
     date DATE NOT NULL,                     -- Date of the stock data
     open DECIMAL(10, 2) DEFAULT 0,          -- Opening price of the stock
@@ -11,11 +14,102 @@ CREATE TABLE stock_data (
     low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the stock
     close DECIMAL(10, 2) DEFAULT 0,         -- Closing price of the stock
     volume BIGINT DEFAULT 0,                -- Trading volume
-    UNIQUE (ticker, date)                   -- Ensure no duplicate records for the same ticker and date
+    PRIMARY KEY (ticker, date)              -- One record per ticker and date
+) PARTITION BY RANGE (date);
+
+-- Covering index of the latest-rows queries, created on every partition
+CREATE INDEX stock_data_ticker_date_covering_idx
+    ON stock_data (ticker, date DESC) INCLUDE (open, high, low, close, volume);
+
+-- Table: stock_data_intraday
+-- This table stores intraday (1m/5m) bars, keyed by the start time of each bar.
+-- It is range-partitioned by month like stock_data.
+CREATE TABLE stock_data_intraday (
+    ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
+    ts TIMESTAMP NOT NULL,                  -- Start time of the bar (exchange local time)
+    bar_interval VARCHAR(3) NOT NULL,       -- Length of the bar (e.g., 1m, 5m)
+    open DECIMAL(10, 2) DEFAULT 0,          -- Opening price of the bar
+    high DECIMAL(10, 2) DEFAULT 0,          -- Highest price of the bar
+    low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the bar
+    close DECIMAL(10, 2) DEFAULT 0,         -- Closing price of the bar
+    volume BIGINT DEFAULT 0,                -- Trading volume of the bar
+    PRIMARY KEY (ticker, ts)                -- One bar per ticker and start time
+) PARTITION BY RANGE (ts);
+
+CREATE INDEX stock_data_intraday_ticker_ts_covering_idx
+    ON stock_data_intraday (ticker, ts DESC) INCLUDE (bar_interval, open, high, low, close, volume);
+
+-- Tables: stock_rollup_1m, stock_rollup_5m, stock_rollup_15m, stock_rollup_1h, stock_rollup_1d
+-- These tables store the OHLCV bars aggregated from incoming data by the recorder, one per granularity.
+CREATE TABLE stock_rollup_1m (
+    ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
+    bucket TIMESTAMP NOT NULL,              -- Start of the window (exchange local time)
+    open DECIMAL(10, 2) DEFAULT 0,          -- First price of the window
+    high DECIMAL(10, 2) DEFAULT 0,          -- Highest price of the window
+    low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the window
+    close DECIMAL(10, 2) DEFAULT 0,         -- Last price of the window
+    volume BIGINT DEFAULT 0,                -- Volume traded in the window
+    PRIMARY KEY (ticker, bucket)
+);
+
+CREATE TABLE stock_rollup_5m (
+    ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
+    bucket TIMESTAMP NOT NULL,              -- Start of the window (exchange local time)
+    open DECIMAL(10, 2) DEFAULT 0,          -- First price of the window
+    high DECIMAL(10, 2) DEFAULT 0,          -- Highest price of the window
+    low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the window
+    close DECIMAL(10, 2) DEFAULT 0,         -- Last price of the window
+    volume BIGINT DEFAULT 0,                -- Volume traded in the window
+    PRIMARY KEY (ticker, bucket)
+);
+
+CREATE TABLE stock_rollup_15m (
+    ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
+    bucket TIMESTAMP NOT NULL,              -- Start of the window (exchange local time)
+    open DECIMAL(10, 2) DEFAULT 0,          -- First price of the window
+    high DECIMAL(10, 2) DEFAULT 0,          -- Highest price of the window
+    low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the window
+    close DECIMAL(10, 2) DEFAULT 0,         -- Last price of the window
+    volume BIGINT DEFAULT 0,                -- Volume traded in the window
+    PRIMARY KEY (ticker, bucket)
+);
+
+CREATE TABLE stock_rollup_1h (
+    ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
+    bucket TIMESTAMP NOT NULL,              -- Start of the window (exchange local time)
+    open DECIMAL(10, 2) DEFAULT 0,          -- First price of the window
+    high DECIMAL(10, 2) DEFAULT 0,          -- Highest price of the window
+    low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the window
+    close DECIMAL(10, 2) DEFAULT 0,         -- Last price of the window
+    volume BIGINT DEFAULT 0,                -- Volume traded in the window
+    PRIMARY KEY (ticker, bucket)
+);
+
+CREATE TABLE stock_rollup_1d (
+    ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
+    bucket TIMESTAMP NOT NULL,              -- Start of the window (exchange local time)
+    open DECIMAL(10, 2) DEFAULT 0,          -- First price of the window
+    high DECIMAL(10, 2) DEFAULT 0,          -- Highest price of the window
+    low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the window
+    close DECIMAL(10, 2) DEFAULT 0,         -- Last price of the window
+    volume BIGINT DEFAULT 0,                -- Volume traded in the window
+    PRIMARY KEY (ticker, bucket)
+);
+
+-- Table: backfill_progress
+-- This table records the history chunks already loaded by the backfill command, so it can resume.
+CREATE TABLE backfill_progress (
+    ticker VARCHAR(10) NOT NULL,                     -- Stock ticker symbol
+    chunk_start DATE NOT NULL,                       -- First day of the chunk
+    chunk_end DATE NOT NULL,                         -- Day after the last day of the chunk
+    row_count INTEGER NOT NULL DEFAULT 0,            -- Number of rows loaded for the ticker
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- Completion timestamp
+    PRIMARY KEY (ticker, chunk_start, chunk_end)
 );
 
 -- Table: stock_analysis
--- This table stores the results of the data analysis.
+-- This table stores analysis results as JSON documents. It is no longer written;
+-- new results go to analysis_values and analysis_latest.
 CREATE TABLE stock_analysis (
     id SERIAL PRIMARY KEY,                                  -- Unique identifier for each analysis record
     ticker VARCHAR(10) NOT NULL,                            -- Stock ticker symbol
@@ -29,7 +123,57 @@ CREATE TABLE stock_analysis (
 CREATE TABLE analysis_types (
     id SERIAL PRIMARY KEY,                           -- Unique identifier for each analysis type
     type_name VARCHAR(50) UNIQUE NOT NULL,           -- Name of the analysis type
-    description TEXT                                 -- Description of the analysis type
+    description TEXT,                                -- Description of the analysis type
+    value_names TEXT[] NOT NULL DEFAULT '{}'         -- Names of the values stored for the type, in order
+);
+
+-- Table: analysis_values
+-- This table stores one row of indicator values per ticker, analysis type and day;
+-- reruns on the same day update the row.
+CREATE TABLE analysis_values (
+    ticker VARCHAR(10) NOT NULL,                     -- Stock ticker symbol
+    analysis_date DATE NOT NULL,                     -- Date of the analysis
+    analysis_type VARCHAR(50) NOT NULL,              -- Type of analysis performed
+    outputs DOUBLE PRECISION[] NOT NULL,             -- Values in the order of analysis_types.value_names
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- Time of the last update
+    PRIMARY KEY (ticker, analysis_type, analysis_date)
+);
+
+-- Table: analysis_latest
+-- This table holds the newest result of every ticker and analysis type, for single-row reads.
+CREATE TABLE analysis_latest (
+    ticker VARCHAR(10) NOT NULL,                     -- Stock ticker symbol
+    analysis_type VARCHAR(50) NOT NULL,              -- Type of analysis performed
+    analysis_date DATE NOT NULL,                     -- Date of the newest analysis
+    outputs DOUBLE PRECISION[] NOT NULL,             -- Values in the order of analysis_types.value_names
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- Time of the last update
+    PRIMARY KEY (ticker, analysis_type)
+);
+
+-- Table: backtest_runs
+-- This table records every stored backtest parameter sweep.
+CREATE TABLE backtest_runs (
+    id SERIAL PRIMARY KEY,                           -- Unique identifier for each run
+    strategy VARCHAR(50) NOT NULL,                   -- Backtested strategy, e.g. ma_crossover
+    start_date DATE NOT NULL,                        -- First day of the history
+    end_date DATE NOT NULL,                          -- Day after the last day of the history
+    ticker_count INTEGER NOT NULL,                   -- Number of tickers in the portfolio
+    cost_bps DOUBLE PRECISION NOT NULL,              -- Trading cost per unit of position in basis points
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP   -- Creation timestamp
+);
+
+-- Table: backtest_results
+-- This table stores the portfolio performance of every parameter pair of a backtest run.
+CREATE TABLE backtest_results (
+    run_id INTEGER NOT NULL REFERENCES backtest_runs (id) ON DELETE CASCADE, -- Backtest run
+    fast_window INTEGER NOT NULL,                    -- Window of the fast moving average
+    slow_window INTEGER NOT NULL,                    -- Window of the slow moving average
+    total_return DOUBLE PRECISION NOT NULL,          -- Return over the whole history
+    annual_return DOUBLE PRECISION NOT NULL,         -- Annualized return
+    sharpe DOUBLE PRECISION NOT NULL,                -- Annualized Sharpe ratio
+    max_drawdown DOUBLE PRECISION NOT NULL,          -- Largest peak-to-trough loss, as a negative fraction
+    turnover DOUBLE PRECISION NOT NULL,              -- Position changes per ticker and year
+    PRIMARY KEY (run_id, fast_window, slow_window)
 );
 
 -- Table: api_keys
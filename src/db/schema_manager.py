@@ -0,0 +1,311 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python src/db/schema_manager.py create --from 2014-01
+# python src/db/schema_manager.py maintain
+# deactivate
+
+import argparse
+import os
+import sys
+from datetime import date, datetime
+
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from db.pool import config, get_db_connection
+
+schema_config = config.get('schema', {})
+
+# Partitioned tables: partition key and the columns covered by the latest-rows index
+PARTITIONED_TABLES = {
+    'stock_data': {
+        'key': 'date',
+        'columns': """
+    ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
+    date DATE NOT NULL,                     -- Date of the stock data
+    open DECIMAL(10, 2) DEFAULT 0,          -- Opening price of the stock
+    high DECIMAL(10, 2) DEFAULT 0,          -- Highest price of the stock
+    low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the stock
+    close DECIMAL(10, 2) DEFAULT 0,         -- Closing price of the stock
+    volume BIGINT DEFAULT 0,                -- Trading volume
+    PRIMARY KEY (ticker, date)              -- One record per ticker and date
+""",
+        'include': ['open', 'high', 'low', 'close', 'volume'],
+    },
+    'stock_data_intraday': {
+        'key': 'ts',
+        'columns': """
+    ticker VARCHAR(10) NOT NULL,            -- Stock ticker symbol
+    ts TIMESTAMP NOT NULL,                  -- Start time of the bar (exchange local time)
+    bar_interval VARCHAR(3) NOT NULL,       -- Length of the bar (e.g., 1m, 5m)
+    open DECIMAL(10, 2) DEFAULT 0,          -- Opening price of the bar
+    high DECIMAL(10, 2) DEFAULT 0,          -- Highest price of the bar
+    low DECIMAL(10, 2) DEFAULT 0,           -- Lowest price of the bar
+    close DECIMAL(10, 2) DEFAULT 0,         -- Closing price of the bar
+    volume BIGINT DEFAULT 0,                -- Trading volume of the bar
+    PRIMARY KEY (ticker, ts)                -- One bar per ticker and start time
+""",
+        'include': ['bar_interval', 'open', 'high', 'low', 'close', 'volume'],
+    },
+}
+
+def month_start(day):
+    """
+    Returns the first day of the month of a date.
+    """
+    return date(day.year, day.month, 1)
+
+def add_months(day, months):
+    """
+    Returns the first day of the month `months` months after the month of a date.
+    """
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table, month):
+    """
+    Returns the name of the partition holding one month, e.g. stock_data_y2024m07.
+    """
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+def create_table_sql(table):
+    """
+    Returns the statements creating a partitioned table and its covering index.
+
+    The index on (ticker, key DESC) INCLUDE (...) is created on the parent, so
+    PostgreSQL creates it on every partition, including future ones. The table
+    has no default partition, which would keep the planner from treating the
+    monthly partitions as ordered, so `WHERE ticker = %s ORDER BY key DESC LIMIT n`
+    is served by index-only scans of the newest partitions, whose cost does not
+    grow with the length of the history.
+    """
+    spec = PARTITIONED_TABLES[table]
+    return [
+        f"CREATE TABLE IF NOT EXISTS {table} ({spec['columns']}) PARTITION BY RANGE ({spec['key']})",
+        f"CREATE INDEX IF NOT EXISTS {table}_ticker_{spec['key']}_covering_idx "
+        f"ON {table} (ticker, {spec['key']} DESC) INCLUDE ({', '.join(spec['include'])})",
+    ]
+
+def create_partition_sql(table, month):
+    """
+    Returns the statement creating the partition of one month, if it does not exist yet.
+    """
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+def list_partitions(cursor, table):
+    """
+    Returns the monthly partitions attached to a table, oldest first.
+
+    Returns:
+        list: (month, partition name) tuples.
+    """
+    cursor.execute("""
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = %s
+    """, (table,))
+    prefix = f"{table}_y"
+    partitions = []
+    for name, in cursor.fetchall():
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 7 and suffix[4] == 'm':
+            partitions.append((date(int(suffix[:4]), int(suffix[5:]), 1), name))
+    return sorted(partitions)
+
+def create_partitions(cursor, table, start, end):
+    """
+    Creates the monthly partitions of a table from the month of `start` through the month of `end`.
+
+    Returns:
+        int: The number of partition statements run.
+    """
+    statements = 0
+    month = month_start(start)
+    while month <= end:
+        cursor.execute(create_partition_sql(table, month))
+        statements += 1
+        month = add_months(month, 1)
+    return statements
+
+def create_tables(cursor, start, months_ahead, tables=None):
+    """
+    Creates the partitioned tables and their monthly partitions from `start` up to
+    `months_ahead` months after the current month.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): A database cursor.
+        start (date): First month that gets a partition.
+        months_ahead (int): Months created in advance of the current one.
+        tables (list): The tables to create; defaults to every partitioned table.
+
+    Returns:
+        int: The number of partition statements run.
+    """
+    statements = 0
+    end = add_months(month_start(date.today()), months_ahead)
+    for table in tables or PARTITIONED_TABLES:
+        for statement in create_table_sql(table):
+            cursor.execute(statement)
+        statements += create_partitions(cursor, table, start, end)
+    return statements
+
+def ensure_partitions(table, start, end):
+    """
+    Creates the missing monthly partitions of a table for a date range, in a transaction
+    of its own, e.g. before a backfill writes months older than the planned range.
+
+    Args:
+        table (str): The partitioned table.
+        start (date): First day of the range.
+        end (date): Last day of the range.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        create_partitions(cursor, table, start, end)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def archive_partitions(cursor, table, retention_months, archive_schema='archive', tablespace=None):
+    """
+    Detaches the partitions older than the retention period and moves them to an archive.
+
+    A detached partition is an ordinary table: it drops out of every query on the
+    parent, but keeps its rows. It is moved into `archive_schema` and, if given, into
+    a tablespace on cheaper or compressed storage.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): A database cursor.
+        table (str): The partitioned table.
+        retention_months (int): Number of months, counting the current one, kept attached.
+        archive_schema (str): Schema receiving the detached partitions.
+        tablespace (str): Tablespace the detached partitions are moved to, if any.
+
+    Returns:
+        list: The names of the archived partitions.
+    """
+    cutoff = add_months(month_start(date.today()), 1 - retention_months)
+    archived = []
+    cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}")
+    for month, name in list_partitions(cursor, table):
+        if month >= cutoff:
+            break
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        cursor.execute(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
+        if tablespace:
+            cursor.execute(f"ALTER TABLE {archive_schema}.{name} SET TABLESPACE {tablespace}")
+        archived.append(name)
+    return archived
+
+def migrate_table(cursor, table):
+    """
+    Converts an existing unpartitioned table into a partitioned one.
+
+    The old table is renamed, the partitioned table is created with partitions for
+    every month of its data, and the rows are copied over. The old table is kept as
+    `<table>_unpartitioned` until it is dropped manually.
+    """
+    key = PARTITIONED_TABLES[table]['key']
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+    for index_name in ('pkey', 'ticker_date_key'):
+        cursor.execute(f"ALTER INDEX IF EXISTS {table}_{index_name} RENAME TO {table}_unpartitioned_{index_name}")
+    cursor.execute(f"SELECT MIN({key}) FROM {table}_unpartitioned")
+    oldest, = cursor.fetchone()
+    if isinstance(oldest, datetime):
+        oldest = oldest.date()
+    create_tables(cursor, oldest or date.today(), schema_config.get('months_ahead', 3), tables=[table])
+    columns = [line.split()[0] for line in PARTITIONED_TABLES[table]['columns'].strip().splitlines()
+               if not line.strip().startswith('PRIMARY KEY')]
+    cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) "
+                   f"SELECT {', '.join(columns)} FROM {table}_unpartitioned")
+
+def maintain(cursor):
+    """
+    Runs the periodic maintenance: creates upcoming partitions and archives expired ones.
+    """
+    create_tables(cursor, month_start(date.today()), schema_config.get('months_ahead', 3))
+    retention = schema_config.get('retention_months')
+    if retention:
+        for table in PARTITIONED_TABLES:
+            for name in archive_partitions(cursor, table, retention,
+                                           archive_schema=schema_config.get('archive_schema', 'archive'),
+                                           tablespace=schema_config.get('archive_tablespace')):
+                print(f"Archived partition {name}")
+
+def run_maintenance():
+    """
+    Runs `maintain` in a transaction of its own; errors are printed, not raised.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        maintain(cursor)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error maintaining partitions: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+def start_maintenance_schedule():
+    """
+    Runs the partition maintenance now and then every `schema.maintain_interval` seconds,
+    so the partitions of the coming months exist before rows arrive for them.
+
+    Returns:
+        BackgroundScheduler: The running scheduler, or None if the interval is not set.
+    """
+    interval = schema_config.get('maintain_interval')
+    if not interval:
+        return None
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = BackgroundScheduler(job_defaults={'coalesce': True, 'max_instances': 1})
+    scheduler.add_job(run_maintenance, 'interval', seconds=interval, next_run_time=datetime.now())
+    scheduler.start()
+    return scheduler
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the partitioned StockVision tables.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    create_parser = subparsers.add_parser('create', help="Create the tables and their monthly partitions")
+    create_parser.add_argument('--from', dest='start', default=None,
+                               help="First month with a partition, as YYYY-MM (default: this month)")
+    subparsers.add_parser('maintain', help="Create upcoming partitions and archive expired ones")
+    migrate_parser = subparsers.add_parser('migrate', help="Partition an existing unpartitioned table")
+    migrate_parser.add_argument('table', choices=sorted(PARTITIONED_TABLES))
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if args.command == 'create':
+            start = date.fromisoformat(f"{args.start}-01") if args.start else date.today()
+            count = create_tables(cursor, start, schema_config.get('months_ahead', 3))
+            print(f"Ensured {count} monthly partitions")
+        elif args.command == 'maintain':
+            maintain(cursor)
+        else:
+            migrate_table(cursor, args.table)
+            print(f"Migrated {args.table}; drop {args.table}_unpartitioned once verified")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
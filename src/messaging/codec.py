@@ -0,0 +1,210 @@
+import json
+import struct
+from datetime import datetime, timedelta
+import numpy as np
+import pika
+
+# Content types advertised in the AMQP properties of stock data messages
+JSON_CONTENT_TYPE = 'application/json'
+BINARY_CONTENT_TYPE = 'application/x-stockvision-bars'
+
+# Binary format: a fixed header followed by packed little-endian records
+BINARY_MAGIC = b'SVB'
+BINARY_VERSION = 2
+HEADER = struct.Struct('<3sBI')  # magic, format version, record count
+RECORD_FIELDS = [
+    ('timestamp', '<i8'),  # Wall-clock time in microseconds since 1970-01-01
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<i8'),
+]
+# The ticker field is as wide as the ticker columns of the database, VARCHAR(10)
+RECORD_DTYPE = np.dtype([('ticker', 'S10')] + RECORD_FIELDS)
+# Record layouts by format version, so messages queued by older collectors still decode
+RECORD_DTYPES = {
+    1: np.dtype([('ticker', 'S12')] + RECORD_FIELDS),
+    BINARY_VERSION: RECORD_DTYPE,
+}
+
+TICKER_BYTES = RECORD_DTYPE['ticker'].itemsize
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+def _to_micros(timestamp):
+    moment = datetime.fromisoformat(timestamp).replace(tzinfo=None)
+    return (moment - EPOCH) // ONE_MICROSECOND
+
+def _encode_ticker(ticker):
+    encoded = ticker.encode('utf-8')
+    if len(encoded) > TICKER_BYTES:
+        # NumPy would silently cut the symbol down to the field width
+        raise ValueError(f"Ticker {ticker!r} is longer than {TICKER_BYTES} bytes")
+    return encoded
+
+def validate_record(record):
+    """
+    Checks that a stock data record can be encoded and stored.
+
+    Args:
+        record (dict): A stock data dictionary.
+
+    Raises:
+        ValueError: If the ticker is missing or too long, or the timestamp is missing or not ISO 8601.
+    """
+    if not record.get('ticker'):
+        raise ValueError("Record has no ticker")
+    _encode_ticker(record['ticker'])
+    try:
+        _to_micros(record['timestamp'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Record of {record['ticker']} has no valid timestamp: {e!r}") from e
+
+def encode_records(records):
+    """
+    Packs stock data records into one binary message body.
+
+    Args:
+        records (list): Stock data dictionaries with ticker, OHLCV and an ISO timestamp.
+
+    Returns:
+        bytes: The message body.
+
+    Raises:
+        ValueError: If a ticker does not fit the ticker field.
+    """
+    array = np.array([
+        (
+            _encode_ticker(record['ticker']),
+            _to_micros(record['timestamp']),
+            record.get('open', 0.0),
+            record.get('high', 0.0),
+            record.get('low', 0.0),
+            record.get('close', 0.0),
+            record.get('volume', 0),
+        )
+        for record in records
+    ], dtype=RECORD_DTYPE)
+    return HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(array)) + array.tobytes()
+
+def decode_array(body):
+    """
+    Unpacks a binary message body into a NumPy structured array without copying it.
+
+    Messages of format version 1 have a wider ticker field; their array uses that layout.
+
+    Args:
+        body (bytes): The message body.
+
+    Returns:
+        numpy.ndarray: The records, with the fields of RECORD_DTYPE.
+    """
+    magic, version, count = HEADER.unpack_from(body)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a StockVision binary message")
+    if version not in RECORD_DTYPES:
+        raise ValueError(f"Unsupported binary message version {version}")
+    return np.frombuffer(body, dtype=RECORD_DTYPES[version], count=count, offset=HEADER.size)
+
+def array_to_records(array, interval=None):
+    """
+    Converts a structured array of records into stock data dictionaries, column by column.
+
+    Args:
+        array (numpy.ndarray): Records with the fields of RECORD_DTYPE.
+        interval (str): Intraday bar interval added to every record, if any.
+
+    Returns:
+        list: Stock data dictionaries in the JSON message format.
+    """
+    tickers = np.char.decode(array['ticker'], 'utf-8').tolist()
+    timestamps = np.datetime_as_string(array['timestamp'].astype('datetime64[us]'), unit='us').tolist()
+    columns = zip(tickers, array['open'].tolist(), array['high'].tolist(), array['low'].tolist(),
+                  array['close'].tolist(), array['volume'].tolist(), timestamps)
+    records = [
+        {'ticker': t, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v, 'timestamp': ts}
+        for t, o, h, l, c, v, ts in columns
+    ]
+    if interval:
+        for record in records:
+            record['interval'] = interval
+    return records
+
+def is_binary(body, properties=None):
+    """
+    Returns True if a message uses the binary format, judged by its content type or its magic bytes.
+    """
+    if getattr(properties, 'content_type', None) == BINARY_CONTENT_TYPE:
+        return True
+    return isinstance(body, (bytes, bytearray, memoryview)) and bytes(body[:3]) == BINARY_MAGIC
+
+def decode_message(body, properties=None):
+    """
+    Decodes a stock data message of either format into a list of records.
+
+    Plain JSON messages holding one record (or a list of records) are still accepted.
+
+    Args:
+        body (bytes): The message body.
+        properties (pika.BasicProperties): The message properties.
+
+    Returns:
+        list: Stock data dictionaries.
+    """
+    if is_binary(body, properties):
+        headers = getattr(properties, 'headers', None)
+        interval = headers.get('x-bar-interval') if isinstance(headers, dict) else None
+        return array_to_records(decode_array(body), interval)
+    data = json.loads(body)
+    return data if isinstance(data, list) else [data]
+
+def encode_messages(records, wire_format='binary', max_records=500, partition=None):
+    """
+    Encodes records into message bodies and their AMQP properties.
+
+    Args:
+        records (list): Stock data dictionaries.
+        wire_format (str): 'binary' packs up to `max_records` records per message,
+            'json' emits one JSON document per record. Intraday bars are packed
+            separately per interval, which is carried in the `x-bar-interval` header.
+        max_records (int): Maximum number of records in one binary message.
+        partition (callable): Maps a ticker to its partition slot. Records are then
+            packed separately per slot, which is carried in the `x-partition` header,
+            so a consistent-hash exchange routes every update of a ticker to the
+            same queue.
+
+    Returns:
+        list: (body, pika.BasicProperties) tuples.
+    """
+    if wire_format == 'json':
+        if partition is None:
+            properties = pika.BasicProperties(content_type=JSON_CONTENT_TYPE)
+            return [(json.dumps(record), properties) for record in records]
+        return [
+            (json.dumps(record), pika.BasicProperties(
+                content_type=JSON_CONTENT_TYPE, headers={'x-partition': str(partition(record['ticker']))}
+            ))
+            for record in records
+        ]
+    if wire_format != 'binary':
+        raise ValueError(f"Unknown wire format: {wire_format}")
+
+    groups = {}
+    for record in records:
+        slot = partition(record['ticker']) if partition is not None else None
+        groups.setdefault((record.get('interval'), slot), []).append(record)
+
+    messages = []
+    for (interval, slot), group in groups.items():
+        for start in range(0, len(group), max_records):
+            chunk = group[start:start + max_records]
+            headers = {'x-format-version': BINARY_VERSION, 'x-record-count': len(chunk)}
+            if interval:
+                headers['x-bar-interval'] = interval
+            if slot is not None:
+                headers['x-partition'] = str(slot)
+            properties = pika.BasicProperties(content_type=BINARY_CONTENT_TYPE, headers=headers)
+            messages.append((encode_records(chunk), properties))
+    return messages
@@ -0,0 +1,282 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python src/recorder/backfill.py --years 10 --workers 8
+# deactivate
+
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from yfinance import shared as yf_shared
+
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from recorder.data_recorder import config, get_db_connection
+from db.schema_manager import ensure_partitions
+
+STAGING_TABLE = 'stock_data_backfill_staging'
+CHUNK_EPOCH = date(1970, 1, 1)
+COLUMNS = ['ticker', 'date', 'open', 'high', 'low', 'close', 'volume']
+
+# yf.download collects its results and errors in module-level state, so
+# concurrent calls would mix up each other's frames; jobs take turns
+# downloading, each spreading its tickers over yfinance's own threads, and only
+# their database loads overlap
+DOWNLOAD_LOCK = threading.Lock()
+
+CREATE_STAGING_QUERY = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+    ticker VARCHAR(10),
+    date DATE,
+    open DECIMAL(10, 2),
+    high DECIMAL(10, 2),
+    low DECIMAL(10, 2),
+    close DECIMAL(10, 2),
+    volume BIGINT
+) ON COMMIT DELETE ROWS
+"""
+
+MERGE_QUERY = f"""
+INSERT INTO stock_data (ticker, date, open, high, low, close, volume)
+SELECT DISTINCT ON (ticker, date) ticker, date, open, high, low, close, volume
+FROM {STAGING_TABLE}
+ORDER BY ticker, date
+ON CONFLICT (ticker, date) DO UPDATE
+SET open = EXCLUDED.open,
+    high = EXCLUDED.high,
+    low = EXCLUDED.low,
+    close = EXCLUDED.close,
+    volume = EXCLUDED.volume
+"""
+
+PROGRESS_QUERY = """
+INSERT INTO backfill_progress (ticker, chunk_start, chunk_end, row_count)
+SELECT * FROM unnest(%s::varchar[], %s::date[], %s::date[], %s::int[])
+ON CONFLICT (ticker, chunk_start, chunk_end) DO UPDATE
+SET row_count = EXCLUDED.row_count,
+    completed_at = CURRENT_TIMESTAMP
+"""
+
+def plan_date_chunks(start, end, chunk_days):
+    """
+    Covers [start, end) with date ranges of `chunk_days` days.
+
+    Chunks are aligned to multiples of `chunk_days` since 1970-01-01 rather than
+    to `start`, so a backfill resumed on a later day plans the same chunks.
+
+    Args:
+        start (date): First day of the backfill.
+        end (date): Day after the last day of the backfill.
+        chunk_days (int): Length of a chunk in days.
+
+    Returns:
+        list: (chunk_start, chunk_end) tuples, end exclusive.
+    """
+    step = timedelta(days=chunk_days)
+    chunk_start = CHUNK_EPOCH + ((start - CHUNK_EPOCH).days // chunk_days) * step
+    chunks = []
+    while chunk_start < end:
+        chunks.append((chunk_start, chunk_start + step))
+        chunk_start += step
+    return chunks
+
+def load_completed_chunks():
+    """
+    Returns the (ticker, chunk_start, chunk_end) keys of every chunk that was already loaded.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT ticker, chunk_start, chunk_end FROM backfill_progress")
+        return set(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+def plan_jobs(tickers, chunks, ticker_batch, completed):
+    """
+    Builds the download jobs, leaving out the ticker/chunk pairs that were already loaded.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        chunks (list): (chunk_start, chunk_end) date ranges.
+        ticker_batch (int): Maximum number of tickers downloaded by one job.
+        completed (set): (ticker, chunk_start, chunk_end) keys of loaded chunks.
+
+    Returns:
+        list: (tickers, chunk_start, chunk_end) jobs.
+    """
+    jobs = []
+    for chunk_start, chunk_end in chunks:
+        pending = [t for t in tickers if (t, chunk_start, chunk_end) not in completed]
+        for i in range(0, len(pending), ticker_batch):
+            jobs.append((pending[i:i + ticker_batch], chunk_start, chunk_end))
+    return jobs
+
+def frame_to_rows(frame, tickers):
+    """
+    Converts a multi-symbol daily download into a long frame with one row per ticker and day.
+
+    Every field of the wide (field, ticker) frame is flattened as a whole array, so
+    no Python loop runs over days or tickers.
+
+    Args:
+        frame (pandas.DataFrame): The frame returned by `yf.download` with group_by='column'.
+        tickers (list): The tickers that were requested.
+
+    Returns:
+        pandas.DataFrame: Rows with the columns of `stock_data`.
+    """
+    if frame is None or frame.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    if not isinstance(frame.columns, pd.MultiIndex):
+        frame = pd.concat({tickers[0]: frame}, axis=1).swaplevel(0, 1, axis=1)
+    symbols = frame['Close'].columns
+    rows = pd.DataFrame({
+        'ticker': np.tile(symbols.astype(str).to_numpy(), len(frame.index)),
+        'date': np.repeat(pd.to_datetime(frame.index).date, len(symbols)),
+    })
+    for field in ['Open', 'High', 'Low', 'Close', 'Volume']:
+        rows[field.lower()] = frame[field].reindex(columns=symbols).to_numpy(dtype=float).ravel()
+    rows = rows.dropna(subset=['close'])
+    rows['volume'] = rows['volume'].fillna(0).astype('int64')
+    return rows[COLUMNS].reset_index(drop=True)
+
+def load_chunk(rows, tickers, chunk_start, chunk_end, complete=True):
+    """
+    Loads one chunk into stock_data with COPY into a staging table and a single merge,
+    and records the chunk as completed in the same transaction.
+
+    Args:
+        rows (pandas.DataFrame): Rows with the columns of `stock_data`.
+        tickers (list): The tickers whose download finished, including those without data;
+            only they are recorded as completed.
+        chunk_start (date): First day of the chunk.
+        chunk_end (date): Day after the last day of the chunk.
+        complete (bool): Record the chunk as completed; False for a chunk that is still in progress.
+
+    Returns:
+        int: The number of rows loaded.
+    """
+    buffer = io.StringIO()
+    rows.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    counts = rows.groupby('ticker').size().reindex(tickers, fill_value=0)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CREATE_STAGING_QUERY)
+        cursor.copy_expert(f"COPY {STAGING_TABLE} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(MERGE_QUERY)
+        if complete:
+            cursor.execute(PROGRESS_QUERY, (
+                list(counts.index),
+                [chunk_start] * len(counts),
+                [chunk_end] * len(counts),
+                [int(n) for n in counts.to_numpy()]
+            ))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return len(rows)
+
+def backfill_job(tickers, chunk_start, chunk_end):
+    """
+    Downloads one ticker batch for one date range and loads it into the database.
+
+    Returns:
+        int: The number of rows loaded.
+    """
+    today = date.today()
+    with DOWNLOAD_LOCK:
+        # One call downloads the tickers of the batch on threads of its own
+        frame = yf.download(
+            tickers=tickers,
+            start=chunk_start.isoformat(),
+            end=min(chunk_end, today + timedelta(days=1)).isoformat(),
+            interval='1d',
+            group_by='column',
+            threads=True,
+            progress=False
+        )
+        # Failed tickers come back as empty columns; the next download resets the errors
+        errors = set(yf_shared._ERRORS)
+    rows = frame_to_rows(frame, tickers)
+    returned = set(rows['ticker'])
+    finished = [t for t in tickers if t in returned or t.upper() not in errors]
+    if len(finished) < len(tickers):
+        print(f"Download of {len(tickers) - len(finished)} tickers for {chunk_start}..{chunk_end} failed; "
+              f"the next run resumes them")
+    # The chunk that contains today is reloaded by the next run
+    return load_chunk(rows, finished, chunk_start, chunk_end, complete=chunk_end <= today)
+
+def run_backfill(tickers, start, end, chunk_days=365, ticker_batch=100, workers=8):
+    """
+    Backfills daily history for the universe, skipping chunks that were already loaded.
+
+    Jobs download one at a time, each fetching its tickers on yfinance's threads,
+    while up to `workers` jobs load their rows into the database concurrently.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        start (date): First day of the backfill.
+        end (date): Day after the last day of the backfill.
+        chunk_days (int): Length of a date-range chunk in days.
+        ticker_batch (int): Maximum number of tickers downloaded by one job.
+        workers (int): Number of jobs whose loads run in parallel.
+
+    Returns:
+        dict: The number of jobs run and failed and the number of rows loaded.
+    """
+    # stock_data has no default partition, so every month needs its partition before a row lands in it
+    ensure_partitions('stock_data', start, end)
+    jobs = plan_jobs(tickers, plan_date_chunks(start, end, chunk_days), ticker_batch, load_completed_chunks())
+    print(f"Backfilling {len(tickers)} tickers from {start} to {end}: {len(jobs)} jobs with {workers} workers")
+
+    stats = {'jobs': len(jobs), 'failed': 0, 'rows': 0}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(backfill_job, *job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            job_tickers, chunk_start, chunk_end = futures[future]
+            try:
+                stats['rows'] += future.result()
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"Backfill of {len(job_tickers)} tickers for {chunk_start}..{chunk_end} failed: {e}")
+            elapsed = time.perf_counter() - started
+            print(f"[{done}/{len(jobs)}] {stats['rows']} rows in {elapsed:.1f}s ({stats['rows'] / elapsed:.0f} rows/s)")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill daily stock history into stock_data.")
+    parser.add_argument('--tickers', nargs='*', help="Tickers to backfill (default: data_collector.stocks)")
+    parser.add_argument('--years', type=int, default=10, help="Years of history to load")
+    parser.add_argument('--chunk-days', type=int, default=365, help="Days per date-range chunk")
+    parser.add_argument('--ticker-batch', type=int, default=100, help="Tickers per download")
+    parser.add_argument('--workers', type=int, default=8, help="Jobs loading into the database in parallel")
+    args = parser.parse_args()
+
+    end = date.today() + timedelta(days=1)
+    start = (pd.Timestamp(end) - pd.DateOffset(years=args.years)).date()
+    stats = run_backfill(args.tickers or config['data_collector']['stocks'], start, end,
+                         chunk_days=args.chunk_days, ticker_batch=args.ticker_batch, workers=args.workers)
+    if stats['failed']:
+        print(f"{stats['failed']} jobs failed; run the command again to resume them")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
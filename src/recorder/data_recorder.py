@@ -6,9 +6,22 @@
 import json
 import pika
 import psycopg2
+from psycopg2.extras import execute_values
 import os
+import struct
+import sys
+import time
 from datetime import datetime
 
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from messaging.codec import decode_message
+from db.pool import get_db_connection, PoolTimeout
+from db.schema_manager import start_maintenance_schedule
+from recorder.spool import DiskSpool, SpoolDrainer
+from recorder.rollups import RollupAggregator, UPSERT_QUERY as ROLLUP_UPSERT_QUERY
+
 # Load configuration from JSON file
 config_path = os.path.join(os.path.dirname(__file__), '../../config/config.json')
 with open(config_path, 'r') as config_file:
@@ -26,27 +39,40 @@ RABBITMQ_PORT = rabbitmq_config['port']
 EXCHANGE = 'stockvision_exchange'
 QUEUE = 'stock_data_queue'
 
-# PostgreSQL connection parameters
-DB_HOST = data_recorder_config['database']['host']
-DB_PORT = data_recorder_config['database']['port']
-DB_USER = data_recorder_config['database']['user']
-DB_PASSWORD = data_recorder_config['database']['password']
-DB_NAME = data_recorder_config['database']['dbname']
+# Consumer settings: 'single' stores every message on arrival, 'batch' groups
+# messages into one transaction per batch
+CONSUMER_MODE = data_recorder_config.get('consumer_mode', 'single')
+batch_config = data_recorder_config.get('batch', {})
+spool_config = data_recorder_config.get('spool', {})
+rollups_config = data_recorder_config.get('rollups', {})
 
-def get_db_connection():
-    """
-    Establishes and returns a connection to the PostgreSQL database.
-    
-    Returns:
-        psycopg2.extensions.connection: A connection object to interact with the PostgreSQL database.
-    """
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        dbname=DB_NAME
-    )
+BATCH_UPSERT_QUERY = """
+INSERT INTO stock_data (ticker, date, open, high, low, close, volume)
+VALUES %s
+ON CONFLICT (ticker, date) DO UPDATE
+SET open = EXCLUDED.open,
+    high = EXCLUDED.high,
+    low = EXCLUDED.low,
+    close = EXCLUDED.close,
+    volume = EXCLUDED.volume
+"""
+
+BATCH_INTRADAY_UPSERT_QUERY = """
+INSERT INTO stock_data_intraday (ticker, ts, bar_interval, open, high, low, close, volume)
+VALUES %s
+ON CONFLICT (ticker, ts) DO UPDATE
+SET bar_interval = EXCLUDED.bar_interval,
+    open = EXCLUDED.open,
+    high = EXCLUDED.high,
+    low = EXCLUDED.low,
+    close = EXCLUDED.close,
+    volume = EXCLUDED.volume
+"""
+
+# Errors after which the same write can succeed later: the database is down,
+# unreachable, cancelled the statement or has no free connection. Any other
+# error, like a value the schema rejects, fails again for the same records.
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout)
 
 def get_rabbitmq_connection():
     """
@@ -103,6 +129,45 @@ def store_stock_data(data):
         cursor.close()
         conn.close()
 
+def store_intraday_data(data):
+    """
+    Stores an intraday bar into the PostgreSQL database.
+    
+    Args:
+        data (dict): A dictionary containing the bar, with its start time in 'timestamp'
+            and its length in 'interval'.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    insert_query = """
+    INSERT INTO stock_data_intraday (ticker, ts, bar_interval, open, high, low, close, volume)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (ticker, ts) DO UPDATE
+    SET bar_interval = EXCLUDED.bar_interval,
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume;
+    """
+    try:
+        cursor.execute(insert_query, (
+            data['ticker'],
+            data['timestamp'],
+            data['interval'],
+            data.get('open', 0.0),
+            data.get('high', 0.0),
+            data.get('low', 0.0),
+            data.get('close', 0.0),
+            data.get('volume', 0)
+        ))
+        conn.commit()
+    except Exception as e:
+        print(f"Error storing intraday data: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
 def callback(ch, method, properties, body):
     """
     Callback function to process messages from RabbitMQ.
@@ -113,28 +178,412 @@ def callback(ch, method, properties, body):
         properties (spec.BasicProperties): Properties of the message.
         body (bytes): The message body.
     """
-    stock_data = json.loads(body)
-    # Print the received message for debugging
-    # print(f"Received message: {stock_data}")
-    
-    # Extract the date from the timestamp and prepare the data for storage
+    # A message holds one JSON record or many records in the binary format
+    records = decode_message(body, properties)
+    aggregate(records)
+    if _spool is not None:
+        # Never drop a message whose ack was already sent, unless the database rejects it
+        try:
+            write_records(records, _spool)
+        except Exception as e:
+            print(f"Error storing {len(records)} records: {e}")
+        return
+    if len(records) > 1:
+        # A binary message carries a whole batch; store it with one upsert per table
+        try:
+            store_stock_data_batch(records)
+        except Exception as e:
+            print(f"Error storing batch of {len(records)} records: {e}")
+        return
+    for stock_data in records:
+        # Print the received message for debugging
+        # print(f"Received message: {stock_data}")
+
+        # Intraday bars keep their full timestamp
+        if stock_data.get('interval'):
+            store_intraday_data(stock_data)
+            continue
+
+        # Extract the date from the timestamp and prepare the data for storage
+        try:
+            stock_data['date'] = datetime.fromisoformat(stock_data['timestamp']).date().isoformat()
+        except KeyError:
+            print("Error: 'timestamp' key not found in the message.")
+            continue
+
+        store_stock_data(stock_data)
+
+def records_to_rows(records):
+    """
+    Converts decoded records into the rows of stock_data and stock_data_intraday.
+
+    A multi-row upsert may not touch the same key twice, so rows are deduplicated
+    by key, the record received last winning like it would with one upsert each.
+    Records without a ticker or with an unparsable timestamp are skipped.
+
+    Args:
+        records (list): Stock data dictionaries in delivery order.
+
+    Returns:
+        tuple: The stock_data rows and the stock_data_intraday rows.
+    """
+    daily = {}
+    intraday = {}
+    for data in records:
+        if not data.get('ticker'):
+            print("Error: 'ticker' key not found in the message.")
+            continue
+        try:
+            if data.get('interval'):
+                intraday[(data['ticker'], data['timestamp'])] = (
+                    data['ticker'], data['timestamp'], data['interval'],
+                    data.get('open', 0.0), data.get('high', 0.0), data.get('low', 0.0),
+                    data.get('close', 0.0), data.get('volume', 0)
+                )
+                continue
+            day = datetime.fromisoformat(data['timestamp']).date().isoformat()
+        except KeyError:
+            print("Error: 'timestamp' key not found in the message.")
+            continue
+        except (ValueError, TypeError) as e:
+            print(f"Error: invalid timestamp in the message: {e}")
+            continue
+        daily[(data['ticker'], day)] = (
+            data['ticker'], day,
+            data.get('open', 0.0), data.get('high', 0.0), data.get('low', 0.0),
+            data.get('close', 0.0), data.get('volume', 0)
+        )
+    return list(daily.values()), list(intraday.values())
+
+def store_stock_data_batch(records, timeout_ms=None):
+    """
+    Stores many records with one multi-row upsert per table, in a single transaction.
+
+    Unlike `store_stock_data`, errors are raised so the caller can leave the
+    messages unacknowledged.
+
+    Args:
+        records (list): Stock data dictionaries, daily quotes and intraday bars.
+        timeout_ms (int): Milliseconds after which the server cancels a statement
+            of the transaction; no limit if None.
+
+    Returns:
+        int: The number of rows written.
+    """
+    daily, intraday = records_to_rows(records)
+    if not daily and not intraday:
+        return 0
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if timeout_ms:
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+        if daily:
+            execute_values(cursor, BATCH_UPSERT_QUERY, daily, page_size=len(daily))
+        if intraday:
+            execute_values(cursor, BATCH_INTRADAY_UPSERT_QUERY, intraday, page_size=len(intraday))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return len(daily) + len(intraday)
+
+_rollups = None
+_rollups_flushed = 0.0
+
+def get_rollups():
+    """
+    Returns the rollup aggregator, creating it on first use, or None if
+    `data_recorder.rollups` is disabled.
+    """
+    global _rollups
+    if _rollups is None and rollups_config.get('enabled', False):
+        _rollups = RollupAggregator(
+            granularities=rollups_config.get('granularities'),
+            grace_seconds=rollups_config.get('grace_seconds', 5)
+        )
+    return _rollups
+
+def store_rollups(rows):
+    """
+    Stores closed rollup windows with one multi-row upsert per rollup table, in a single transaction.
+
+    Args:
+        rows (dict): Rows (ticker, bucket, open, high, low, close, volume) by rollup table.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        stock_data['date'] = datetime.fromisoformat(stock_data['timestamp']).date().isoformat()
-    except KeyError:
-        print("Error: 'timestamp' key not found in the message.")
+        for table, table_rows in rows.items():
+            execute_values(cursor, ROLLUP_UPSERT_QUERY.format(table=table), table_rows, page_size=len(table_rows))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def aggregate(records):
+    """
+    Feeds records into the rollup windows and, every `rollups.flush_interval` seconds,
+    stores the windows that closed since the last flush.
+
+    Windows that fail to store are kept and retried with the next flush.
+    """
+    global _rollups_flushed
+    rollups = get_rollups()
+    if rollups is None:
         return
+    rollups.apply_records(records)
+    if time.monotonic() - _rollups_flushed < rollups_config.get('flush_interval', 5):
+        return
+    _rollups_flushed = time.monotonic()
+    rollups.close_expired()
+    rows = rollups.drain()
+    if not rows:
+        return
+    try:
+        store_rollups(rows)
+    except Exception as e:
+        print(f"Error storing rollups: {e}")
+        rollups.restore(rows)
 
-    store_stock_data(stock_data)
+_spool = None
 
-def start_consuming():
+def get_spool(name):
     """
-    Starts consuming messages from RabbitMQ and processes them using the callback function.
+    Returns the disk spool of a consumer, starting its drainer on first use, or
+    None if `data_recorder.spool` is disabled.
+
+    Args:
+        name (str): Name of the consumer, usually its queue; every consumer gets a
+            directory of its own so restarted workers find their spool again.
     """
-    connection = get_rabbitmq_connection()
-    channel = connection.channel()
-    channel.queue_declare(queue=QUEUE, durable=True)
-    channel.basic_consume(queue=QUEUE, on_message_callback=callback, auto_ack=True)
-    print(f"Waiting for messages from {QUEUE}. To exit press CTRL+C")
+    if not spool_config.get('enabled', False):
+        return None
+    spool = DiskSpool(
+        os.path.join(spool_config.get('directory', 'spool'), name),
+        segment_bytes=spool_config.get('segment_bytes', 64 * 1024 * 1024),
+        fsync=spool_config.get('fsync', True),
+        fsync_interval=spool_config.get('fsync_interval', 0)
+    )
+    SpoolDrainer(
+        spool, store_stock_data_batch,
+        interval=spool_config.get('drain_interval', 5.0),
+        max_records=batch_config.get('max_rows', 5000),
+        transient_errors=TRANSIENT_ERRORS
+    ).start()
+    return spool
+
+def write_records(records, spool=None):
+    """
+    Stores records in the database, falling back to the disk spool while it is unavailable
+    or lagging.
+
+    A direct write that takes longer than `spool.write_timeout_ms` is cancelled by
+    the server and spooled like a failed one. While the spool holds records, new
+    records are appended behind them instead of being written directly, so the
+    drainer replays every ticker in order and the consumer never blocks on a
+    database that is down or slow. Only transient errors are spooled; records the
+    database rejects raise, so they do not block the spool.
+
+    Args:
+        records (list): Stock data dictionaries.
+        spool (DiskSpool): The spool; None stores directly and raises on failure.
+
+    Returns:
+        int: The number of rows written to the database, 0 if the records were spooled.
+    """
+    if spool is None:
+        return store_stock_data_batch(records)
+    if not spool.is_empty():
+        spool.append(records)
+        return 0
+    try:
+        return store_stock_data_batch(records, timeout_ms=spool_config.get('write_timeout_ms'))
+    except TRANSIENT_ERRORS as e:
+        print(f"Database unavailable, spooling {len(records)} records: {e}")
+        spool.append(records)
+        return 0
+
+class BatchConsumer:
+    """
+    Collects messages into batches of up to `max_rows` records or `max_wait_ms`
+    milliseconds and stores every batch in one transaction.
+
+    Messages are acknowledged only after their batch was committed, with a single
+    ack covering every delivery tag of the batch, so a crash before the commit
+    gets the whole batch redelivered instead of lost. A batch that fails with a
+    transient error is requeued; one that fails with any other error is split in
+    halves until the messages that cannot be stored are isolated and rejected,
+    so they do not come back and block the queue. With a spool, a batch also
+    counts as committed once it is spooled on disk. Records are fed to the
+    rollups only once their batch is committed.
+    """
+
+    def __init__(self, channel, max_rows=5000, max_wait_ms=200, retry_delay=1.0, spool=None):
+        """
+        Args:
+            channel (BlockingChannel): The channel the messages are consumed from.
+            max_rows (int): Number of records that triggers a flush.
+            max_wait_ms (float): Maximum time in milliseconds a message waits for its batch.
+            retry_delay (float): Seconds to wait after a failed batch before consuming again.
+            spool (DiskSpool): Spool that takes the batches while the database is unavailable.
+        """
+        self.channel = channel
+        self.spool = spool
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.retry_delay = retry_delay
+        self.messages = []  # (delivery tag, records) in delivery order
+        self.records = []
+        self.last_tag = None
+        self.first_received = None
+
+    def add(self, method, properties, body):
+        """
+        Adds one delivered message to the current batch; undecodable messages are rejected.
+        """
+        try:
+            records = decode_message(body, properties)
+        except (ValueError, struct.error) as e:
+            print(f"Rejecting undecodable message: {e}")
+            self.channel.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        if self.first_received is None:
+            self.first_received = time.monotonic()
+        self.messages.append((method.delivery_tag, records))
+        self.records.extend(records)
+        self.last_tag = method.delivery_tag
+
+    def due(self):
+        """
+        Returns True when the current batch is full or has waited long enough.
+        """
+        if self.last_tag is None:
+            return False
+        return len(self.records) >= self.max_rows or time.monotonic() - self.first_received >= self.max_wait
+
+    def flush(self):
+        """
+        Stores the current batch and acknowledges its messages, or requeues them on a
+        transient failure.
+
+        Returns:
+            int: The number of rows written.
+        """
+        if self.last_tag is None:
+            return 0
+        messages, records, last_tag = self.messages, self.records, self.last_tag
+        self.messages, self.records, self.last_tag, self.first_received = [], [], None, None
+        try:
+            rows = write_records(records, self.spool)
+        except TRANSIENT_ERRORS as e:
+            print(f"Error storing batch of {len(records)} records: {e}")
+            self.channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+            time.sleep(self.retry_delay)
+            return 0
+        except Exception as e:
+            print(f"Error storing batch of {len(records)} records, storing its messages separately: {e}")
+            return self._store_separately(messages, e)
+        self.channel.basic_ack(delivery_tag=last_tag, multiple=True)
+        # Only committed batches reach the rollups, so a requeued batch is not counted twice
+        aggregate(records)
+        return rows
+
+    def _store_separately(self, messages, error):
+        """
+        Stores a failed batch in ever smaller halves, acknowledging the halves that
+        commit and rejecting the single messages that still fail.
+
+        A transient error on the way requeues every message not stored yet.
+
+        Args:
+            messages (list): The (delivery tag, records) of the failed batch.
+            error (Exception): The error the whole batch failed with.
+
+        Returns:
+            int: The number of rows written.
+        """
+        rows = 0
+        pending = [(messages, error)]
+        while pending:
+            part, error = pending.pop()
+            if error is None:
+                records = [record for _, message_records in part for record in message_records]
+                try:
+                    rows += write_records(records, self.spool)
+                except TRANSIENT_ERRORS as e:
+                    print(f"Error storing {len(records)} records: {e}")
+                    for tag, _ in part + [message for rest, _ in pending for message in rest]:
+                        self.channel.basic_nack(delivery_tag=tag, requeue=True)
+                    time.sleep(self.retry_delay)
+                    return rows
+                except Exception as e:
+                    error = e
+                else:
+                    for tag, _ in part:
+                        self.channel.basic_ack(delivery_tag=tag)
+                    aggregate(records)
+                    continue
+            if len(part) == 1:
+                print(f"Rejecting a message that cannot be stored: {error}")
+                self.channel.basic_nack(delivery_tag=part[0][0], requeue=False)
+                continue
+            middle = len(part) // 2
+            # The first half is stored first, so later records still win
+            pending.append((part[middle:], None))
+            pending.append((part[:middle], None))
+        return rows
+
+    def run(self, queue):
+        """
+        Consumes the queue until the consumer is cancelled, flushing batches as they become due.
+        """
+        # Wake up at least every max_wait seconds so partial batches are flushed on time
+        for method, properties, body in self.channel.consume(queue, inactivity_timeout=self.max_wait):
+            if method is not None:
+                self.add(method, properties, body)
+            if self.due():
+                self.flush()
+        self.flush()
+
+def consume_queue(connection, channel, queue):
+    """
+    Consumes one queue until interrupted, in the configured consumer mode, and closes the connection.
+
+    Args:
+        connection (pika.BlockingConnection): The RabbitMQ connection.
+        channel (BlockingChannel): A channel of the connection.
+        queue (str): The queue to consume.
+    """
+    global _spool
+    _spool = get_spool(queue)
+    if CONSUMER_MODE == 'batch':
+        channel.basic_qos(prefetch_count=batch_config.get('prefetch_count', 100))
+        consumer = BatchConsumer(
+            channel,
+            max_rows=batch_config.get('max_rows', 5000),
+            max_wait_ms=batch_config.get('max_wait_ms', 200),
+            retry_delay=batch_config.get('retry_delay', 1.0),
+            spool=_spool
+        )
+        print(f"Waiting for messages from {queue} in batches of {consumer.max_rows} rows. To exit press CTRL+C")
+        try:
+            consumer.run(queue)
+        except KeyboardInterrupt:
+            channel.cancel()
+            consumer.flush()
+        finally:
+            connection.close()
+        return
+
+    channel.basic_consume(queue=queue, on_message_callback=callback, auto_ack=True)
+    print(f"Waiting for messages from {queue}. To exit press CTRL+C")
     try:
         channel.start_consuming()
     except KeyboardInterrupt:
@@ -142,5 +591,27 @@ def start_consuming():
     finally:
         connection.close()
 
+def start_consuming():
+    """
+    Starts consuming messages from RabbitMQ and processes them using the callback function,
+    or in acknowledged batches when `data_recorder.consumer_mode` is 'batch'.
+
+    With more than one `data_recorder.workers`, a supervisor runs that many worker
+    processes instead, each consuming its own partition of the tickers. Either way
+    the recorder keeps the monthly partitions of the coming months created.
+    """
+    start_maintenance_schedule()
+    workers = data_recorder_config.get('workers', 1)
+    if workers > 1:
+        from recorder.workers import RecorderSupervisor
+
+        RecorderSupervisor.from_config(data_recorder_config).run()
+        return
+
+    connection = get_rabbitmq_connection()
+    channel = connection.channel()
+    channel.queue_declare(queue=QUEUE, durable=True)
+    consume_queue(connection, channel, QUEUE)
+
 if __name__ == "__main__":
     start_consuming()
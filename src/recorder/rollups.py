@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+# Rollup granularities and their window length in seconds
+GRANULARITIES = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': 86400}
+
+EPOCH = datetime(1970, 1, 1)
+
+UPSERT_QUERY = """
+INSERT INTO {table} (ticker, bucket, open, high, low, close, volume)
+VALUES %s
+ON CONFLICT (ticker, bucket) DO UPDATE
+SET open = EXCLUDED.open,
+    high = EXCLUDED.high,
+    low = EXCLUDED.low,
+    close = EXCLUDED.close,
+    volume = EXCLUDED.volume
+"""
+
+def rollup_table(granularity):
+    """
+    Returns the name of the table holding the bars of one granularity, e.g. stock_rollup_5m.
+    """
+    return f"stock_rollup_{granularity}"
+
+def bucket_start(moment, seconds):
+    """
+    Returns the start of the window of `seconds` seconds that contains a naive datetime.
+    """
+    offset = int((moment - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=offset - offset % seconds)
+
+class RollupAggregator:
+    """
+    Streaming OHLCV aggregation of incoming records into fixed windows per ticker.
+
+    One window per ticker and granularity is kept open in memory. Every record
+    updates it incrementally: the first price opens it, high and low track the
+    extremes, the last price closes it and volumes add up. A window is closed
+    when a record of a later window arrives, or once its end is `grace_seconds`
+    in the past, and closed windows are handed out in bulk by `drain`.
+
+    Daily quotes carry the running day's bar, so they are applied as one trade at
+    their close price, with the volume traded since the previous quote of the
+    day. Intraday bars are applied with their own OHLCV. Records older than the
+    open window of their ticker, or falling into a window that was already
+    closed, arrive too late and are counted, not applied; otherwise a late record
+    would open a fresh window whose partial bar overwrites the stored one.
+    """
+
+    def __init__(self, granularities=None, grace_seconds=5):
+        """
+        Args:
+            granularities (list): Names from GRANULARITIES; defaults to all of them.
+            grace_seconds (float): Seconds after its end a window waits for late records.
+        """
+        names = granularities or list(GRANULARITIES)
+        self.granularities = {name: GRANULARITIES[name] for name in names}
+        self.grace = timedelta(seconds=grace_seconds)
+        self.windows = {}
+        self.closed = {name: [] for name in self.granularities}
+        self.closed_through = {}  # Bucket of the newest closed window per (granularity, ticker)
+        self.cumulative_volume = {}
+        self.late = 0
+
+    def _tick(self, record):
+        """
+        Returns the (time, open, high, low, close, volume) a record contributes.
+        """
+        moment = datetime.fromisoformat(record['timestamp']).replace(tzinfo=None)
+        if record.get('interval'):
+            return (moment, record.get('open', 0.0), record.get('high', 0.0), record.get('low', 0.0),
+                    record.get('close', 0.0), record.get('volume', 0))
+        # A daily quote's volume is cumulative over the day
+        day, previous = self.cumulative_volume.get(record['ticker'], (None, 0))
+        volume = record.get('volume', 0)
+        delta = volume - previous if day == moment.date() and volume >= previous else volume
+        self.cumulative_volume[record['ticker']] = (moment.date(), volume)
+        price = record.get('close', 0.0)
+        return moment, price, price, price, price, delta
+
+    def apply(self, record):
+        """
+        Applies one record to the open windows of its ticker.
+        """
+        moment, open_, high, low, close, volume = self._tick(record)
+        ticker = record['ticker']
+        for name, seconds in self.granularities.items():
+            bucket = bucket_start(moment, seconds)
+            window = self.windows.get((name, ticker))
+            closed_through = self.closed_through.get((name, ticker))
+            if (window is not None and bucket < window[0]) or (closed_through is not None and bucket <= closed_through):
+                self.late += 1
+                continue
+            if window is None or bucket > window[0]:
+                if window is not None:
+                    self._close(name, ticker, window)
+                self.windows[(name, ticker)] = [bucket, open_, high, low, close, volume]
+                continue
+            window[2] = max(window[2], high)
+            window[3] = min(window[3], low)
+            window[4] = close
+            window[5] += volume
+
+    def _close(self, name, ticker, window):
+        self.closed[name].append((ticker,) + tuple(window))
+        self.closed_through[(name, ticker)] = window[0]
+
+    def apply_records(self, records):
+        for record in records:
+            try:
+                self.apply(record)
+            except (KeyError, ValueError) as e:
+                print(f"Skipping record in rollups: {e}")
+
+    def close_expired(self, now=None):
+        """
+        Closes the windows that ended more than `grace_seconds` ago.
+
+        Args:
+            now (datetime): Current naive wall-clock time; defaults to now.
+        """
+        now = now or datetime.now()
+        for (name, ticker), window in list(self.windows.items()):
+            if window[0] + timedelta(seconds=self.granularities[name]) + self.grace <= now:
+                self._close(name, ticker, window)
+                del self.windows[(name, ticker)]
+
+    def drain(self):
+        """
+        Hands out the closed windows and forgets them.
+
+        Returns:
+            dict: Rows (ticker, bucket, open, high, low, close, volume) by rollup table.
+        """
+        rows = {rollup_table(name): closed for name, closed in self.closed.items() if closed}
+        self.closed = {name: [] for name in self.granularities}
+        return rows
+
+    def restore(self, rows):
+        """
+        Puts rows that could not be stored back in front of the closed windows.
+        """
+        for name in self.granularities:
+            self.closed[name][:0] = rows.get(rollup_table(name), [])
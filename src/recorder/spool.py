@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+import time
+
+SEGMENT_SUFFIX = '.log'
+QUARANTINE_FILE = 'quarantine.jsonl'
+
+class DiskSpool:
+    """
+    Durable, append-only log of records that could not be written to the database.
+
+    The log is split into numbered segment files. Appends go to the newest
+    segment as one JSON line per batch, and a new segment is started once the
+    current one exceeds `segment_bytes`. Segments are replayed oldest first and
+    deleted once their records are in the database, so the spool preserves the
+    order in which records were received. Records the database rejects for good
+    are moved to a quarantine file next to the segments, so they cannot hold up
+    the records behind them.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, fsync=True, fsync_interval=0):
+        """
+        Args:
+            directory (str): Directory holding the segment files; created if missing.
+            segment_bytes (int): Size after which a new segment is started.
+            fsync (bool): Flush appends to disk, not only to the operating system.
+            fsync_interval (float): With fsync, seconds between two flushes to disk; 0
+                flushes every append before returning. A crash of the machine, not of
+                the process, can then lose the appends of the last interval.
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._synced = None  # Time of the last flush to disk
+        os.makedirs(directory, exist_ok=True)
+        sequences = self._sequences()
+        self._next_sequence = sequences[-1] + 1 if sequences else 0
+
+    def _sequences(self):
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def _path(self, sequence):
+        return os.path.join(self.directory, f"{sequence:012d}{SEGMENT_SUFFIX}")
+
+    def _seal(self):
+        if self._file is not None:
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def is_empty(self):
+        """
+        Returns True if every spooled record has been replayed.
+        """
+        with self._lock:
+            return not self._sequences()
+
+    def segments(self):
+        """
+        Returns the number of segments waiting to be replayed.
+        """
+        with self._lock:
+            return len(self._sequences())
+
+    def append(self, records):
+        """
+        Appends a batch of records to the newest segment.
+
+        Args:
+            records (list): Stock data dictionaries.
+        """
+        line = (json.dumps(records, default=str) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.segment_bytes:
+                self._seal()
+                self._file = open(self._path(self._next_sequence), 'ab')
+                self._next_sequence += 1
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync and (self._synced is None or time.monotonic() - self._synced >= self.fsync_interval):
+                os.fsync(self._file.fileno())
+                self._synced = time.monotonic()
+
+    def oldest_segment(self):
+        """
+        Seals and returns the oldest segment, or None if the spool is empty.
+
+        Sealing makes later appends start a new segment, so the returned segment
+        no longer changes while it is replayed.
+
+        Returns:
+            tuple: The sequence number and path of the segment.
+        """
+        with self._lock:
+            sequences = self._sequences()
+            if not sequences:
+                return None
+            path = self._path(sequences[0])
+            if self._file is not None and self._file.name == path:
+                self._seal()
+            return sequences[0], path
+
+    def read_segment(self, path):
+        """
+        Yields the batches of records of a segment in append order.
+
+        A torn last line, left by a crash in the middle of an append, is skipped.
+        """
+        with open(path, 'rb') as segment_file:
+            for line in segment_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    print(f"Skipping a torn record batch at the end of {path}")
+
+    def remove_segment(self, sequence):
+        """
+        Deletes a segment whose records are all in the database.
+        """
+        with self._lock:
+            os.remove(self._path(sequence))
+
+    def quarantine(self, records, error):
+        """
+        Appends records that cannot be stored, with the reason, to the quarantine file.
+
+        Args:
+            records (list): Stock data dictionaries.
+            error (Exception): The error storing them failed with.
+        """
+        line = (json.dumps({'error': str(error), 'records': records}, default=str) + '\n').encode('utf-8')
+        with self._lock:
+            with open(os.path.join(self.directory, QUARANTINE_FILE), 'ab') as quarantine_file:
+                quarantine_file.write(line)
+                quarantine_file.flush()
+                if self.fsync:
+                    os.fsync(quarantine_file.fileno())
+
+    def _store(self, store, records, transient_errors):
+        try:
+            store(records)
+            return len(records)
+        except transient_errors:
+            raise
+        except Exception as e:
+            print(f"Storing {len(records)} spooled records one by one: {e}")
+        stored = 0
+        for record in records:
+            try:
+                store([record])
+                stored += 1
+            except transient_errors:
+                raise
+            except Exception as e:
+                print(f"Quarantining a spooled record that cannot be stored: {e}")
+                self.quarantine([record], e)
+        return stored
+
+    def drain(self, store, max_records=5000, transient_errors=(Exception,)):
+        """
+        Replays every segment into the database, oldest first.
+
+        Records are stored in bulk batches of up to `max_records`. A segment is only
+        deleted once all of its records were stored; a transient failure leaves it
+        in place to be replayed again, which is harmless since the stores are
+        upserts. A batch failing with any other error is stored record by record,
+        and the records that still fail are quarantined.
+
+        Args:
+            store (callable): Stores a list of records, raising on failure.
+            max_records (int): Maximum number of records stored in one call.
+            transient_errors (tuple): Errors after which the segment is retried later;
+                by default every error.
+
+        Returns:
+            int: The number of records replayed.
+        """
+        replayed = 0
+        while True:
+            segment = self.oldest_segment()
+            if segment is None:
+                return replayed
+            sequence, path = segment
+            pending = []
+            for batch in self.read_segment(path):
+                pending.extend(batch)
+                if len(pending) >= max_records:
+                    replayed += self._store(store, pending, transient_errors)
+                    pending = []
+            if pending:
+                replayed += self._store(store, pending, transient_errors)
+            self.remove_segment(sequence)
+
+    def close(self):
+        with self._lock:
+            self._seal()
+
+class SpoolDrainer(threading.Thread):
+    """
+    Background thread that replays the spool into the database once it is reachable again.
+    """
+
+    def __init__(self, spool, store, interval=5.0, max_records=5000, transient_errors=(Exception,)):
+        """
+        Args:
+            spool (DiskSpool): The spool to drain.
+            store (callable): Stores a list of records, raising on failure.
+            interval (float): Seconds between two drain attempts.
+            max_records (int): Maximum number of records stored in one call.
+            transient_errors (tuple): Errors after which a drain is retried; records
+                failing with any other error are quarantined.
+        """
+        super().__init__(name='spool-drainer', daemon=True)
+        self.spool = spool
+        self.store = store
+        self.interval = interval
+        self.max_records = max_records
+        self.transient_errors = transient_errors
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self.spool.is_empty():
+                continue
+            try:
+                replayed = self.spool.drain(self.store, self.max_records, self.transient_errors)
+                print(f"Replayed {replayed} spooled records into the database")
+            except Exception as e:
+                print(f"Database still unavailable, {self.spool.segments()} spool segments pending: {e}")
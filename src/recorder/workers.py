@@ -0,0 +1,192 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python src/recorder/workers.py --workers 4
+# deactivate
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from recorder.data_recorder import EXCHANGE, QUEUE, config, consume_queue, data_recorder_config, get_rabbitmq_connection
+
+# The collector publishes stock data with this routing key
+ROUTING_KEY = 'stock.data'
+
+# Consistent-hash exchange that spreads the partitions over the worker queues.
+# It needs the rabbitmq_consistent_hash_exchange plugin.
+HASH_EXCHANGE = 'stockvision_recorder_hash'
+HASH_HEADER = 'x-partition'
+
+def worker_queue(index):
+    """
+    Returns the name of the queue consumed by one recorder worker.
+    """
+    return f"stock_data_queue.recorder.{index}"
+
+def check_partitions(workers, partitions):
+    """
+    Raises ValueError unless the collector spreads the tickers over enough partitions
+    for every worker queue to get a share of them.
+    """
+    if workers > 1 and partitions < workers:
+        raise ValueError(f"{workers} recorder workers need data_collector.partitions of at least {workers} "
+                         f"(e.g. 64), not {partitions}")
+
+def setup_worker_queues(channel, workers):
+    """
+    Declares the consistent-hash exchange and one queue per worker.
+
+    The exchange hashes the `x-partition` header that the collector puts on every
+    message, so all messages of a partition, and thereby all updates of a ticker,
+    land on the same queue in publish order. Queues of equal weight get an equal
+    share of the partitions, and adding a worker moves only about 1/N of them.
+
+    The shared queue of the single-process recorder is unbound, so it does not
+    keep filling up while no one consumes it.
+
+    Args:
+        channel (BlockingChannel): A RabbitMQ channel.
+        workers (int): The number of worker queues.
+    """
+    channel.exchange_declare(exchange=EXCHANGE, exchange_type='topic', durable=True)
+    # Declaring first makes the unbind safe when the queue never existed
+    channel.queue_declare(queue=QUEUE, durable=True)
+    channel.queue_unbind(queue=QUEUE, exchange=EXCHANGE, routing_key=ROUTING_KEY)
+    channel.exchange_declare(exchange=HASH_EXCHANGE, exchange_type='x-consistent-hash', durable=True,
+                             arguments={'hash-header': HASH_HEADER})
+    channel.exchange_bind(destination=HASH_EXCHANGE, source=EXCHANGE, routing_key=ROUTING_KEY)
+    for index in range(workers):
+        queue = worker_queue(index)
+        channel.queue_declare(queue=queue, durable=True)
+        # With a consistent-hash exchange the routing key is the weight of the queue
+        channel.queue_bind(exchange=HASH_EXCHANGE, queue=queue, routing_key='1')
+
+def run_worker(index):
+    """
+    Entry point of a worker process: consumes the worker's queue until it is stopped.
+
+    Args:
+        index (int): The index of the worker.
+    """
+    connection = get_rabbitmq_connection()
+    channel = connection.channel()
+    consume_queue(connection, channel, worker_queue(index))
+
+class RecorderSupervisor:
+    """
+    Starts the recorder worker processes, monitors them and restarts those that exit.
+
+    A worker that keeps failing is restarted with an exponential backoff, from
+    `restart_delay` up to `max_restart_delay` seconds; the backoff is reset once a
+    worker has stayed up for `max_restart_delay` seconds. Workers are started with
+    the spawn method, so they do not inherit connections of the parent process.
+    """
+
+    def __init__(self, workers, check_interval=1.0, restart_delay=1.0, max_restart_delay=60, context=None):
+        """
+        Args:
+            workers (int): The number of worker processes.
+            check_interval (float): Seconds between two checks of the workers.
+            restart_delay (float): Seconds before the first restart of a failed worker.
+            max_restart_delay (float): Upper bound of the restart backoff.
+            context (multiprocessing.context.BaseContext): Process context; defaults to spawn.
+        """
+        self.workers = workers
+        self.check_interval = check_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.context = context or multiprocessing.get_context('spawn')
+        self.processes = [None] * workers
+        self.started_at = [0.0] * workers
+        self.restarts = [0] * workers
+        self.next_start = [0.0] * workers
+
+    @classmethod
+    def from_config(cls, recorder_config, workers=None):
+        """
+        Creates the supervisor from the `data_recorder` configuration section.
+
+        Args:
+            recorder_config (dict): The `data_recorder` configuration section.
+            workers (int): Overrides the configured number of workers.
+        """
+        supervisor_config = recorder_config.get('supervisor', {})
+        return cls(
+            workers or recorder_config.get('workers', 1),
+            check_interval=supervisor_config.get('check_interval', 1.0),
+            restart_delay=supervisor_config.get('restart_delay', 1.0),
+            max_restart_delay=supervisor_config.get('max_restart_delay', 60)
+        )
+
+    def start_worker(self, index, now=None):
+        process = self.context.Process(target=run_worker, args=(index,), name=f"recorder-worker-{index}")
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic() if now is None else now
+
+    def check(self, now=None):
+        """
+        Restarts the workers that exited, once their backoff delay has passed.
+        """
+        now = time.monotonic() if now is None else now
+        for index, process in enumerate(self.processes):
+            if process is not None:
+                if process.is_alive():
+                    continue
+                if now - self.started_at[index] >= self.max_restart_delay:
+                    self.restarts[index] = 0
+                delay = min(self.restart_delay * 2 ** self.restarts[index], self.max_restart_delay)
+                print(f"Recorder worker {index} exited with code {process.exitcode}; restarting in {delay:.0f}s")
+                self.restarts[index] += 1
+                self.next_start[index] = now + delay
+                self.processes[index] = None
+            if now >= self.next_start[index]:
+                self.start_worker(index, now)
+
+    def stop(self, timeout=10):
+        """
+        Terminates every worker and waits for them to exit.
+        """
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout)
+
+    def run(self):
+        """
+        Sets up the worker queues, starts the workers and supervises them until interrupted.
+        """
+        check_partitions(self.workers, config['data_collector'].get('partitions', 1))
+        connection = get_rabbitmq_connection()
+        try:
+            setup_worker_queues(connection.channel(), self.workers)
+        finally:
+            connection.close()
+
+        print(f"Starting {self.workers} recorder workers. To exit press CTRL+C")
+        try:
+            while True:
+                self.check()
+                time.sleep(self.check_interval)
+        except KeyboardInterrupt:
+            print("Stopping recorder workers")
+        finally:
+            self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Data Recorder as supervised worker processes.")
+    parser.add_argument('--workers', type=int, default=max(2, data_recorder_config.get('workers', 1)),
+                        help="Number of worker processes")
+    args = parser.parse_args()
+
+    RecorderSupervisor.from_config(data_recorder_config, workers=args.workers).run()
+
+if __name__ == "__main__":
+    main()
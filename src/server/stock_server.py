@@ -3,12 +3,18 @@
 # python src/server/stock_server.py
 # deactivate
 
-from flask import Flask, render_template
-import psycopg2
+from flask import Flask, abort, render_template, request
 import os
+import sys
 import json
 from datetime import datetime
 
+# Make the src directory importable when this file is run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from db.pool import get_db_connection, register_prepared
+from analyzer.indicators import INDICATORS
+
 def load_config():
     """
     Load configuration from a JSON file.
@@ -22,29 +28,20 @@ def load_config():
 
 # Load configuration settings
 config = load_config()
-db_config = config['data_recorder']['database']
-
-# PostgreSQL connection parameters
-DB_HOST = db_config['host']
-DB_PORT = db_config['port']
-DB_USER = db_config['user']
-DB_PASSWORD = db_config['password']
-DB_NAME = db_config['dbname']
 
-def get_db_connection():
-    """
-    Establish and return a connection to the PostgreSQL database.
-    
-    Returns:
-        psycopg2.extensions.connection: A connection object to interact with the PostgreSQL database.
-    """
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        dbname=DB_NAME
-    )
+# Query of every page view, prepared once per pooled connection
+register_prepared('server_latest_stock_data', """
+    SELECT ticker, date, open, high, low, close, volume
+    FROM stock_data
+    ORDER BY date DESC
+    LIMIT 50
+""")
+register_prepared('server_latest_analysis', """
+    SELECT ticker, analysis_date, outputs
+    FROM analysis_latest
+    WHERE analysis_type = $1
+    ORDER BY ticker
+""")
 
 def create_app():
     """
@@ -67,19 +64,13 @@ def create_app():
             str: Rendered HTML page.
         """
         conn = get_db_connection()
-        cursor = conn.cursor()
-
-        query_stock_data = """
-        SELECT ticker, date, open, high, low, close, volume
-        FROM stock_data
-        ORDER BY date DESC
-        LIMIT 50
-        """
-        cursor.execute(query_stock_data)
-        stock_data_rows = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            conn.execute_prepared(cursor, 'server_latest_stock_data')
+            stock_data_rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
 
         stock_data_results = []
         for row in stock_data_rows:
@@ -99,6 +90,37 @@ def create_app():
 
         return render_template('index.html', stock_data_results=stock_data_results, server_time=server_time)
 
+    @app.route('/analysis')
+    def analysis():
+        """
+        Render the analysis page with the newest result of every ticker for one analysis type.
+
+        The analysis type is taken from the `type` query parameter and defaults to
+        moving averages. Every ticker is read from its single row in analysis_latest.
+
+        Returns:
+            str: Rendered HTML page.
+        """
+        analysis_type = request.args.get('type', 'moving_average')
+        if analysis_type not in INDICATORS:
+            abort(404)
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            conn.execute_prepared(cursor, 'server_latest_analysis', (analysis_type,))
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        results = [
+            {'ticker': ticker, 'analysis_date': analysis_date, 'outputs': outputs}
+            for ticker, analysis_date, outputs in rows
+        ]
+        return render_template('analysis.html', results=results, analysis_type=analysis_type,
+                               value_names=INDICATORS[analysis_type].outputs)
+
     return app
 
 def run_stock_server():
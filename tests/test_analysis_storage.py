@@ -0,0 +1,64 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_analysis_storage.py
+# deactivate
+
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.storage import (UPSERT_LATEST_QUERY, UPSERT_VALUES_QUERY, analysis_row, result_values,
+                              store_analysis_rows, values_to_result)
+
+class AnalysisStorageTestCase(unittest.TestCase):
+
+    def test_values_follow_the_registered_output_order(self):
+        result = {'ticker': 'AAPL', 'analysis_date': '2024-07-01', 'signal': 1.5, 'macd': 2.0,
+                  'histogram': float('nan')}
+
+        self.assertEqual(result_values('macd', result), [2.0, 1.5, None])
+        self.assertEqual(values_to_result('macd', [2.0, 1.5, None]),
+                         {'macd': 2.0, 'signal': 1.5, 'histogram': None})
+        self.assertEqual(analysis_row(result, 'macd'), ('AAPL', '2024-07-01', 'macd', [2.0, 1.5, None]))
+
+    @patch('analyzer.storage.execute_values')
+    @patch('analyzer.storage.get_db_connection')
+    def test_store_upserts_series_and_latest_rows(self, mock_get_db_connection, mock_execute_values):
+        mock_conn = Mock()
+        mock_get_db_connection.return_value = mock_conn
+        rows = [
+            ('AAPL', '2024-07-01', 'rsi', [40.0]),
+            ('AAPL', '2024-07-02', 'rsi', [45.0]),
+            # A rerun of the same day replaces the earlier row
+            ('AAPL', '2024-07-02', 'rsi', [50.0]),
+            ('MSFT', '2024-07-02', 'rsi', [60.0]),
+        ]
+
+        self.assertEqual(store_analysis_rows(rows), 3)
+
+        series_call, latest_call = mock_execute_values.call_args_list
+        self.assertEqual(series_call.args[1], UPSERT_VALUES_QUERY)
+        self.assertEqual(series_call.args[2], [rows[0], rows[2], rows[3]])
+        self.assertEqual(latest_call.args[1], UPSERT_LATEST_QUERY)
+        self.assertEqual(latest_call.args[2], [rows[2], rows[3]])
+        mock_conn.commit.assert_called_once()
+
+    @patch('analyzer.storage.execute_values')
+    @patch('analyzer.storage.get_db_connection')
+    def test_failed_store_rolls_back(self, mock_get_db_connection, mock_execute_values):
+        mock_conn = Mock()
+        mock_get_db_connection.return_value = mock_conn
+        mock_execute_values.side_effect = RuntimeError("connection lost")
+
+        with self.assertRaises(RuntimeError):
+            store_analysis_rows([('AAPL', '2024-07-01', 'rsi', [40.0])])
+
+        mock_conn.rollback.assert_called_once()
+        mock_conn.commit.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_anomaly.py
+# deactivate
+
+import unittest
+from unittest.mock import patch, Mock
+import json
+import sys
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.anomaly import AnomalyDetector, EwmaStats
+from analyzer.coalescer import TickerCoalescer
+from analyzer.incremental import MovingAverageEngine
+from analyzer.data_analyzer import ALERT_ROUTING_KEY, callback, publish_alerts
+
+START = datetime(2024, 7, 1, 9, 30)
+
+def bars(closes, volumes, ticker='AAPL', interval='1m'):
+    return [
+        {'ticker': ticker, 'close': close, 'volume': volume, 'interval': interval,
+         'timestamp': (START + timedelta(minutes=i)).isoformat()}
+        for i, (close, volume) in enumerate(zip(closes, volumes))
+    ]
+
+def quiet_bars(count, seed=2):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.cumprod(1 + rng.normal(0, 0.001, count))
+    volumes = rng.integers(900, 1100, count)
+    return closes.tolist(), volumes.tolist()
+
+class AnomalyDetectorTestCase(unittest.TestCase):
+
+    def test_ewma_mean_matches_pandas(self):
+        values = np.random.default_rng(2).normal(0, 1, 100)
+        stats = EwmaStats(0.1)
+        for value in values:
+            stats.update(value)
+
+        self.assertAlmostEqual(stats.mean, pd.Series(values).ewm(alpha=0.1, adjust=False).mean().iloc[-1])
+
+    def test_spike_raises_one_alert(self):
+        closes, volumes = quiet_bars(60)
+        closes.append(closes[-1] * 1.05)
+        volumes.append(20000)
+        detector = AnomalyDetector(alpha=0.05, warmup=20)
+
+        alerts = [alert for alert in map(detector.observe, bars(closes, volumes)) if alert]
+
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]['reasons'], ['return', 'volume'])
+        self.assertEqual(alerts[0]['interval'], '1m')
+        self.assertAlmostEqual(alerts[0]['return'], 0.05)
+        self.assertGreater(alerts[0]['return_z'], 4.0)
+
+    def test_no_alerts_during_warmup(self):
+        closes, volumes = quiet_bars(10)
+        closes.append(closes[-1] * 1.2)
+        volumes.append(50000)
+        detector = AnomalyDetector(warmup=20)
+
+        self.assertFalse(any(map(detector.observe, bars(closes, volumes))))
+
+    def test_cooldown_suppresses_repeated_alerts(self):
+        closes, volumes = quiet_bars(60)
+        for _ in range(3):
+            closes.append(closes[-1] * 1.05)
+            volumes.append(1000)
+        detector = AnomalyDetector(alpha=0.05, warmup=20, cooldown=900)
+
+        alerts = [alert for alert in map(detector.observe, bars(closes, volumes)) if alert]
+
+        self.assertEqual(len(alerts), 1)
+        self.assertGreaterEqual(detector.suppressed, 1)
+
+    def test_daily_records_use_volume_traded_since_the_last_record(self):
+        detector = AnomalyDetector(warmup=0)
+        day = datetime(2024, 7, 1, 10, 0)
+        records = [
+            {'ticker': 'AAPL', 'close': 100.0, 'volume': 1000, 'timestamp': day.isoformat()},
+            {'ticker': 'AAPL', 'close': 100.1, 'volume': 1500, 'timestamp': (day + timedelta(minutes=1)).isoformat()},
+            # Replayed record
+            {'ticker': 'AAPL', 'close': 120.0, 'volume': 9000, 'timestamp': day.isoformat()},
+        ]
+        for record in records:
+            detector.observe(record)
+
+        state = detector._series[('AAPL', '1d')]
+        # The first record of the day is only the base of the second
+        self.assertEqual(state.volumes.count, 1)
+        self.assertEqual(state.volumes.mean, 500)
+        self.assertEqual(state.last_volume, 1500)
+        self.assertEqual(state.last_close, 100.1)
+
+    def test_first_record_of_a_day_is_not_scored(self):
+        detector = AnomalyDetector(alpha=0.05, warmup=20)
+        rng = np.random.default_rng(2)
+        records = []
+        for day, start in enumerate([datetime(2024, 7, 1, 9, 30), datetime(2024, 7, 2, 9, 30)]):
+            close, volume = 100.0 * (1.05 ** day), 1000 * (1 + 50 * day)
+            for minute in range(60):
+                close *= 1 + rng.normal(0, 0.001)
+                volume += int(rng.integers(900, 1100))
+                for interval in ('1d', '1m'):
+                    records.append({'ticker': 'AAPL', 'close': close, 'volume': volume if interval == '1d' else 1000,
+                                    'interval': interval, 'timestamp': (start + timedelta(minutes=minute)).isoformat()})
+
+        alerts = [alert for alert in map(detector.observe, records) if alert]
+
+        # Neither the 5% overnight gap nor the day's opening volume raises an alert
+        self.assertEqual(alerts, [])
+        self.assertEqual(detector._series[('AAPL', '1d')].returns.count, 118)
+
+class AlertPublishingTestCase(unittest.TestCase):
+
+    def test_callback_publishes_alerts(self):
+        detector = Mock()
+        detector.observe.side_effect = [None, {'ticker': 'AAPL', 'timestamp': '2024-07-01T09:31:00',
+                                               'reasons': ['return']}]
+        publisher = Mock()
+        message = json.dumps(bars([100.0, 110.0], [1000, 1000]))
+
+        with patch('analyzer.data_analyzer.detector', detector), \
+                patch('analyzer.data_analyzer._alert_publisher', publisher), \
+                patch('analyzer.data_analyzer.coalescer', TickerCoalescer(300)), \
+                patch('analyzer.data_analyzer.engine', MovingAverageEngine()):
+            callback(Mock(), Mock(), Mock(), message)
+
+        publisher.publish.assert_called_once()
+        self.assertEqual(json.loads(publisher.publish.call_args.args[0])['ticker'], 'AAPL')
+        publisher.commit.assert_called_once()
+
+    @patch('analyzer.data_analyzer.get_rabbitmq_connection')
+    def test_alerts_use_the_alert_routing_key(self, mock_get_rabbitmq_connection):
+        channel = mock_get_rabbitmq_connection.return_value.channel.return_value
+
+        with patch('analyzer.data_analyzer._alert_publisher', None):
+            confirmed = publish_alerts([{'ticker': 'AAPL', 'timestamp': '2024-07-01T09:31:00', 'reasons': ['volume']}])
+
+        self.assertEqual(confirmed, 1)
+        self.assertEqual(channel.basic_publish.call_args.kwargs['routing_key'], ALERT_ROUTING_KEY)
+        channel.tx_commit.assert_called_once()
+
+    def test_failed_publish_drops_alerts(self):
+        publisher = Mock()
+        publisher.commit.side_effect = RuntimeError("broker down")
+        publisher.discard_pending.return_value = 1
+
+        with patch('analyzer.data_analyzer._alert_publisher', publisher):
+            confirmed = publish_alerts([{'ticker': 'AAPL', 'timestamp': '2024-07-01T09:31:00', 'reasons': ['return']}])
+
+        self.assertEqual(confirmed, 0)
+        publisher.discard_pending.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_backfill.py
+# deactivate
+
+import unittest
+from unittest.mock import patch, Mock
+from datetime import date
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from recorder.backfill import (plan_date_chunks, plan_jobs, frame_to_rows, load_chunk, backfill_job, MERGE_QUERY,
+                               yf_shared)
+
+class BackfillTestCase(unittest.TestCase):
+
+    def test_plan_date_chunks_is_stable_across_days(self):
+        chunks = plan_date_chunks(date(2020, 1, 1), date(2021, 1, 1), 100)
+        later = plan_date_chunks(date(2020, 1, 2), date(2021, 1, 2), 100)
+        self.assertEqual(chunks, later)
+        self.assertLessEqual(chunks[0][0], date(2020, 1, 1))
+        self.assertGreaterEqual(chunks[-1][1], date(2021, 1, 1))
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+
+    def test_plan_jobs_skips_completed_chunks(self):
+        chunks = [(date(2020, 1, 1), date(2020, 7, 1)), (date(2020, 7, 1), date(2021, 1, 1))]
+        completed = {('AAPL', date(2020, 1, 1), date(2020, 7, 1))}
+        jobs = plan_jobs(['AAPL', 'MSFT', 'IBM'], chunks, 2, completed)
+        self.assertEqual(jobs, [
+            (['MSFT', 'IBM'], date(2020, 1, 1), date(2020, 7, 1)),
+            (['AAPL', 'MSFT'], date(2020, 7, 1), date(2021, 1, 1)),
+            (['IBM'], date(2020, 7, 1), date(2021, 1, 1)),
+        ])
+
+    def test_frame_to_rows(self):
+        columns = pd.MultiIndex.from_product([['Open', 'High', 'Low', 'Close', 'Volume'], ['AAPL', 'MSFT']])
+        frame = pd.DataFrame([
+            [1.0, 2.0, 1.5, 2.5, 0.5, 1.5, 1.2, 2.2, 100, 200],
+            [1.1, None, 1.6, None, 0.6, None, 1.3, None, 110, None],
+        ], columns=columns, index=pd.to_datetime(['2024-07-01', '2024-07-02']))
+
+        rows = frame_to_rows(frame, ['AAPL', 'MSFT'])
+
+        self.assertEqual(list(rows.columns), ['ticker', 'date', 'open', 'high', 'low', 'close', 'volume'])
+        self.assertEqual(list(zip(rows['ticker'], rows['date'], rows['close'])), [
+            ('AAPL', date(2024, 7, 1), 1.2), ('MSFT', date(2024, 7, 1), 2.2), ('AAPL', date(2024, 7, 2), 1.3)
+        ])
+        self.assertEqual(rows['volume'].tolist(), [100, 200, 110])
+
+    @patch('recorder.backfill.get_db_connection')
+    def test_load_chunk_copies_merges_and_records_progress(self, mock_get_db_connection):
+        mock_conn = Mock()
+        mock_cursor = Mock()
+        mock_get_db_connection.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        rows = pd.DataFrame({'ticker': ['AAPL'], 'date': [date(2024, 7, 1)], 'open': [1.0], 'high': [1.5],
+                             'low': [0.5], 'close': [1.2], 'volume': [100]})
+
+        loaded = load_chunk(rows, ['AAPL', 'MSFT'], date(2024, 1, 1), date(2025, 1, 1))
+
+        self.assertEqual(loaded, 1)
+        copy_sql, buffer = mock_cursor.copy_expert.call_args.args
+        self.assertIn('COPY stock_data_backfill_staging', copy_sql)
+        self.assertEqual(buffer.getvalue(), 'AAPL,2024-07-01,1.0,1.5,0.5,1.2,100\n')
+        executed = [c.args[0] for c in mock_cursor.execute.call_args_list]
+        self.assertIn(MERGE_QUERY, executed)
+        progress_params = mock_cursor.execute.call_args_list[-1].args[1]
+        self.assertEqual(progress_params[0], ['AAPL', 'MSFT'])
+        self.assertEqual(progress_params[3], [1, 0])
+        mock_conn.commit.assert_called_once()
+        mock_conn.close.assert_called_once()
+
+    @patch.object(yf_shared, '_ERRORS', {})
+    @patch('recorder.backfill.load_chunk', return_value=1)
+    @patch('recorder.backfill.yf.download')
+    def test_failed_tickers_are_not_recorded_as_completed(self, mock_download, mock_load_chunk):
+        index = pd.to_datetime(['2020-01-02'])
+        columns = pd.MultiIndex.from_product([['Open', 'High', 'Low', 'Close', 'Volume'], ['AAPL', 'BAD', 'NEW']])
+        frame = pd.DataFrame([[1.0, None, None] * 5], index=index, columns=columns)
+
+        def download(**kwargs):
+            yf_shared._ERRORS = {'BAD': 'No data found, symbol may be delisted'}
+            return frame
+
+        mock_download.side_effect = download
+        backfill_job(['AAPL', 'BAD', 'NEW'], date(2020, 1, 1), date(2021, 1, 1))
+
+        # NEW had no rows but did not fail, e.g. it was not listed yet
+        rows, finished = mock_load_chunk.call_args.args[:2]
+        self.assertEqual(finished, ['AAPL', 'NEW'])
+        self.assertEqual(rows['ticker'].tolist(), ['AAPL'])
+
+    @patch('recorder.backfill.load_chunk', return_value=0)
+    @patch('recorder.backfill.yf.download')
+    def test_concurrent_jobs_never_download_at_the_same_time(self, mock_download, mock_load_chunk):
+        active = []
+        overlaps = []
+        guard = threading.Lock()
+
+        def download(**kwargs):
+            with guard:
+                active.append(1)
+                overlaps.append(len(active))
+            time.sleep(0.01)
+            with guard:
+                active.pop()
+            return pd.DataFrame()
+
+        mock_download.side_effect = download
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda i: backfill_job(['AAPL'], date(2020, 1, 1), date(2021, 1, 1)), range(8)))
+
+        self.assertEqual(mock_download.call_count, 8)
+        self.assertEqual(max(overlaps), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_backtest.py
+# deactivate
+
+import unittest
+from unittest.mock import patch
+import sys
+import os
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.backtest import (RollingMeans, crossover_positions, evaluate, forward_fill, parameter_pairs,
+                               performance, rows_to_close_matrix, run_backtest, run_sweep, strategy_returns,
+                               sweep, window_range)
+
+def random_closes(days=300, tickers=6, seed=5):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (days, tickers)), axis=0))
+
+class BacktestTestCase(unittest.TestCase):
+
+    def test_rows_to_close_matrix_and_forward_fill(self):
+        day = date(2024, 7, 1)
+        rows = [('AAPL', day, 1.0), ('AAPL', day + timedelta(days=2), 3.0),
+                ('MSFT', day + timedelta(days=1), 5.0)]
+
+        symbols, days, matrix = rows_to_close_matrix(rows)
+
+        self.assertEqual(symbols, ['AAPL', 'MSFT'])
+        self.assertEqual(len(days), 3)
+        np.testing.assert_array_equal(forward_fill(matrix), [[1.0, np.nan], [1.0, 5.0], [3.0, 5.0]])
+
+    def test_rolling_means_match_pandas(self):
+        closes = random_closes()
+        closes[:7, 0] = np.nan
+        means = RollingMeans(closes)
+
+        for window in (5, 20):
+            expected = pd.DataFrame(closes).rolling(window).mean().to_numpy()
+            np.testing.assert_allclose(means(window), expected, rtol=1e-9)
+
+    def test_positions_trade_on_the_next_bar(self):
+        closes = np.array([[1.0], [1.0], [1.0], [2.0], [3.0], [3.3]])
+        positions = crossover_positions(RollingMeans(closes), 1, 2)
+        returns, trades, active = strategy_returns(closes, positions)
+
+        np.testing.assert_array_equal(positions[:, 0], [0, 0, 0, 1, 1, 1])
+        # The jump to 2.0 happened before the position was taken; only the later moves are earned
+        np.testing.assert_allclose(returns[:, 0], [0, 0, 0, 0.5, 0.1])
+        self.assertEqual(trades.sum(), 1)
+
+    def test_costs_are_charged_per_trade(self):
+        closes = np.array([[1.0], [1.0], [2.0], [2.0]])
+        positions = np.array([[0.0], [1.0], [0.0], [0.0]])
+
+        returns, trades, _ = strategy_returns(closes, positions, cost_bps=10)
+
+        np.testing.assert_allclose(returns[:, 0], [0.0, 1.0 - 0.001, -0.001])
+
+    def test_performance(self):
+        result = performance(np.array([0.1, -0.5, 0.2]))
+
+        self.assertAlmostEqual(result['total_return'], 1.1 * 0.5 * 1.2 - 1)
+        self.assertAlmostEqual(result['max_drawdown'], -0.5)
+
+    def test_sweep_matches_single_pair_evaluation(self):
+        closes = random_closes()
+        pairs = parameter_pairs([5, 10], [10, 30])
+
+        results = sweep(closes, pairs, cost_bps=5)
+
+        self.assertEqual(pairs, [(5, 10), (5, 30), (10, 30)])
+        self.assertEqual(results[1], evaluate(closes, RollingMeans(closes), 5, 30, cost_bps=5))
+
+    def test_parallel_sweep_matches_serial_sweep(self):
+        closes = random_closes()
+        pairs = parameter_pairs(window_range([2, 10, 4]), window_range([20, 40, 10]))
+
+        self.assertEqual(run_sweep(closes, pairs, 5, workers=2, pairs_per_task=2), sweep(closes, pairs, 5))
+
+    def test_window_range(self):
+        self.assertEqual(window_range([5]), [5])
+        self.assertEqual(window_range([5, 20, 5]), [5, 10, 15, 20])
+
+    @patch('analyzer.backtest.store_backtest')
+    @patch('analyzer.backtest.load_close_matrix')
+    def test_run_backtest_sorts_by_sharpe_and_stores(self, mock_load_close_matrix, mock_store_backtest):
+        closes = random_closes(tickers=3)
+        mock_load_close_matrix.return_value = (['AAPL', 'MSFT', 'NVDA'], list(range(len(closes))), closes)
+        mock_store_backtest.return_value = 7
+
+        report = run_backtest(['AAPL', 'MSFT', 'NVDA'], date(2014, 1, 1), date(2024, 1, 1),
+                              [(5, 10), (5, 20), (10, 20)], workers=1, store=True)
+
+        self.assertEqual(report['run_id'], 7)
+        sharpes = [r['sharpe'] for r in report['results']]
+        self.assertEqual(sharpes, sorted(sharpes, reverse=True))
+        self.assertEqual(mock_store_backtest.call_args.args[2], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_batch_analysis.py
+# deactivate
+
+import unittest
+from unittest.mock import patch
+import sys
+import os
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.batch_analysis import rows_to_matrix, latest_moving_averages, run_batch_analysis, load_closes
+
+def history(ticker, closes):
+    return [(ticker, date(2024, 7, 1) + timedelta(days=i), close) for i, close in enumerate(closes)]
+
+class BatchAnalysisTestCase(unittest.TestCase):
+
+    def test_rows_to_matrix_right_aligns_histories(self):
+        rows = history('AAPL', [1.0, 2.0, 3.0]) + history('MSFT', [4.0])
+
+        symbols, matrix = rows_to_matrix(rows, 3)
+
+        self.assertEqual(symbols, ['AAPL', 'MSFT'])
+        np.testing.assert_array_equal(matrix, [[1.0, 2.0, 3.0], [np.nan, np.nan, 4.0]])
+
+    def test_latest_moving_averages_match_pandas(self):
+        rng = np.random.default_rng(3)
+        closes = {ticker: (100 + rng.standard_normal(n).cumsum()).tolist()
+                  for ticker, n in [('AAPL', 10), ('GOOGL', 7), ('MSFT', 4)]}
+        rows = [row for ticker in sorted(closes) for row in history(ticker, closes[ticker])]
+
+        symbols, matrix = rows_to_matrix(rows, 10)
+        averages = latest_moving_averages(matrix)
+
+        for i, ticker in enumerate(symbols):
+            series = pd.Series(closes[ticker])
+            for window in (5, 10):
+                expected = series.rolling(window=window).mean().iloc[-1]
+                if pd.isna(expected):
+                    self.assertTrue(np.isnan(averages[window][i]))
+                else:
+                    self.assertAlmostEqual(averages[window][i], expected)
+
+    @patch('analyzer.batch_analysis.get_db_connection')
+    def test_load_closes_limits_the_rows_read_per_ticker(self, mock_get_db_connection):
+        cursor = mock_get_db_connection.return_value.cursor.return_value
+
+        load_closes(['AAPL', 'MSFT'], 10)
+
+        query, params = cursor.execute.call_args.args
+        self.assertIn('CROSS JOIN LATERAL', query)
+        self.assertIn('LIMIT %s', query)
+        self.assertNotIn('ROW_NUMBER', query)
+        self.assertEqual(params, (['AAPL', 'MSFT'], 10))
+
+    @patch('analyzer.batch_analysis.store_analysis_rows')
+    @patch('analyzer.batch_analysis.load_closes')
+    def test_run_batch_analysis_uses_one_query_and_insert_per_chunk(self, mock_load_closes, mock_store_results):
+        mock_load_closes.side_effect = lambda tickers, days: [
+            row for ticker in tickers for row in history(ticker, [float(i) for i in range(12)])[-days:]
+        ]
+
+        stats = run_batch_analysis(['AAPL', 'MSFT', 'NVDA'], chunk_size=2)
+
+        self.assertEqual(stats['tickers'], 3)
+        self.assertEqual(mock_load_closes.call_count, 2)
+        self.assertEqual(mock_store_results.call_count, 2)
+        ticker, _, analysis_type, values = mock_store_results.call_args_list[0].args[0][0]
+        self.assertEqual((ticker, analysis_type), ('AAPL', 'moving_average'))
+        self.assertEqual(values, [9.0, 6.5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_coalescer.py
+# deactivate
+
+import unittest
+import sys
+import os
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.coalescer import TickerCoalescer
+
+class TickerCoalescerTestCase(unittest.TestCase):
+
+    def test_at_most_one_analysis_per_interval(self):
+        coalescer = TickerCoalescer(300)
+        coalescer.mark(['AAPL', 'MSFT', 'AAPL'])
+        self.assertEqual(coalescer.due(now=0), ['AAPL', 'MSFT'])
+
+        coalescer.mark(['AAPL'] * 100)
+        self.assertEqual(coalescer.due(now=100), [])
+        self.assertEqual(coalescer.pending(), 1)
+        self.assertEqual(coalescer.due(now=300), ['AAPL'])
+
+    def test_clean_tickers_are_not_analyzed(self):
+        coalescer = TickerCoalescer(300)
+        coalescer.mark(['AAPL'])
+        coalescer.due(now=0)
+
+        self.assertEqual(coalescer.due(now=1000), [])
+
+if __name__ == '__main__':
+    unittest.main()
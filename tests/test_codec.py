@@ -0,0 +1,110 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_codec.py
+# deactivate
+
+import unittest
+import json
+import sys
+import os
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+import numpy as np
+
+from messaging.codec import (encode_messages, decode_message, decode_array, validate_record, RECORD_DTYPE,
+                             RECORD_DTYPES, HEADER, BINARY_MAGIC, BINARY_CONTENT_TYPE, BINARY_VERSION)
+
+RECORDS = [
+    {'ticker': 'AAPL', 'open': 100.25, 'high': 110.5, 'low': 90.0, 'close': 105.75, 'volume': 1000,
+     'timestamp': '2024-07-01T12:00:00.123456'},
+    {'ticker': 'BRK-B', 'open': 400.0, 'high': 410.0, 'low': 395.0, 'close': 405.0, 'volume': 3000000000,
+     'timestamp': '2024-07-01T12:00:01'},
+]
+
+class CodecTestCase(unittest.TestCase):
+
+    def test_binary_round_trip(self):
+        messages = encode_messages(RECORDS)
+        self.assertEqual(len(messages), 1)
+        body, properties = messages[0]
+
+        self.assertEqual(properties.content_type, BINARY_CONTENT_TYPE)
+        self.assertEqual(properties.headers, {'x-format-version': BINARY_VERSION, 'x-record-count': 2})
+        self.assertLess(len(body), len(json.dumps(RECORDS)))
+
+        decoded = decode_message(body, properties)
+        self.assertEqual(decoded[0], RECORDS[0])
+        self.assertEqual(decoded[1]['timestamp'], '2024-07-01T12:00:01.000000')
+        self.assertEqual(decoded[1]['volume'], 3000000000)
+
+        array = decode_array(body)
+        self.assertEqual(array.dtype, RECORD_DTYPE)
+        self.assertEqual(array['close'].tolist(), [105.75, 405.0])
+
+    def test_long_tickers_are_rejected(self):
+        # The ticker columns of the database are VARCHAR(10)
+        record = dict(RECORDS[0], ticker='A' * 11)
+        with self.assertRaises(ValueError):
+            encode_messages([record])
+        with self.assertRaises(ValueError):
+            validate_record(record)
+        self.assertEqual(len(encode_messages([dict(RECORDS[0], ticker='A' * 10)])), 1)
+
+    def test_validate_record(self):
+        validate_record(RECORDS[0])
+        for record in [{'timestamp': RECORDS[0]['timestamp']}, dict(RECORDS[0], timestamp='yesterday'),
+                       {'ticker': 'AAPL'}]:
+            with self.assertRaises(ValueError):
+                validate_record(record)
+
+    def test_version_1_messages_still_decode(self):
+        array = np.zeros(1, dtype=RECORD_DTYPES[1])
+        array['ticker'] = b'ABCDEFGHIJKL'
+        array['close'] = 105.75
+        body = HEADER.pack(BINARY_MAGIC, 1, 1) + array.tobytes()
+
+        (record,) = decode_message(body)
+
+        self.assertEqual(record['ticker'], 'ABCDEFGHIJKL')
+        self.assertEqual(record['close'], 105.75)
+
+    def test_binary_messages_are_split_by_max_records(self):
+        messages = encode_messages(RECORDS * 3, max_records=4)
+        self.assertEqual([p.headers['x-record-count'] for _, p in messages], [4, 2])
+
+    def test_intraday_bars_carry_their_interval(self):
+        bars = [dict(record, interval='1m') for record in RECORDS]
+        messages = encode_messages(RECORDS[:1] + bars)
+        self.assertEqual(len(messages), 2)
+        body, properties = messages[1]
+        self.assertEqual(properties.headers['x-bar-interval'], '1m')
+        self.assertEqual([r['interval'] for r in decode_message(body, properties)], ['1m', '1m'])
+        self.assertNotIn('interval', decode_message(*messages[0])[0])
+
+    def test_records_are_packed_per_partition(self):
+        partitions = {'AAPL': 0, 'BRK-B': 1}
+        messages = encode_messages(RECORDS + RECORDS, partition=partitions.get)
+
+        self.assertEqual([properties.headers['x-partition'] for _, properties in messages], ['0', '1'])
+        for body, properties in messages:
+            tickers = {record['ticker'] for record in decode_message(body, properties)}
+            self.assertEqual(len(tickers), 1)
+
+        (_, properties), _ = encode_messages(RECORDS, wire_format='json', partition=partitions.get)
+        self.assertEqual(properties.headers, {'x-partition': '0'})
+
+    def test_json_is_still_accepted(self):
+        self.assertEqual(decode_message(json.dumps(RECORDS[0]).encode('utf-8')), [RECORDS[0]])
+        self.assertEqual(decode_message(json.dumps(RECORDS)), RECORDS)
+        body, properties = encode_messages(RECORDS, wire_format='json')[0]
+        self.assertEqual(decode_message(body, properties), [RECORDS[0]])
+
+    def test_rejects_unknown_version(self):
+        body, _ = encode_messages(RECORDS)[0]
+        with self.assertRaises(ValueError):
+            decode_array(body[:3] + bytes([BINARY_VERSION + 1]) + body[4:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_correlation.py
+# deactivate
+
+import unittest
+from unittest.mock import patch
+import json
+import sys
+import os
+import tempfile
+from datetime import date, timedelta
+import numpy as np
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.correlation import CorrelationSnapshotCache, RollingCovariance, top_correlated
+
+TICKERS = ['AAPL', 'GOOGL', 'MSFT', 'NVDA', 'TSLA']
+
+def random_returns(days, seed=9):
+    rng = np.random.default_rng(seed)
+    common = rng.normal(0, 0.01, (days, 1))
+    return common * np.array([1.0, 0.8, 0.9, 0.2, -0.5]) + rng.normal(0, 0.005, (days, len(TICKERS)))
+
+class RollingCovarianceTestCase(unittest.TestCase):
+
+    def test_incremental_updates_match_recomputation(self):
+        returns = random_returns(137)
+        rolling = RollingCovariance(TICKERS, window=30, min_periods=10)
+
+        for i, row in enumerate(returns, start=1):
+            rolling.add(row)
+            if i >= 10:
+                window = returns[max(0, i - 30):i]
+                np.testing.assert_allclose(rolling.covariance(), np.cov(window, rowvar=False), atol=1e-12)
+        np.testing.assert_allclose(rolling.correlation(), np.corrcoef(returns[-30:], rowvar=False), atol=1e-9)
+
+    def test_closes_are_committed_per_day(self):
+        rolling = RollingCovariance(['AAPL', 'MSFT'], window=5, min_periods=2)
+        day = date(2024, 7, 1)
+
+        rolling.observe('AAPL', day, 100.0)
+        rolling.observe('MSFT', day, 50.0)
+        # Running bars of the same day only revise the close
+        rolling.observe('AAPL', day + timedelta(days=1), 101.0)
+        rolling.observe('AAPL', day + timedelta(days=1), 110.0)
+        self.assertTrue(rolling.observe('MSFT', day + timedelta(days=2), 60.0))
+        rolling.observe('UNKNOWN', day + timedelta(days=2), 1.0)
+
+        self.assertEqual(rolling.count, 1)
+        # MSFT had no close on the second day, so it carried its close forward
+        np.testing.assert_allclose(rolling.buffer[0], [0.1, 0.0])
+        self.assertEqual(rolling.day, day + timedelta(days=2))
+
+    def test_warm_start_uses_the_latest_window(self):
+        closes = 100 * np.cumprod(1 + random_returns(50), axis=0)
+        rolling = RollingCovariance(TICKERS, window=20, min_periods=5)
+
+        rolling.warm_start(closes)
+
+        window = closes[-21:]
+        np.testing.assert_allclose(rolling.correlation(), np.corrcoef(window[1:] / window[:-1] - 1, rowvar=False),
+                                   atol=1e-9)
+        np.testing.assert_array_equal(rolling.last_closes, closes[-1])
+
+    def test_top_correlated(self):
+        correlation = np.array([[1.0, 0.2, 0.9, np.nan], [0.2, 1.0, 0.1, 0.0],
+                                [0.9, 0.1, 1.0, 0.3], [np.nan, 0.0, 0.3, 1.0]])
+
+        self.assertEqual(top_correlated(correlation, 0, k=5), [(2, 0.9), (1, 0.2)])
+        self.assertEqual(top_correlated(correlation, 3, k=1), [(2, 0.3)])
+
+    def test_snapshot_round_trip_and_cache(self):
+        rolling = RollingCovariance(TICKERS, window=20, min_periods=5)
+        for row in random_returns(33):
+            rolling.add(row)
+        rolling.day = date(2024, 7, 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'correlation.npz')
+            rolling.save(path)
+            restored = RollingCovariance.load(path)
+            np.testing.assert_allclose(restored.correlation(), rolling.correlation(), atol=1e-12)
+            self.assertEqual((restored.head, restored.count, restored.day), (rolling.head, rolling.count, rolling.day))
+
+            cache = CorrelationSnapshotCache(path)
+            self.assertEqual([peer for peer, _ in cache.peers('AAPL', 2)], [peer for peer, _ in rolling.peers('AAPL', 2)])
+            self.assertAlmostEqual(cache.peers('AAPL', 1)[0][1], rolling.peers('AAPL', 1)[0][1])
+            self.assertIsNone(cache.peers('UNKNOWN'))
+
+    def test_cache_without_snapshot(self):
+        cache = CorrelationSnapshotCache('/nonexistent/correlation.npz')
+
+        self.assertEqual(cache.get(), (None, None))
+        self.assertIsNone(cache.peers('AAPL'))
+
+    def test_correlated_peers_endpoint(self):
+        from api.api_server import create_app
+
+        rolling = RollingCovariance(TICKERS, window=20, min_periods=5)
+        for row in random_returns(25):
+            rolling.add(row)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'correlation.npz')
+            rolling.save(path)
+            with patch('api.routes.correlation_cache', CorrelationSnapshotCache(path)):
+                client = create_app().test_client()
+                response = client.get('/api/correlated_peers?ticker=AAPL&k=3')
+                missing = client.get('/api/correlated_peers?ticker=UNKNOWN')
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([peer['ticker'] for peer in data['peers']], [p for p, _ in rolling.peers('AAPL', 3)])
+        self.assertEqual(missing.status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,14 +7,17 @@ import unittest
 from unittest.mock import patch, Mock, MagicMock
 import json
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date
 import sys
 import os
 
 # Add the src directory to sys.path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
-from analyzer.data_analyzer import analyze_stock_data, store_analysis_result, callback
+from analyzer.data_analyzer import (analyze_stock_data, analyze_indicators, store_analysis_result, callback,
+                                    run_due_analyses, warm_start_engine)
+from analyzer.coalescer import TickerCoalescer
+from analyzer.incremental import MovingAverageEngine
 
 class DataAnalyzerTestCase(unittest.TestCase):
     
@@ -51,13 +54,19 @@ class DataAnalyzerTestCase(unittest.TestCase):
         self.assertIsNone(result['ma10'])
 
     @patch('analyzer.data_analyzer.get_db_connection')
-    def test_store_analysis_result(self, mock_get_db_connection):
-        # Mock database connection and cursor
-        mock_conn = Mock()
-        mock_cursor = Mock()
-        mock_get_db_connection.return_value = mock_conn
-        mock_conn.cursor.return_value = mock_cursor
-        
+    def test_failed_query_returns_the_connection(self, mock_get_db_connection):
+        mock_conn = mock_get_db_connection.return_value
+        mock_conn.cursor.return_value.fetchall.side_effect = Exception("canceling statement due to user request")
+
+        with self.assertRaises(Exception):
+            analyze_stock_data('AAPL')
+        with self.assertRaises(Exception):
+            analyze_indicators('AAPL', ['rsi'])
+
+        self.assertEqual(mock_conn.close.call_count, 2)
+
+    @patch('analyzer.data_analyzer.store_analysis_rows')
+    def test_store_analysis_result(self, mock_store_analysis_rows):
         result = {
             'ticker': 'AAPL',
             'analysis_date': '2024-07-01',
@@ -67,19 +76,11 @@ class DataAnalyzerTestCase(unittest.TestCase):
         
         store_analysis_result(result)
         
-        expected_query = """
-    INSERT INTO stock_analysis (ticker, analysis_date, analysis_type, result)
-    VALUES (%s, %s, %s, %s)
-    """
-        mock_cursor.execute.assert_called_once_with(
-            expected_query,
-            (result['ticker'], result['analysis_date'], 'moving_average', json.dumps(result))
-        )
-        mock_conn.commit.assert_called_once()
+        mock_store_analysis_rows.assert_called_once_with([('AAPL', '2024-07-01', 'moving_average', [109.8, None])])
 
     @patch('analyzer.data_analyzer.analyze_stock_data')
-    @patch('analyzer.data_analyzer.store_analysis_result')
-    def test_callback(self, mock_store_analysis_result, mock_analyze_stock_data):
+    @patch('analyzer.data_analyzer.store_analysis_rows')
+    def test_callback(self, mock_store_analysis_rows, mock_analyze_stock_data):
         # Sample message
         sample_message = {
             'ticker': 'AAPL',
@@ -102,10 +103,136 @@ class DataAnalyzerTestCase(unittest.TestCase):
         mock_properties = Mock()
         mock_body = json.dumps(sample_message)
         
-        callback(mock_channel, mock_method, mock_properties, mock_body)
+        with patch('analyzer.data_analyzer.coalescer', TickerCoalescer(300)), \
+                patch('analyzer.data_analyzer.engine', MovingAverageEngine()):
+            # Messages only mark the ticker; the analysis runs once per interval
+            callback(mock_channel, mock_method, mock_properties, mock_body)
+            callback(mock_channel, mock_method, mock_properties, mock_body)
+            mock_analyze_stock_data.assert_not_called()
+            run_due_analyses()
+            callback(mock_channel, mock_method, mock_properties, mock_body)
+            run_due_analyses()
         
         mock_analyze_stock_data.assert_called_once_with('AAPL')
-        mock_store_analysis_result.assert_called_once_with(mock_analysis_result)
+        mock_store_analysis_rows.assert_called_once_with([('AAPL', '2024-07-01', 'moving_average', [109.8, None])])
+
+    @patch('analyzer.data_analyzer.analyze_stock_data', side_effect=Exception("connection reset by peer"))
+    @patch('analyzer.data_analyzer.store_analysis_rows')
+    def test_failed_ticker_does_not_stop_the_analyses(self, mock_store_analysis_rows, mock_analyze_stock_data):
+        engine = MovingAverageEngine()
+        engine.warm_start('MSFT', [(date(2024, 6, day), 100.0 + day) for day in range(20, 29)])
+        coalescer = TickerCoalescer(300)
+
+        with patch('analyzer.data_analyzer.coalescer', coalescer), \
+                patch('analyzer.data_analyzer.engine', engine):
+            coalescer.mark(['AAPL', 'MSFT'])
+            self.assertEqual(run_due_analyses(), 2)
+
+        (rows,) = mock_store_analysis_rows.call_args.args
+        self.assertEqual([row[0] for row in rows], ['MSFT'])
+        # The failed ticker is retried after its interval
+        self.assertEqual(list(coalescer.dirty), ['AAPL'])
+
+    @patch('analyzer.data_analyzer.INDICATOR_TYPES', ['rsi'])
+    @patch('analyzer.data_analyzer.analyze_indicators')
+    @patch('analyzer.data_analyzer.store_analysis_rows')
+    def test_due_tickers_are_stored_in_one_transaction(self, mock_store_analysis_rows, mock_analyze_indicators):
+        engine = MovingAverageEngine()
+        for ticker in ['AAPL', 'MSFT']:
+            engine.warm_start(ticker, [(date(2024, 6, day), 100.0 + day) for day in range(20, 29)])
+        mock_analyze_indicators.side_effect = lambda ticker, names: [
+            {'ticker': ticker, 'analysis_date': '2024-07-01', 'analysis_type': 'rsi', 'rsi14': 55.0}
+        ]
+        coalescer = TickerCoalescer(300)
+
+        with patch('analyzer.data_analyzer.coalescer', coalescer), \
+                patch('analyzer.data_analyzer.engine', engine):
+            coalescer.mark(['AAPL', 'MSFT'])
+            run_due_analyses()
+            mock_store_analysis_rows.assert_called_once()
+            rows = mock_store_analysis_rows.call_args.args[0]
+            self.assertEqual([(row[0], row[2]) for row in rows],
+                             [('AAPL', 'moving_average'), ('AAPL', 'rsi'), ('MSFT', 'moving_average'), ('MSFT', 'rsi')])
+
+            # A failed write retries every due ticker
+            mock_store_analysis_rows.side_effect = Exception("server closed the connection unexpectedly")
+            coalescer.last_run.clear()
+            coalescer.mark(['AAPL', 'MSFT'])
+            run_due_analyses()
+        self.assertEqual(list(coalescer.dirty), ['AAPL', 'MSFT'])
+
+    @patch('analyzer.data_analyzer.get_db_connection')
+    @patch('analyzer.data_analyzer.store_analysis_rows')
+    def test_known_tickers_are_analyzed_without_database_reads(self, mock_store_analysis_rows,
+                                                               mock_get_db_connection):
+        engine = MovingAverageEngine()
+        engine.warm_start('AAPL', [(date(2024, 6, day), 100.0 + day) for day in range(20, 29)])
+        message = json.dumps({'ticker': 'AAPL', 'close': 150.0, 'timestamp': '2024-07-01T12:00:00'})
+
+        with patch('analyzer.data_analyzer.coalescer', TickerCoalescer(300)), \
+                patch('analyzer.data_analyzer.engine', engine):
+            callback(Mock(), Mock(), Mock(), message)
+            run_due_analyses()
+
+        mock_get_db_connection.assert_not_called()
+        (row,) = mock_store_analysis_rows.call_args.args[0]
+        ma5, ma10 = row[3]
+        self.assertAlmostEqual(ma5, (125 + 126 + 127 + 128 + 150) / 5)
+        self.assertAlmostEqual(ma10, (sum(range(120, 129)) + 150) / 10)
+
+    @patch('analyzer.data_analyzer.get_db_connection')
+    def test_warm_start_reads_only_the_newest_rows_per_ticker(self, mock_get_db_connection):
+        mock_cursor = mock_get_db_connection.return_value.cursor.return_value
+        mock_cursor.fetchall.return_value = [('AAPL', date(2024, 6, day), 100.0 + day) for day in range(20, 29)]
+        engine = MovingAverageEngine()
+
+        with patch('analyzer.data_analyzer.engine', engine):
+            warm_start_engine(['AAPL', 'MSFT'])
+
+        query, params = mock_cursor.execute.call_args.args
+        # A LIMIT per ticker instead of numbering every row of its history
+        self.assertIn('CROSS JOIN LATERAL', query)
+        self.assertNotIn('ROW_NUMBER', query)
+        self.assertEqual(params, (['AAPL', 'MSFT'], engine.size))
+        self.assertIn('AAPL', engine)
+
+    @patch('analyzer.data_analyzer.get_db_connection')
+    def test_analyze_indicators(self, mock_get_db_connection):
+        mock_conn = Mock()
+        mock_cursor = Mock()
+        mock_get_db_connection.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        # Newest first, as returned by the query
+        mock_cursor.fetchall.return_value = [
+            (date(2024, 7, day), 100.0, 102.0 + day, 98.0, 100.0 + day, 1000) for day in range(30, 0, -1)
+        ]
+
+        results = analyze_indicators('AAPL', ['rsi', 'bollinger'])
+
+        mock_conn.execute_prepared.assert_called_once_with(mock_cursor, 'analyzer_price_history', ('AAPL', 60))
+        by_type = {result['analysis_type']: result for result in results}
+        self.assertEqual(by_type['rsi']['ticker'], 'AAPL')
+        # Closes only ever rise, so there are no losses
+        self.assertEqual(by_type['rsi']['rsi14'], 100.0)
+        self.assertAlmostEqual(by_type['bollinger']['middle'], 100.0 + sum(range(11, 31)) / 20)
+
+    def test_callback_feeds_daily_closes_to_the_correlations(self):
+        correlations = Mock()
+        correlations.observe.side_effect = [False, True]
+        messages = [
+            {'ticker': 'AAPL', 'close': 150.0, 'timestamp': '2024-07-01T15:59:00'},
+            {'ticker': 'AAPL', 'close': 151.0, 'timestamp': '2024-07-02T09:31:00'},
+        ]
+
+        with patch('analyzer.data_analyzer.coalescer', TickerCoalescer(300)), \
+                patch('analyzer.data_analyzer.engine', MovingAverageEngine()), \
+                patch('analyzer.data_analyzer.correlations', correlations), \
+                patch('analyzer.data_analyzer.correlation_config', {'snapshot_path': 'correlation.npz'}):
+            callback(Mock(), Mock(), Mock(), json.dumps(messages))
+
+        correlations.observe.assert_called_with('AAPL', date(2024, 7, 2), 151.0)
+        # The snapshot is written once the first day is complete
+        correlations.save.assert_called_once_with('correlation.npz')
 
 if __name__ == '__main__':
     unittest.main()
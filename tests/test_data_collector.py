@@ -15,6 +15,8 @@ from unittest.mock import patch, Mock
 sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
 from collector.data_collector import setup_rabbitmq, fetch_stock_data, publish_stock_data, collect_and_publish_stock_data
+from messaging.codec import decode_message, BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE
+from collector.data_collector import get_delta_cache, commit_published, chunk_tickers, fetch_stock_data_batch, collect_and_publish_stock_data_batch
 
 class DataCollectorTestCase(unittest.TestCase):
     
@@ -32,7 +34,32 @@ class DataCollectorTestCase(unittest.TestCase):
         mock_channel.queue_bind.assert_called_once_with(exchange='stockvision_exchange', queue='stock_data_queue', routing_key='stock.data')
         mock_conn.close.assert_called_once()
 
-    @patch('collector.data_collector.yf.Ticker')
+    @patch('collector.data_collector.get_rabbitmq_connection')
+    def test_setup_rabbitmq_with_recorder_workers(self, mock_get_rabbitmq_connection):
+        mock_channel = mock_get_rabbitmq_connection.return_value.channel.return_value
+
+        with patch.dict('collector.data_collector.config', {'data_recorder': {'workers': 4}}):
+            setup_rabbitmq()
+
+        mock_channel.exchange_declare.assert_called_once()
+        mock_channel.queue_declare.assert_not_called()
+        mock_channel.queue_bind.assert_not_called()
+
+    @patch('collector.data_collector._delta_cache', None)
+    @patch('collector.data_collector._publisher', None)
+    @patch('collector.data_collector.get_rabbitmq_connection')
+    def test_messages_carry_a_partition_with_the_default_config(self, mock_get_rabbitmq_connection):
+        mock_channel = mock_get_rabbitmq_connection.return_value.channel.return_value
+        data = {'ticker': 'AAPL', 'close': 105.0, 'timestamp': datetime.now().isoformat()}
+
+        for wire_format in ('binary', 'json'):
+            with patch.dict('collector.data_collector.data_collector_config', {'wire_format': wire_format}):
+                publish_stock_data(dict(data, close=data['close'] + len(wire_format)))
+
+        headers = [c.kwargs['properties'].headers for c in mock_channel.basic_publish.call_args_list]
+        self.assertEqual([h['x-partition'] for h in headers], ['0', '0'])
+
+    @patch('collector.sources.yf.Ticker')
     def test_fetch_stock_data(self, mock_yf_ticker):
         mock_ticker = Mock()
         mock_yf_ticker.return_value = mock_ticker
@@ -65,6 +92,8 @@ class DataCollectorTestCase(unittest.TestCase):
         self.assertEqual(result['volume'], expected_result['volume'])
         self.assertEqual(result['timestamp'][:19], expected_result['timestamp'][:19])  # Compare up to seconds
 
+    @patch('collector.data_collector._delta_cache', None)
+    @patch('collector.data_collector._publisher', None)
     @patch('collector.data_collector.get_rabbitmq_connection')
     def test_publish_stock_data(self, mock_get_rabbitmq_connection):
         mock_conn = Mock()
@@ -82,19 +111,90 @@ class DataCollectorTestCase(unittest.TestCase):
             'timestamp': datetime.now().isoformat()
         }
 
+        publish_stock_data(dict(data, close=104.0))
         publish_stock_data(data)
 
-        message = json.dumps(data)
-        mock_channel.basic_publish.assert_called_once_with(
-            exchange='stockvision_exchange',
-            routing_key='stock.data',
-            body=message
-        )
-        mock_conn.close.assert_called_once()
+        call = mock_channel.basic_publish.call_args
+        self.assertEqual(call.kwargs['exchange'], 'stockvision_exchange')
+        self.assertEqual(call.kwargs['routing_key'], 'stock.data')
+        self.assertEqual(call.kwargs['properties'].content_type, BINARY_CONTENT_TYPE)
+        self.assertEqual(decode_message(call.kwargs['body'], call.kwargs['properties']), [data])
+        # The connection is reused across publishes and each publish is confirmed
+        mock_get_rabbitmq_connection.assert_called_once()
+        self.assertEqual(mock_channel.tx_commit.call_count, 2)
+        mock_conn.close.assert_not_called()
+
+    @patch('collector.data_collector._delta_cache', None)
+    @patch('collector.data_collector._publisher', None)
+    @patch('collector.data_collector.get_rabbitmq_connection')
+    def test_publish_stock_data_suppresses_unchanged_quotes(self, mock_get_rabbitmq_connection):
+        mock_channel = mock_get_rabbitmq_connection.return_value.channel.return_value
+        data = {'ticker': 'AAPL', 'open': 100.0, 'high': 110.0, 'low': 90.0, 'close': 105.0, 'volume': 1000,
+                'timestamp': datetime.now().isoformat()}
+
+        self.assertTrue(publish_stock_data(data))
+        self.assertFalse(publish_stock_data(dict(data, timestamp=datetime.now().isoformat())))
+        self.assertTrue(publish_stock_data(dict(data, volume=1200)))
+
+        self.assertEqual(mock_channel.basic_publish.call_count, 2)
+        self.assertEqual(get_delta_cache().stats(), {'published': 2, 'suppressed': 1, 'tickers': 1})
+
+    @patch('collector.data_collector._delta_cache', None)
+    @patch('collector.data_collector._publisher', None)
+    @patch('collector.data_collector.get_rabbitmq_connection')
+    def test_publish_stock_data_packs_records_into_messages(self, mock_get_rabbitmq_connection):
+        mock_channel = mock_get_rabbitmq_connection.return_value.channel.return_value
+        records = [{'ticker': f'T{i}', 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': i,
+                    'timestamp': '2024-07-01T12:00:00.000000'} for i in range(5)]
+
+        with patch.dict('collector.data_collector.data_collector_config', {'max_records_per_message': 2}):
+            for data in records:
+                publish_stock_data(data, commit=False)
+            self.assertEqual(mock_channel.basic_publish.call_count, 2)
+            # The remaining record is sent by the commit
+            commit_published()
+
+        bodies = [c.kwargs['body'] for c in mock_channel.basic_publish.call_args_list]
+        self.assertEqual(len(bodies), 3)
+        decoded = [record for body in bodies for record in decode_message(body)]
+        self.assertEqual(decoded, records)
+        mock_channel.tx_commit.assert_called_once()
+
+    @patch('collector.data_collector._delta_cache', None)
+    @patch('collector.data_collector._publisher', None)
+    @patch('collector.data_collector.get_rabbitmq_connection')
+    def test_publish_stock_data_skips_invalid_records(self, mock_get_rabbitmq_connection):
+        mock_channel = mock_get_rabbitmq_connection.return_value.channel.return_value
+        good = {'ticker': 'AAPL', 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 10,
+                'timestamp': '2024-07-01T12:00:00.000000'}
+        bad = [dict(good, ticker='ABCDEFGHIJK'), dict(good, timestamp='not a time'), dict(good, ticker=None)]
 
+        with patch.dict('collector.data_collector.data_collector_config', {'max_records_per_message': 2}):
+            results = [publish_stock_data(data, commit=False) for data in bad + [good]]
+            self.assertEqual(commit_published(), 1)
+
+        self.assertEqual(results, [False, False, False, True])
+        (call,) = mock_channel.basic_publish.call_args_list
+        self.assertEqual(decode_message(call.kwargs['body']), [good])
+
+    @patch('collector.data_collector._delta_cache', None)
+    @patch('collector.data_collector._publisher', None)
+    @patch('collector.data_collector.get_rabbitmq_connection')
+    def test_publish_stock_data_json_wire_format(self, mock_get_rabbitmq_connection):
+        mock_channel = mock_get_rabbitmq_connection.return_value.channel.return_value
+        data = {'ticker': 'AAPL', 'close': 105.0, 'timestamp': datetime.now().isoformat()}
+
+        with patch.dict('collector.data_collector.data_collector_config', {'wire_format': 'json'}):
+            publish_stock_data(data)
+
+        call = mock_channel.basic_publish.call_args
+        self.assertEqual(call.kwargs['body'], json.dumps(data))
+        self.assertEqual(call.kwargs['properties'].content_type, JSON_CONTENT_TYPE)
+
+    @patch('collector.data_collector.commit_published')
     @patch('collector.data_collector.fetch_stock_data')
     @patch('collector.data_collector.publish_stock_data')
-    def test_collect_and_publish_stock_data(self, mock_publish_stock_data, mock_fetch_stock_data):
+    def test_collect_and_publish_stock_data(self, mock_publish_stock_data, mock_fetch_stock_data, mock_commit_published):
         mock_fetch_stock_data.return_value = {
             'ticker': 'AAPL',
             'open': 100.0,
@@ -109,6 +209,58 @@ class DataCollectorTestCase(unittest.TestCase):
 
         self.assertTrue(mock_fetch_stock_data.called)
         self.assertTrue(mock_publish_stock_data.called)
+        mock_commit_published.assert_called_once()
+
+    def test_chunk_tickers(self):
+        self.assertEqual(chunk_tickers(['A', 'B', 'C'], 2), [['A', 'B'], ['C']])
+        self.assertEqual(chunk_tickers(['A', 'B', 'C'], 0), [['A', 'B', 'C']])
+
+    @patch('collector.sources.yf.download')
+    def test_fetch_stock_data_batch(self, mock_download):
+        columns = pd.MultiIndex.from_product([['Open', 'High', 'Low', 'Close', 'Volume'], ['AAPL', 'MSFT', 'XXXX']])
+        sample_frame = pd.DataFrame([
+            [100.0, 200.0, None, 110.0, 210.0, None, 90.0, 190.0, None, 105.0, 205.0, None, 1000, 2000, None],
+            [101.0, None, None, 111.0, None, None, 91.0, None, None, 106.0, None, None, 1100, None, None],
+        ], columns=columns, index=[datetime(2024, 7, 1, 9, 30), datetime(2024, 7, 1, 9, 31)])
+        mock_download.return_value = sample_frame
+
+        result = fetch_stock_data_batch(['AAPL', 'MSFT', 'XXXX'])
+
+        mock_download.assert_called_once()
+        self.assertEqual(mock_download.call_args.kwargs['tickers'], ['AAPL', 'MSFT', 'XXXX'])
+        by_ticker = {record['ticker']: record for record in result}
+        self.assertEqual(set(by_ticker), {'AAPL', 'MSFT'})
+        self.assertEqual(by_ticker['AAPL']['close'], 106.0)
+        self.assertEqual(by_ticker['AAPL']['volume'], 1100)
+        self.assertEqual(by_ticker['MSFT']['open'], 200.0)
+        self.assertEqual(by_ticker['MSFT']['volume'], 2000)
+        self.assertIsInstance(by_ticker['MSFT']['volume'], int)
+        json.dumps(result)  # Records must stay JSON serializable
+
+    @patch('collector.sources.yf.download')
+    def test_fetch_stock_data_batch_single_ticker(self, mock_download):
+        mock_download.return_value = pd.DataFrame({
+            'Open': [100.0], 'High': [110.0], 'Low': [90.0], 'Close': [105.0], 'Volume': [1000]
+        }, index=[datetime.now()])
+
+        result = fetch_stock_data_batch(['AAPL'])
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]['ticker'], 'AAPL')
+        self.assertEqual(result[0]['close'], 105.0)
+
+    @patch('collector.data_collector.commit_published')
+    @patch('collector.data_collector.fetch_stock_data_batch')
+    @patch('collector.data_collector.publish_stock_data')
+    def test_collect_and_publish_stock_data_batch(self, mock_publish_stock_data, mock_fetch_stock_data_batch, mock_commit_published):
+        mock_fetch_stock_data_batch.side_effect = lambda tickers: [{'ticker': t, 'close': 1.0} for t in tickers]
+
+        with patch.dict('collector.data_collector.data_collector_config', {'stocks': ['A', 'B', 'C'], 'batch_size': 2}):
+            collect_and_publish_stock_data_batch()
+
+        self.assertEqual(mock_fetch_stock_data_batch.call_count, 2)
+        self.assertEqual(mock_publish_stock_data.call_count, 3)
+        self.assertEqual(mock_commit_published.call_count, 2)
 
 if __name__ == '__main__':
     unittest.main()
@@ -9,17 +9,24 @@ import json
 from datetime import datetime
 import sys
 import os
+import psycopg2
 
 # Add the src directory to sys.path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
-from recorder.data_recorder import get_db_connection, get_rabbitmq_connection, store_stock_data, callback, start_consuming
+from messaging.codec import encode_messages
+from recorder.data_recorder import (
+    get_db_connection, get_rabbitmq_connection, store_stock_data, callback, start_consuming,
+    records_to_rows, store_stock_data_batch, write_records, BatchConsumer
+)
 
 class DataRecorderTestCase(unittest.TestCase):
     
-    @patch('recorder.data_recorder.psycopg2.connect')
+    @patch('db.pool._pool', None)
+    @patch('db.pool.psycopg2.connect')
     def test_get_db_connection(self, mock_connect):
-        get_db_connection()
+        mock_connect.return_value.closed = 0
+        conn = get_db_connection()
         mock_connect.assert_called_once_with(
             host='localhost',
             port=5432,
@@ -27,6 +34,11 @@ class DataRecorderTestCase(unittest.TestCase):
             password='24785699',
             dbname='stock_vision_db'
         )
+        # Closing returns the connection to the pool instead of closing it
+        conn.close()
+        get_db_connection()
+        mock_connect.assert_called_once()
+        mock_connect.return_value.close.assert_not_called()
 
     @patch('recorder.data_recorder.pika.BlockingConnection')
     def test_get_rabbitmq_connection(self, mock_blocking_connection):
@@ -97,9 +109,39 @@ class DataRecorderTestCase(unittest.TestCase):
 
         mock_store_stock_data.assert_called_once_with(expected_data)
 
+    @patch('recorder.data_recorder.store_stock_data_batch')
+    @patch('recorder.data_recorder.store_stock_data')
+    def test_callback_binary_message(self, mock_store_stock_data, mock_store_batch):
+        records = [
+            {'ticker': 'AAPL', 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 10,
+             'timestamp': '2024-07-01T15:30:00'},
+            {'ticker': 'MSFT', 'open': 3.0, 'high': 4.0, 'low': 2.5, 'close': 3.5, 'volume': 20,
+             'timestamp': '2024-07-02T09:30:00'},
+        ]
+        (body, properties), = encode_messages(records)
+
+        callback(Mock(), Mock(), properties, body)
+
+        # The whole message is stored with one batch write, not one upsert per record
+        mock_store_stock_data.assert_not_called()
+        stored, = mock_store_batch.call_args.args
+        self.assertEqual([(d['ticker'], d['close']) for d in stored], [('AAPL', 1.5), ('MSFT', 3.5)])
+
+    @patch('recorder.data_recorder.store_intraday_data')
+    @patch('recorder.data_recorder.store_stock_data')
+    def test_callback_intraday_bars(self, mock_store_stock_data, mock_store_intraday_data):
+        bar = {'ticker': 'AAPL', 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 10,
+               'timestamp': '2024-07-01T09:31:00', 'interval': '1m'}
+
+        callback(Mock(), Mock(), Mock(), json.dumps(bar).encode('utf-8'))
+
+        mock_store_intraday_data.assert_called_once_with(bar)
+        mock_store_stock_data.assert_not_called()
+
+    @patch('recorder.data_recorder.start_maintenance_schedule')
     @patch('recorder.data_recorder.get_rabbitmq_connection')
     @patch('recorder.data_recorder.callback')
-    def test_start_consuming(self, mock_callback, mock_get_rabbitmq_connection):
+    def test_start_consuming(self, mock_callback, mock_get_rabbitmq_connection, mock_start_maintenance_schedule):
         mock_conn = Mock()
         mock_channel = Mock()
         mock_get_rabbitmq_connection.return_value = mock_conn
@@ -116,6 +158,219 @@ class DataRecorderTestCase(unittest.TestCase):
         mock_channel.basic_consume.assert_called_once_with(queue='stock_data_queue', on_message_callback=mock_callback, auto_ack=True)
         mock_channel.start_consuming.assert_called_once()
         mock_conn.close.assert_called_once()
+        mock_start_maintenance_schedule.assert_called_once()
+
+class BatchConsumerTestCase(unittest.TestCase):
+
+    def test_records_to_rows_keeps_last_record_per_key(self):
+        records = [
+            {'ticker': 'AAPL', 'close': 1.0, 'timestamp': '2024-07-01T10:00:00'},
+            {'ticker': 'AAPL', 'close': 2.0, 'timestamp': '2024-07-01T10:01:00'},
+            {'ticker': 'AAPL', 'close': 3.0, 'timestamp': '2024-07-01T09:31:00', 'interval': '1m'},
+            {'ticker': 'MSFT'},
+            {'ticker': 'MSFT', 'timestamp': 'not a time'},
+            {'ticker': 'MSFT', 'timestamp': None},
+            {'close': 4.0, 'timestamp': '2024-07-01T10:00:00'},
+        ]
+
+        daily, intraday = records_to_rows(records)
+
+        self.assertEqual(daily, [('AAPL', '2024-07-01', 0.0, 0.0, 0.0, 2.0, 0)])
+        self.assertEqual(intraday, [('AAPL', '2024-07-01T09:31:00', '1m', 0.0, 0.0, 0.0, 3.0, 0)])
+
+    @patch('recorder.data_recorder.execute_values')
+    @patch('recorder.data_recorder.get_db_connection')
+    def test_store_stock_data_batch_rolls_back_and_raises(self, mock_get_db_connection, mock_execute_values):
+        mock_conn = mock_get_db_connection.return_value
+        mock_execute_values.side_effect = Exception("deadlock detected")
+
+        with self.assertRaises(Exception):
+            store_stock_data_batch([{'ticker': 'AAPL', 'timestamp': '2024-07-01T10:00:00'}])
+
+        mock_conn.rollback.assert_called_once()
+        mock_conn.commit.assert_not_called()
+        mock_conn.close.assert_called_once()
+
+    @patch('recorder.data_recorder.execute_values')
+    @patch('recorder.data_recorder.get_db_connection')
+    def test_store_stock_data_batch_sets_the_write_timeout(self, mock_get_db_connection, mock_execute_values):
+        cursor = mock_get_db_connection.return_value.cursor.return_value
+
+        store_stock_data_batch([{'ticker': 'AAPL', 'timestamp': '2024-07-01T10:00:00'}], timeout_ms=500)
+
+        cursor.execute.assert_called_once_with("SET LOCAL statement_timeout = %s", (500,))
+
+    @patch.dict('recorder.data_recorder.spool_config', {'write_timeout_ms': 250})
+    @patch('recorder.data_recorder.store_stock_data_batch')
+    def test_write_records_spools_when_the_database_lags(self, mock_store_batch):
+        spool = Mock()
+        spool.is_empty.return_value = True
+        mock_store_batch.side_effect = psycopg2.errors.QueryCanceled("canceling statement due to statement timeout")
+        records = [{'ticker': 'AAPL', 'timestamp': '2024-07-01T10:00:00'}]
+
+        self.assertEqual(write_records(records, spool), 0)
+
+        mock_store_batch.assert_called_once_with(records, timeout_ms=250)
+        spool.append.assert_called_once_with(records)
+
+    def _deliveries(self, count):
+        deliveries = []
+        for tag in range(1, count + 1):
+            data = {'ticker': f'T{tag}', 'close': float(tag), 'timestamp': '2024-07-01T10:00:00'}
+            deliveries.append((Mock(delivery_tag=tag), Mock(), json.dumps(data).encode('utf-8')))
+        return deliveries
+
+    @patch('recorder.data_recorder.store_stock_data_batch', return_value=3)
+    def test_batch_is_acked_after_commit(self, mock_store_batch):
+        channel = Mock()
+        # Two messages, an idle wake-up, then a third message
+        channel.consume.return_value = iter(self._deliveries(2) + [(None, None, None)] + self._deliveries(3)[2:])
+        consumer = BatchConsumer(channel, max_rows=10, max_wait_ms=60000)
+
+        consumer.run('stock_data_queue')
+
+        mock_store_batch.assert_called_once()
+        self.assertEqual([r['ticker'] for r in mock_store_batch.call_args.args[0]], ['T1', 'T2', 'T3'])
+        channel.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+
+    @patch('recorder.data_recorder.store_stock_data_batch', return_value=2)
+    def test_batch_flushes_when_full(self, mock_store_batch):
+        channel = Mock()
+        channel.consume.return_value = iter(self._deliveries(3))
+        consumer = BatchConsumer(channel, max_rows=2, max_wait_ms=60000)
+
+        consumer.run('stock_data_queue')
+
+        self.assertEqual(mock_store_batch.call_count, 2)
+        self.assertEqual([c.kwargs['delivery_tag'] for c in channel.basic_ack.call_args_list], [2, 3])
+
+    @patch('recorder.data_recorder.time.sleep')
+    @patch('recorder.data_recorder.store_stock_data_batch', side_effect=psycopg2.OperationalError("connection refused"))
+    def test_failed_batch_is_requeued(self, mock_store_batch, mock_sleep):
+        channel = Mock()
+        channel.consume.return_value = iter(self._deliveries(2))
+        consumer = BatchConsumer(channel, max_rows=10, max_wait_ms=60000)
+
+        consumer.run('stock_data_queue')
+
+        channel.basic_nack.assert_called_once_with(delivery_tag=2, multiple=True, requeue=True)
+        channel.basic_ack.assert_not_called()
+
+    @patch('recorder.data_recorder.aggregate')
+    @patch('recorder.data_recorder.time.sleep')
+    @patch('recorder.data_recorder.store_stock_data_batch')
+    def test_message_that_cannot_be_stored_is_rejected(self, mock_store_batch, mock_sleep, mock_aggregate):
+        def store(records):
+            if any(record['ticker'] == 'T3' for record in records):
+                raise psycopg2.DataError("value too long for type character varying(10)")
+            return len(records)
+
+        mock_store_batch.side_effect = store
+        channel = Mock()
+        channel.consume.return_value = iter(self._deliveries(4))
+        consumer = BatchConsumer(channel, max_rows=10, max_wait_ms=60000)
+
+        consumer.run('stock_data_queue')
+
+        # Only the bad message is dropped; the others are stored and acknowledged
+        channel.basic_nack.assert_called_once_with(delivery_tag=3, requeue=False)
+        self.assertEqual(sorted(c.kwargs['delivery_tag'] for c in channel.basic_ack.call_args_list), [1, 2, 4])
+        aggregated = [r['ticker'] for c in mock_aggregate.call_args_list for r in c.args[0]]
+        self.assertEqual(aggregated, ['T1', 'T2', 'T4'])
+        mock_sleep.assert_not_called()
+
+    @patch('recorder.data_recorder.aggregate')
+    @patch('recorder.data_recorder.time.sleep')
+    @patch('recorder.data_recorder.store_stock_data_batch')
+    def test_transient_error_while_splitting_requeues_the_rest(self, mock_store_batch, mock_sleep, mock_aggregate):
+        mock_store_batch.side_effect = [
+            psycopg2.IntegrityError("no partition of relation found for row"),
+            2,
+            psycopg2.OperationalError("server closed the connection unexpectedly"),
+        ]
+        channel = Mock()
+        consumer = BatchConsumer(channel, max_rows=10, max_wait_ms=60000)
+        for delivery in self._deliveries(4):
+            consumer.add(*delivery)
+
+        self.assertEqual(consumer.flush(), 2)
+
+        self.assertEqual(sorted(c.kwargs['delivery_tag'] for c in channel.basic_ack.call_args_list), [1, 2])
+        self.assertEqual(sorted(c.kwargs['delivery_tag'] for c in channel.basic_nack.call_args_list), [3, 4])
+        for call in channel.basic_nack.call_args_list:
+            self.assertTrue(call.kwargs['requeue'])
+        mock_sleep.assert_called_once()
+
+    @patch('recorder.data_recorder.aggregate')
+    @patch('recorder.data_recorder.time.sleep')
+    @patch('recorder.data_recorder.store_stock_data_batch')
+    def test_only_committed_batches_are_aggregated(self, mock_store_batch, mock_sleep, mock_aggregate):
+        channel = Mock()
+        consumer = BatchConsumer(channel, max_rows=10, max_wait_ms=60000)
+        deliveries = self._deliveries(2)
+
+        # The first attempt fails and the batch is redelivered
+        mock_store_batch.side_effect = [psycopg2.OperationalError("connection refused"), 2]
+        for delivery in deliveries:
+            consumer.add(*delivery)
+        consumer.flush()
+        mock_aggregate.assert_not_called()
+        for delivery in deliveries:
+            consumer.add(*delivery)
+        consumer.flush()
+
+        mock_aggregate.assert_called_once()
+        self.assertEqual([r['ticker'] for r in mock_aggregate.call_args.args[0]], ['T1', 'T2'])
+
+    @patch('recorder.data_recorder.store_stock_data_batch')
+    def test_write_records_spools_while_database_is_down(self, mock_store_batch):
+        spool = Mock()
+        spool.is_empty.return_value = True
+        mock_store_batch.side_effect = psycopg2.OperationalError("connection refused")
+        records = [{'ticker': 'AAPL', 'timestamp': '2024-07-01T10:00:00'}]
+
+        self.assertEqual(write_records(records, spool), 0)
+        spool.append.assert_called_once_with(records)
+
+        # Once records are spooled, new ones queue up behind them to keep their order
+        spool.is_empty.return_value = False
+        mock_store_batch.reset_mock()
+        write_records(records, spool)
+        mock_store_batch.assert_not_called()
+        self.assertEqual(spool.append.call_count, 2)
+
+    @patch('recorder.data_recorder.store_stock_data_batch')
+    def test_write_records_does_not_spool_rejected_records(self, mock_store_batch):
+        spool = Mock()
+        spool.is_empty.return_value = True
+        mock_store_batch.side_effect = psycopg2.DataError("value too long for type character varying(10)")
+
+        with self.assertRaises(psycopg2.DataError):
+            write_records([{'ticker': 'ABCDEFGHIJK', 'timestamp': '2024-07-01T10:00:00'}], spool)
+        spool.append.assert_not_called()
+
+    @patch('recorder.data_recorder.time.sleep')
+    @patch('recorder.data_recorder.store_stock_data_batch', side_effect=psycopg2.OperationalError("connection refused"))
+    def test_spooled_batch_is_acked(self, mock_store_batch, mock_sleep):
+        channel = Mock()
+        channel.consume.return_value = iter(self._deliveries(2))
+        spool = Mock()
+        spool.is_empty.return_value = True
+        consumer = BatchConsumer(channel, max_rows=10, max_wait_ms=60000, spool=spool)
+
+        consumer.run('stock_data_queue')
+
+        spool.append.assert_called_once()
+        channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+
+    def test_undecodable_message_is_rejected(self):
+        channel = Mock()
+        consumer = BatchConsumer(channel)
+
+        consumer.add(Mock(delivery_tag=7), Mock(), b'not json')
+
+        channel.basic_reject.assert_called_once_with(delivery_tag=7, requeue=False)
+        self.assertFalse(consumer.due())
 
 if __name__ == '__main__':
     unittest.main()
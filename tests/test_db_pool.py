@@ -0,0 +1,130 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_db_pool.py
+# deactivate
+
+import gc
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+import psycopg2
+from psycopg2 import extensions
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from db.pool import ConnectionPool, PoolTimeout, register_prepared
+
+def new_connection(*args, **kwargs):
+    conn = Mock(closed=0)
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+@patch('db.pool.psycopg2.connect', side_effect=new_connection)
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def test_connections_are_reused(self, mock_connect):
+        pool = ConnectionPool({}, minconn=1, maxconn=2)
+
+        first = pool.connection()
+        raw = first._conn
+        first.close()
+        first.close()  # Closing twice returns it once
+        second = pool.connection()
+
+        self.assertIs(second._conn, raw)
+        self.assertEqual(mock_connect.call_count, 1)
+        raw.close.assert_not_called()
+
+    def test_open_transaction_is_rolled_back_on_release(self, mock_connect):
+        pool = ConnectionPool({}, minconn=1, maxconn=1)
+        conn = pool.connection()
+        conn._conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+
+        conn.close()
+
+        checked_out = pool.connection()
+        self.assertEqual(checked_out._conn.rollback.call_count, 1)
+
+    def test_broken_idle_connection_is_replaced(self, mock_connect):
+        pool = ConnectionPool({}, minconn=1, maxconn=2, health_check_interval=0)
+        conn = pool.connection()
+        broken = conn._conn
+        conn.close()
+        broken.cursor.return_value.execute.side_effect = psycopg2.OperationalError("server closed the connection")
+
+        replacement = pool.connection()
+
+        self.assertIsNot(replacement._conn, broken)
+        broken.close.assert_called_once()
+
+    def test_checkout_waits_for_a_free_connection(self, mock_connect):
+        pool = ConnectionPool({}, minconn=1, maxconn=1, checkout_timeout=0.01)
+        conn = pool.connection()
+
+        with self.assertRaises(PoolTimeout):
+            pool.connection()
+        conn.close()
+        pool.connection()
+
+    def test_unclosed_connection_is_returned_when_collected(self, mock_connect):
+        pool = ConnectionPool({}, minconn=1, maxconn=1, checkout_timeout=0.01)
+        conn = pool.connection()
+        raw = conn._conn
+
+        del conn
+        gc.collect()
+
+        self.assertIs(pool.connection()._conn, raw)
+
+    def test_statements_are_prepared_once_per_connection(self, mock_connect):
+        register_prepared('test_recent', "SELECT close FROM stock_data WHERE ticker = $1")
+        pool = ConnectionPool({}, minconn=1, maxconn=1)
+
+        for _ in range(2):
+            conn = pool.connection()
+            cursor = conn.cursor()
+            conn.execute_prepared(cursor, 'test_recent', ('AAPL',))
+            conn.close()
+
+        executed = [c.args for c in cursor.execute.call_args_list]
+        self.assertEqual(executed, [
+            ("PREPARE test_recent AS SELECT close FROM stock_data WHERE ticker = $1",),
+            ("EXECUTE test_recent (%s)", ('AAPL',)),
+            ("EXECUTE test_recent (%s)", ('AAPL',)),
+        ])
+
+    def test_idle_connections_are_kept_up_to_maxconn(self, mock_connect):
+        pool = ConnectionPool({}, minconn=1, maxconn=3)
+
+        conns = [pool.connection() for _ in range(3)]
+        raws = [conn._conn for conn in conns]
+        for conn in conns:
+            conn.close()
+        again = [pool.connection() for _ in range(3)]
+
+        self.assertEqual(mock_connect.call_count, 3)
+        self.assertEqual({id(conn._conn) for conn in again}, {id(raw) for raw in raws})
+        for raw in raws:
+            raw.close.assert_not_called()
+
+    def test_replacement_connection_prepares_its_statements_again(self, mock_connect):
+        register_prepared('test_recent', "SELECT close FROM stock_data WHERE ticker = $1")
+        pool = ConnectionPool({}, minconn=1, maxconn=1)
+
+        conn = pool.connection()
+        conn.execute_prepared(conn.cursor(), 'test_recent', ('AAPL',))
+        conn._conn.closed = 1  # Dropped by the server
+        conn.close()
+        del conn
+
+        replacement = pool.connection()
+        cursor = replacement.cursor()
+        replacement.execute_prepared(cursor, 'test_recent', ('AAPL',))
+
+        self.assertEqual(cursor.execute.call_args_list[0].args,
+                         ("PREPARE test_recent AS SELECT close FROM stock_data WHERE ticker = $1",))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_delta_cache.py
+# deactivate
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from collector.delta_cache import LastBarCache
+
+BAR = {'ticker': 'AAPL', 'open': 100.0, 'high': 110.0, 'low': 90.0, 'close': 105.0, 'volume': 1000}
+
+class LastBarCacheTestCase(unittest.TestCase):
+
+    def test_only_confirmed_bars_suppress(self):
+        cache = LastBarCache()
+        self.assertTrue(cache.is_changed(BAR))
+        cache.stage(BAR)
+        self.assertFalse(cache.is_changed(BAR))
+
+        # A failed delivery must not suppress the retry
+        cache.discard()
+        self.assertTrue(cache.is_changed(BAR))
+
+        cache.stage(BAR)
+        cache.confirm()
+        self.assertFalse(cache.is_changed(BAR))
+        self.assertTrue(cache.is_changed(dict(BAR, close=106.0)))
+        self.assertEqual(cache.stats()['published'], 1)
+
+    def test_snapshot_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'state', 'last_bars.json')
+            cache = LastBarCache(snapshot_path=path, snapshot_interval=0)
+            cache.stage(BAR)
+            cache.confirm()
+            self.assertTrue(os.path.exists(path))
+
+            restarted = LastBarCache(snapshot_path=path)
+            self.assertFalse(restarted.is_changed(BAR))
+            self.assertTrue(restarted.is_changed(dict(BAR, volume=1001)))
+
+if __name__ == '__main__':
+    unittest.main()
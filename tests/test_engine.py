@@ -0,0 +1,103 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_engine.py
+# deactivate
+
+import unittest
+import time
+import threading
+import sys
+import os
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from collector.engine import TokenBucket, CollectionEngine
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def test_burst_then_timeout(self):
+        bucket = TokenBucket(rate=1, capacity=2)
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertFalse(bucket.acquire(timeout=0.1))
+
+    def test_refills_over_time(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        self.assertTrue(bucket.acquire(timeout=0))
+        started = time.monotonic()
+        self.assertTrue(bucket.acquire(timeout=1))
+        self.assertGreaterEqual(time.monotonic() - started, 0.01)
+
+class CollectionEngineTestCase(unittest.TestCase):
+
+    def test_results_stream_and_failures_are_retried_then_deferred(self):
+        calls = {}
+        lock = threading.Lock()
+
+        def fetch(ticker):
+            with lock:
+                calls[ticker] = calls.get(ticker, 0) + 1
+            if ticker == 'BAD':
+                raise IOError('upstream error')
+            if ticker == 'FLAKY' and calls[ticker] == 1:
+                raise IOError('transient error')
+            if ticker == 'EMPTY':
+                return None
+            return {'ticker': ticker}
+
+        engine = CollectionEngine(fetch, max_workers=4, request_timeout=1, max_retries=1)
+        results = []
+        stats = engine.run(['AAPL', 'BAD', 'FLAKY', 'EMPTY'], results.append)
+
+        self.assertEqual(sorted(r['ticker'] for r in results), ['AAPL', 'FLAKY'])
+        self.assertEqual(stats['collected'], 2)
+        self.assertEqual(stats['empty'], 1)
+        self.assertEqual(stats['retried'], 2)
+        self.assertEqual(engine.deferred, ['BAD'])
+        self.assertEqual(calls['BAD'], 2)
+
+        # Deferred tickers are fetched first in the next cycle
+        order = []
+        engine.fetch = lambda ticker: order.append(ticker)
+        engine.max_workers = 1
+        engine.run(['AAPL'], results.append)
+        self.assertEqual(order[0], 'BAD')
+        engine.shutdown()
+
+    def test_slow_requests_do_not_hold_the_cycle(self):
+        release = threading.Event()
+
+        def fetch(ticker):
+            if ticker == 'SLOW':
+                release.wait(5)
+            return {'ticker': ticker}
+
+        engine = CollectionEngine(fetch, max_workers=2, request_timeout=0.2, max_retries=0)
+        results = []
+        started = time.monotonic()
+        stats = engine.run(['SLOW', 'AAPL'], results.append)
+        release.set()
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual([r['ticker'] for r in results], ['AAPL'])
+        self.assertEqual(engine.deferred, ['SLOW'])
+        self.assertEqual(stats['deferred'], 1)
+        engine.shutdown()
+
+    def test_rate_limiter_is_applied_per_source(self):
+        engine = CollectionEngine(lambda ticker: {'ticker': ticker}, max_workers=4, request_timeout=0.05,
+                                  max_retries=0, rate_limiters={'yahoo': TokenBucket(rate=1, capacity=2)})
+        results = []
+        engine.run(['A', 'B', 'C'], results.append, source='yahoo')
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(engine.deferred), 1)
+
+        results = []
+        engine.deferred = []
+        engine.run(['A', 'B', 'C'], results.append, source='replay')
+        self.assertEqual(len(results), 3)
+        engine.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
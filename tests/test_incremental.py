@@ -0,0 +1,47 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_incremental.py
+# deactivate
+
+import unittest
+import sys
+import os
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.incremental import MovingAverageEngine
+
+class MovingAverageEngineTestCase(unittest.TestCase):
+
+    def test_parity_with_pandas(self):
+        rng = np.random.default_rng(7)
+        closes = 100 + rng.standard_normal(250).cumsum()
+        days = [date(2024, 1, 1) + timedelta(days=i) for i in range(len(closes))]
+        expected = pd.DataFrame({'close': closes})
+        expected['ma5'] = expected['close'].rolling(window=5).mean()
+        expected['ma10'] = expected['close'].rolling(window=10).mean()
+
+        engine = MovingAverageEngine(windows=(5, 10))
+        engine.warm_start('AAPL', list(zip(days[:30], closes[:30])))
+        for i in range(30, len(closes)):
+            # Intraday revisions of the same day are replaced by the final close
+            engine.update('AAPL', days[i], closes[i] + 5.0)
+            engine.update('AAPL', days[i], closes[i])
+            averages = engine.averages('AAPL')
+            self.assertAlmostEqual(averages['ma5'], expected['ma5'].iloc[i], places=9)
+            self.assertAlmostEqual(averages['ma10'], expected['ma10'].iloc[i], places=9)
+
+    def test_short_history_and_stale_records(self):
+        engine = MovingAverageEngine(windows=(5, 10))
+        engine.warm_start('AAPL', [(date(2024, 7, day), float(day)) for day in range(1, 6)])
+
+        self.assertEqual(engine.averages('AAPL'), {'ma5': 3.0, 'ma10': None})
+        self.assertFalse(engine.update('AAPL', date(2024, 6, 30), 1000.0))
+        self.assertEqual(engine.averages('AAPL')['ma5'], 3.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_indicators.py
+# deactivate
+
+import unittest
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.indicators import INDICATORS, PriceArray, compute, ewm, lookback
+
+def sample_prices(days=300, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(days).cumsum()
+    high = close + rng.uniform(0, 2, days)
+    low = close - rng.uniform(0, 2, days)
+    open = low + (high - low) * rng.uniform(0, 1, days)
+    volume = rng.integers(1000, 100000, days).astype(float)
+    return PriceArray(np.column_stack((open, high, low, close, volume)))
+
+class IndicatorsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.prices = sample_prices()
+        self.frame = pd.DataFrame(self.prices.data, columns=['open', 'high', 'low', 'close', 'volume'])
+
+    def test_ewm_matches_pandas(self):
+        for alpha in (2 / 13, 1 / 14, 0.9):
+            expected = self.frame['close'].ewm(alpha=alpha, adjust=False).mean().to_numpy()
+            np.testing.assert_allclose(ewm(self.prices.close, alpha), expected, rtol=1e-9)
+
+    def test_ewm_skips_leading_nan(self):
+        values = np.array([np.nan, np.nan, 1.0, 2.0, 3.0])
+        expected = pd.Series(values).ewm(alpha=0.5, adjust=False).mean().to_numpy()
+        np.testing.assert_allclose(ewm(values, 0.5), expected)
+
+    def test_indicators_match_pandas(self):
+        close = self.frame['close']
+        change = close.diff()
+        gain = change.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        loss = (-change).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        true_range = pd.concat([
+            self.frame['high'] - self.frame['low'],
+            (self.frame['high'] - close.shift()).abs(),
+            (self.frame['low'] - close.shift()).abs()
+        ], axis=1).max(axis=1)
+        typical = (self.frame['high'] + self.frame['low'] + close) / 3
+        line = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        expected = {
+            'moving_average': {'ma5': close.rolling(5).mean(), 'ma10': close.rolling(10).mean()},
+            'rsi': {'rsi14': 100 - 100 / (1 + gain / loss)},
+            'macd': {'macd': line, 'signal': line.ewm(span=9, adjust=False).mean()},
+            'bollinger': {'upper': close.rolling(20).mean() + 2 * close.rolling(20).std()},
+            'atr': {'atr14': true_range.ewm(alpha=1 / 14, adjust=False).mean()},
+            'vwap': {'vwap20': (typical * self.frame['volume']).rolling(20).sum() / self.frame['volume'].rolling(20).sum()},
+            'volatility': {'volatility20': np.log(close).diff().rolling(20).std() * np.sqrt(252)},
+        }
+
+        results = compute(self.prices, list(expected))
+        for name, outputs in expected.items():
+            for output, series in outputs.items():
+                self.assertAlmostEqual(results[name][output], series.iloc[-1], places=6, msg=f"{name}.{output}")
+
+    def test_short_history_yields_none(self):
+        results = compute(sample_prices(days=5), ['moving_average', 'bollinger', 'vwap'])
+
+        self.assertIsNotNone(results['moving_average']['ma5'])
+        self.assertIsNone(results['moving_average']['ma10'])
+        self.assertIsNone(results['bollinger']['middle'])
+        self.assertIsNone(results['vwap']['vwap20'])
+
+    def test_lookback_covers_every_indicator(self):
+        self.assertEqual(lookback(['moving_average', 'bollinger']), 20)
+        self.assertEqual(lookback(list(INDICATORS)), max(i.lookback for i in INDICATORS.values()))
+
+    def test_columns_are_views(self):
+        self.assertTrue(np.shares_memory(self.prices.close, self.prices.data))
+        self.assertTrue(np.shares_memory(self.prices.volume, self.prices.data))
+
+    def test_from_rows(self):
+        rows = [('2024-07-01', 1.0, 2.0, 0.5, 1.5, 100), ('2024-07-02', 1.5, 2.5, 1.0, 2.0, 200)]
+        prices = PriceArray.from_rows(rows)
+
+        self.assertEqual(len(prices), 2)
+        np.testing.assert_array_equal(prices.close, [1.5, 2.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_parallel_analysis.py
+# deactivate
+
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+import numpy as np
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from analyzer.indicators import PriceArray, compute
+from analyzer.parallel import ParallelAnalyzer, analyze_cube, build_rows, fill_cube, load_price_history
+from analyzer.coalescer import TickerCoalescer
+from analyzer.incremental import MovingAverageEngine
+from analyzer.data_analyzer import run_due_analyses
+
+def sample_rows(tickers, days, seed=3):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for ticker, length in zip(tickers, days):
+        close = 100 + rng.standard_normal(length).cumsum()
+        for c in close:
+            rows.append((ticker, c - 0.5, c + 1.0, c - 1.0, float(c), float(rng.integers(1000, 5000))))
+    return rows
+
+class ParallelAnalysisTestCase(unittest.TestCase):
+
+    def test_fill_cube_right_aligns_history(self):
+        rows = sample_rows(['AAPL', 'MSFT'], [3, 5])
+        cube = np.empty((2, 5, 5))
+
+        symbols = fill_cube(cube, rows)
+
+        self.assertEqual(symbols, ['AAPL', 'MSFT'])
+        self.assertTrue(np.isnan(cube[0, :2]).all())
+        np.testing.assert_array_equal(cube[0, 2:, 3], [row[4] for row in rows[:3]])
+        np.testing.assert_array_equal(cube[1, :, 3], [row[4] for row in rows[3:]])
+
+    @patch('analyzer.parallel.get_db_connection')
+    def test_load_price_history_limits_the_rows_read_per_ticker(self, mock_get_db_connection):
+        cursor = mock_get_db_connection.return_value.cursor.return_value
+
+        load_price_history(['AAPL', 'MSFT'], 60)
+
+        query, params = cursor.execute.call_args.args
+        self.assertIn('CROSS JOIN LATERAL', query)
+        self.assertNotIn('ROW_NUMBER', query)
+        self.assertEqual(params, (['AAPL', 'MSFT'], 60))
+
+    def test_slices_cover_every_ticker(self):
+        analyzer = ParallelAnalyzer(workers=4, tickers_per_task=3)
+
+        self.assertEqual(analyzer.slices(10), [(0, 3), (3, 6), (6, 9), (9, 10)])
+        self.assertEqual(ParallelAnalyzer(workers=4, tickers_per_task=100).slices(8),
+                         [(0, 2), (2, 4), (4, 6), (6, 8)])
+
+    def test_analyze_cube_matches_single_ticker_compute(self):
+        rows = sample_rows(['AAPL', 'MSFT'], [40, 100])
+        cube = np.empty((2, 100, 5))
+        fill_cube(cube, rows)
+
+        results = dict(analyze_cube(cube, 0, 2, ['rsi', 'macd']))
+
+        expected = compute(PriceArray(np.array([row[1:] for row in rows[:40]])), ['rsi', 'macd'])
+        self.assertEqual(results[0], expected)
+
+    def test_worker_processes_match_serial_results(self):
+        tickers = [f'T{i:03d}' for i in range(12)]
+        rows = sample_rows(tickers, [60 + i for i in range(12)])
+        analyzer = ParallelAnalyzer(workers=2, tickers_per_task=4)
+        try:
+            parallel_rows = analyzer.analyze(tickers, ['ema', 'atr'], rows=rows, analysis_date='2024-07-01')
+        finally:
+            analyzer.close()
+
+        cube = np.empty((12, 80, 5))
+        symbols = fill_cube(cube, rows)
+        serial_rows = build_rows(symbols, analyze_cube(cube, 0, 12, ['ema', 'atr']), '2024-07-01')
+        self.assertEqual(parallel_rows, serial_rows)
+        self.assertEqual(len(parallel_rows), 24)
+        self.assertEqual(parallel_rows[0][:3], ('T000', '2024-07-01', 'ema'))
+        self.assertEqual(len(parallel_rows[0][3]), 2)
+
+    @patch('analyzer.data_analyzer.store_analysis_rows')
+    @patch('analyzer.data_analyzer.analyze_indicators')
+    def test_large_due_sets_use_the_process_pool(self, mock_analyze_indicators, mock_store_analysis_rows):
+        engine = MovingAverageEngine()
+        for ticker in ['AAPL', 'MSFT']:
+            engine.warm_start(ticker, [])
+        coalescer = TickerCoalescer(300)
+        coalescer.mark(['AAPL', 'MSFT'])
+        analyzer = Mock()
+        analyzer.analyze.return_value = [('AAPL', '2024-07-01', 'rsi', [55.0])]
+
+        with patch('analyzer.data_analyzer.coalescer', coalescer), \
+                patch('analyzer.data_analyzer.engine', engine), \
+                patch('analyzer.data_analyzer.INDICATOR_TYPES', ['rsi']), \
+                patch('analyzer.data_analyzer.parallel_config', {'workers': 2, 'min_tickers': 2}), \
+                patch('analyzer.data_analyzer._parallel_analyzer', analyzer):
+            run_due_analyses()
+
+        mock_analyze_indicators.assert_not_called()
+        analyzer.analyze.assert_called_once_with(['AAPL', 'MSFT'], ['rsi'])
+        # Moving averages and pool results are written together in one transaction
+        mock_store_analysis_rows.assert_called_once()
+        rows = mock_store_analysis_rows.call_args.args[0]
+        self.assertEqual([(row[0], row[2]) for row in rows],
+                         [('AAPL', 'moving_average'), ('MSFT', 'moving_average'), ('AAPL', 'rsi')])
+
+if __name__ == '__main__':
+    unittest.main()
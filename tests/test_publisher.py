@@ -0,0 +1,76 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_publisher.py
+# deactivate
+
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+from pika.exceptions import AMQPConnectionError
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from collector.publisher import PersistentPublisher
+
+class PersistentPublisherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.connections = []
+
+        def connection_factory():
+            connection = Mock()
+            connection.is_open = True
+            connection.channel.return_value.is_open = True
+            self.connections.append(connection)
+            return connection
+
+        self.publisher = PersistentPublisher(connection_factory, 'stockvision_exchange', 'stock.data')
+
+    def test_publish_batch_uses_one_connection_and_one_commit(self):
+        confirmed = self.publisher.publish_batch(['a', 'b', 'c'])
+
+        self.assertEqual(confirmed, 3)
+        self.assertEqual(len(self.connections), 1)
+        channel = self.connections[0].channel.return_value
+        channel.tx_select.assert_called_once()
+        self.assertEqual(channel.basic_publish.call_count, 3)
+        channel.tx_commit.assert_called_once()
+
+        self.publisher.publish_batch(['d'])
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(channel.tx_commit.call_count, 2)
+
+    def test_reconnects_and_replays_pending_messages(self):
+        self.publisher.publish('a')
+        self.publisher.publish('b')
+        # The broker drops the connection before the cycle is committed
+        self.connections[0].is_open = False
+
+        confirmed = self.publisher.commit()
+
+        self.assertEqual(confirmed, 2)
+        self.assertEqual(len(self.connections), 2)
+        channel = self.connections[1].channel.return_value
+        bodies = [call.kwargs['body'] for call in channel.basic_publish.call_args_list]
+        self.assertEqual(bodies, ['a', 'b'])
+        channel.tx_commit.assert_called_once()
+
+    def test_commit_retries_after_failure(self):
+        self.publisher.publish('a')
+        first_channel = self.connections[0].channel.return_value
+        first_channel.tx_commit.side_effect = AMQPConnectionError('connection lost')
+
+        confirmed = self.publisher.commit()
+
+        self.assertEqual(confirmed, 1)
+        self.assertEqual(len(self.connections), 2)
+        self.connections[1].channel.return_value.basic_publish.assert_called_once()
+
+    def test_commit_without_pending_messages_does_not_connect(self):
+        self.assertEqual(self.publisher.commit(), 0)
+        self.assertEqual(self.connections, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_recorder_workers.py
+# deactivate
+
+import unittest
+from unittest.mock import patch, Mock, call
+import sys
+import os
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from recorder.workers import RecorderSupervisor, setup_worker_queues, run_worker, check_partitions, HASH_EXCHANGE
+from recorder.data_recorder import config
+
+class RecorderWorkersTestCase(unittest.TestCase):
+
+    def test_setup_worker_queues(self):
+        channel = Mock()
+
+        setup_worker_queues(channel, 2)
+
+        channel.exchange_declare.assert_any_call(exchange=HASH_EXCHANGE, exchange_type='x-consistent-hash',
+                                                 durable=True, arguments={'hash-header': 'x-partition'})
+        channel.exchange_bind.assert_called_once_with(destination=HASH_EXCHANGE, source='stockvision_exchange',
+                                                      routing_key='stock.data')
+        channel.queue_bind.assert_has_calls([
+            call(exchange=HASH_EXCHANGE, queue='stock_data_queue.recorder.0', routing_key='1'),
+            call(exchange=HASH_EXCHANGE, queue='stock_data_queue.recorder.1', routing_key='1'),
+        ])
+        # Nobody consumes the single-process queue in worker mode
+        channel.queue_unbind.assert_called_once_with(queue='stock_data_queue', exchange='stockvision_exchange',
+                                                     routing_key='stock.data')
+
+    def test_workers_need_partitioned_messages(self):
+        # The default configuration publishes a single partition
+        with self.assertRaises(ValueError):
+            check_partitions(2, config['data_collector'].get('partitions', 1))
+        check_partitions(1, 1)
+        check_partitions(4, 64)
+
+    @patch('recorder.workers.get_rabbitmq_connection')
+    def test_supervisor_refuses_to_start_with_the_default_partitions(self, mock_get_rabbitmq_connection):
+        supervisor = RecorderSupervisor(2)
+
+        with patch.dict(config['data_collector'], {'partitions': 1}):
+            with self.assertRaises(ValueError):
+                supervisor.run()
+        mock_get_rabbitmq_connection.assert_not_called()
+
+    @patch('recorder.workers.consume_queue')
+    @patch('recorder.workers.get_rabbitmq_connection')
+    def test_run_worker_consumes_its_queue(self, mock_get_rabbitmq_connection, mock_consume_queue):
+        run_worker(3)
+
+        connection = mock_get_rabbitmq_connection.return_value
+        mock_consume_queue.assert_called_once_with(connection, connection.channel.return_value,
+                                                   'stock_data_queue.recorder.3')
+
+    def test_supervisor_restarts_exited_workers_with_backoff(self):
+        context = Mock()
+        context.Process.side_effect = lambda **kwargs: Mock()
+        supervisor = RecorderSupervisor(2, restart_delay=1.0, max_restart_delay=8, context=context)
+
+        supervisor.check(now=0.0)
+        self.assertEqual(context.Process.call_count, 2)
+        self.assertEqual([c.kwargs['args'] for c in context.Process.call_args_list], [(0,), (1,)])
+
+        # Worker 1 crashes right away: it is restarted after 1s, then after 2s
+        supervisor.processes[1].is_alive.return_value = False
+        supervisor.check(now=0.5)
+        self.assertIsNone(supervisor.processes[1])
+        supervisor.check(now=1.0)
+        self.assertEqual(context.Process.call_count, 2)
+        supervisor.check(now=1.5)
+        self.assertEqual(context.Process.call_count, 3)
+
+        supervisor.processes[1].is_alive.return_value = False
+        supervisor.check(now=2.0)
+        self.assertEqual(supervisor.next_start[1], 4.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_rollups.py
+# deactivate
+
+import unittest
+from unittest.mock import patch
+import sys
+import os
+from datetime import datetime
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from recorder.rollups import RollupAggregator, bucket_start
+from recorder import data_recorder
+
+def quote(timestamp, close, volume, ticker='AAPL'):
+    return {'ticker': ticker, 'open': 100.0, 'high': 120.0, 'low': 90.0, 'close': close,
+            'volume': volume, 'timestamp': timestamp}
+
+class RollupAggregatorTestCase(unittest.TestCase):
+
+    def test_bucket_start(self):
+        self.assertEqual(bucket_start(datetime(2024, 7, 1, 9, 37, 12), 300), datetime(2024, 7, 1, 9, 35))
+        self.assertEqual(bucket_start(datetime(2024, 7, 1, 9, 37, 12), 86400), datetime(2024, 7, 1))
+
+    def test_quotes_are_aggregated_into_windows(self):
+        rollups = RollupAggregator(['1m', '5m'])
+        rollups.apply_records([
+            quote('2024-07-01T09:30:05', 101.0, 1000),
+            quote('2024-07-01T09:30:35', 103.0, 1500),
+            quote('2024-07-01T09:30:50', 99.0, 1600),
+            quote('2024-07-01T09:31:10', 100.0, 2000),
+        ])
+
+        rows = rollups.drain()
+
+        # The day's cumulative volume becomes the volume traded in each window
+        self.assertEqual(rows, {'stock_rollup_1m': [('AAPL', datetime(2024, 7, 1, 9, 30), 101.0, 103.0, 99.0, 99.0, 1600)]})
+        self.assertEqual(rollups.windows[('5m', 'AAPL')], [datetime(2024, 7, 1, 9, 30), 101.0, 103.0, 99.0, 100.0, 2000])
+
+    def test_intraday_bars_keep_their_ohlcv(self):
+        rollups = RollupAggregator(['5m'])
+        for minute, (high, low, volume) in enumerate([(2.0, 0.5, 10), (3.0, 1.0, 20)]):
+            rollups.apply({'ticker': 'AAPL', 'open': 1.0 + minute, 'high': high, 'low': low, 'close': 1.5 + minute,
+                           'volume': volume, 'timestamp': f'2024-07-01T09:3{minute}:00', 'interval': '1m'})
+
+        self.assertEqual(rollups.windows[('5m', 'AAPL')], [datetime(2024, 7, 1, 9, 30), 1.0, 3.0, 0.5, 2.5, 30])
+
+    def test_expired_and_late_windows(self):
+        rollups = RollupAggregator(['1m'], grace_seconds=5)
+        rollups.apply(quote('2024-07-01T09:30:05', 101.0, 1000))
+        rollups.close_expired(now=datetime(2024, 7, 1, 9, 31, 4))
+        self.assertEqual(rollups.drain(), {})
+
+        rollups.close_expired(now=datetime(2024, 7, 1, 9, 31, 5))
+        self.assertEqual(len(rollups.drain()['stock_rollup_1m']), 1)
+
+        rollups.apply(quote('2024-07-01T09:32:00', 101.0, 1000))
+        rollups.apply(quote('2024-07-01T09:31:59', 101.0, 1000))
+        self.assertEqual(rollups.late, 1)
+
+    def test_late_record_of_a_closed_window_does_not_reopen_it(self):
+        rollups = RollupAggregator(['1m'], grace_seconds=5)
+        rollups.apply(quote('2024-07-01T09:30:05', 101.0, 1000))
+        rollups.apply(quote('2024-07-01T09:30:30', 102.0, 1500))
+        rollups.close_expired(now=datetime(2024, 7, 1, 9, 31, 5))
+        stored, = rollups.drain()['stock_rollup_1m']
+
+        # The window is gone from memory, but a late record must not start a partial bar over it
+        rollups.apply(quote('2024-07-01T09:30:50', 103.0, 1600))
+        rollups.close_expired(now=datetime(2024, 7, 1, 9, 40))
+
+        self.assertEqual(rollups.drain(), {})
+        self.assertEqual(rollups.late, 1)
+        self.assertEqual(stored[5:], (102.0, 1500))
+
+    @patch('recorder.data_recorder._rollups_flushed', 0.0)
+    @patch('recorder.data_recorder.store_rollups', side_effect=Exception("connection refused"))
+    def test_failed_rollups_are_retried(self, mock_store_rollups):
+        rollups = RollupAggregator(['1m'])
+        with patch('recorder.data_recorder._rollups', rollups):
+            data_recorder.aggregate([quote('2024-07-01T09:30:05', 101.0, 1000),
+                                     quote('2024-07-01T09:31:05', 102.0, 1100)])
+
+        mock_store_rollups.assert_called_once()
+        self.assertEqual(len(rollups.closed['1m']), 2)
+
+if __name__ == '__main__':
+    unittest.main()
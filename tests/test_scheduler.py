@@ -0,0 +1,98 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_scheduler.py
+# deactivate
+
+import unittest
+from unittest import mock
+import os
+import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from apscheduler.schedulers.background import BackgroundScheduler
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from collector.scheduler import (
+    MarketCalendar, AdaptiveScheduler, session_intervals, REGULAR, EXTENDED, CLOSED
+)
+
+NEW_YORK = ZoneInfo('America/New_York')
+
+class MarketCalendarTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.calendar = MarketCalendar(holidays=['2024-07-04'])
+
+    def test_session(self):
+        # Wednesday 2024-07-03
+        self.assertEqual(self.calendar.session(datetime(2024, 7, 3, 10, 0, tzinfo=NEW_YORK)), REGULAR)
+        self.assertEqual(self.calendar.session(datetime(2024, 7, 3, 7, 0, tzinfo=NEW_YORK)), EXTENDED)
+        self.assertEqual(self.calendar.session(datetime(2024, 7, 3, 16, 0, tzinfo=NEW_YORK)), EXTENDED)
+        self.assertEqual(self.calendar.session(datetime(2024, 7, 3, 21, 0, tzinfo=NEW_YORK)), CLOSED)
+
+    def test_weekends_and_holidays_are_closed(self):
+        self.assertEqual(self.calendar.session(datetime(2024, 7, 4, 10, 0, tzinfo=NEW_YORK)), CLOSED)
+        self.assertEqual(self.calendar.session(datetime(2024, 7, 6, 10, 0, tzinfo=NEW_YORK)), CLOSED)
+
+    def test_session_converts_to_exchange_time(self):
+        # 14:00 UTC is 10:00 in New York during daylight saving time
+        moment = datetime(2024, 7, 3, 14, 0, tzinfo=ZoneInfo('UTC'))
+        self.assertEqual(self.calendar.session(moment), REGULAR)
+
+class AdaptiveSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = AdaptiveScheduler(MarketCalendar(), scheduler=BackgroundScheduler(timezone=NEW_YORK))
+        self.func = mock.Mock()
+        self.tickers = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA']
+        self.scheduler.add_job('quotes', self.func, {REGULAR: 60, EXTENDED: 300},
+                               tickers=lambda: self.tickers, slices=2)
+        self.now = datetime(2024, 7, 3, 10, 0, tzinfo=NEW_YORK)
+
+    def test_slices_are_spread_over_the_interval(self):
+        self.scheduler.check_session(self.now)
+
+        jobs = {job.id: job for job in self.scheduler.scheduler.get_jobs()}
+        self.assertEqual(sorted(jobs), ['quotes-0', 'quotes-1'])
+        self.assertEqual(jobs['quotes-0'].trigger.interval.total_seconds(), 60)
+        self.assertEqual((jobs['quotes-1'].trigger.start_date - self.now).total_seconds(), 30)
+
+    def test_slices_collect_interleaved_tickers(self):
+        job = self.scheduler._jobs[0]
+        self.scheduler._run_slice(job, 0)
+        self.scheduler._run_slice(job, 1)
+
+        self.func.assert_has_calls([
+            mock.call(['AAPL', 'GOOGL', 'NVDA']),
+            mock.call(['MSFT', 'AMZN']),
+        ])
+
+    def test_jobs_follow_the_session(self):
+        self.scheduler.check_session(self.now)
+        self.scheduler.check_session(datetime(2024, 7, 3, 17, 0, tzinfo=NEW_YORK))
+        jobs = self.scheduler.scheduler.get_jobs()
+        self.assertEqual([job.trigger.interval.total_seconds() for job in jobs], [300, 300])
+
+        self.assertEqual(self.scheduler.check_session(datetime(2024, 7, 6, 10, 0, tzinfo=NEW_YORK)), CLOSED)
+        self.assertEqual(self.scheduler.scheduler.get_jobs(), [])
+
+    def test_start_runs_every_slice_once_right_away(self):
+        with mock.patch.object(self.scheduler.calendar, 'now', return_value=datetime(2024, 7, 6, 10, 0, tzinfo=NEW_YORK)), \
+                mock.patch.object(self.scheduler.scheduler, 'start'):
+            self.scheduler._jobs[0]['run_at_start'] = True
+            self.scheduler.start()
+
+        # The market is closed, so only the startup runs and the session check are scheduled
+        jobs = {job.id: job for job in self.scheduler.scheduler.get_jobs()}
+        self.assertEqual(sorted(jobs), ['quotes-0-start', 'quotes-1-start', 'session-check'])
+        self.assertEqual(jobs['quotes-1-start'].args[1], 1)
+        self.assertEqual(jobs['quotes-0-start'].trigger.run_date, datetime(2024, 7, 6, 10, 0, tzinfo=NEW_YORK))
+
+    def test_session_intervals(self):
+        intervals = session_intervals({'extended_interval': 300}, 60)
+        self.assertEqual(intervals, {REGULAR: 60, EXTENDED: 300, CLOSED: None})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_schema_manager.py
+# deactivate
+
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+from datetime import date
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from db.schema_manager import (add_months, partition_name, create_partition_sql, create_table_sql,
+                               create_tables, archive_partitions, migrate_table)
+
+class SchemaManagerTestCase(unittest.TestCase):
+
+    def test_add_months_crosses_years(self):
+        self.assertEqual(add_months(date(2024, 11, 15), 2), date(2025, 1, 1))
+        self.assertEqual(add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+
+    def test_create_partition_sql(self):
+        self.assertEqual(partition_name('stock_data', date(2024, 7, 1)), 'stock_data_y2024m07')
+        self.assertEqual(
+            create_partition_sql('stock_data', date(2024, 12, 1)),
+            "CREATE TABLE IF NOT EXISTS stock_data_y2024m12 PARTITION OF stock_data "
+            "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')"
+        )
+
+    def test_covering_index_is_created_on_the_parent(self):
+        statements = create_table_sql('stock_data')
+        self.assertIn("PARTITION BY RANGE (date)", statements[0])
+        # A default partition would keep the planner from scanning the months in order
+        self.assertFalse(any('PARTITION OF' in statement for statement in statements))
+        self.assertEqual(statements[1], "CREATE INDEX IF NOT EXISTS stock_data_ticker_date_covering_idx "
+                                        "ON stock_data (ticker, date DESC) INCLUDE (open, high, low, close, volume)")
+
+    @patch('db.schema_manager.date')
+    def test_create_tables_creates_partitions_ahead(self, mock_date):
+        mock_date.today.return_value = date(2024, 7, 10)
+        mock_date.side_effect = date
+        cursor = Mock()
+
+        count = create_tables(cursor, date(2024, 6, 3), months_ahead=2)
+
+        # June to September for both tables
+        self.assertEqual(count, 8)
+        executed = [c.args[0] for c in cursor.execute.call_args_list]
+        self.assertIn(create_partition_sql('stock_data', date(2024, 9, 1)), executed)
+        self.assertNotIn(create_partition_sql('stock_data', date(2024, 10, 1)), executed)
+
+    @patch('db.schema_manager.date')
+    def test_migrate_table_creates_partitions_ahead(self, mock_date):
+        mock_date.today.return_value = date(2024, 7, 10)
+        mock_date.side_effect = date
+        cursor = Mock()
+        cursor.fetchone.return_value = (date(2024, 5, 20),)
+
+        with patch.dict('db.schema_manager.schema_config', {'months_ahead': 2}):
+            migrate_table(cursor, 'stock_data')
+
+        executed = [c.args[0] for c in cursor.execute.call_args_list]
+        self.assertIn(create_partition_sql('stock_data', date(2024, 5, 1)), executed)
+        self.assertIn(create_partition_sql('stock_data', date(2024, 9, 1)), executed)
+        self.assertFalse(any('stock_data_intraday' in statement for statement in executed))
+
+    @patch('db.schema_manager.date')
+    def test_archive_partitions_detaches_expired_months(self, mock_date):
+        mock_date.today.return_value = date(2024, 7, 10)
+        mock_date.side_effect = date
+        cursor = Mock()
+        cursor.fetchall.return_value = [('stock_data_y2024m05',), ('stock_data_default',),
+                                        ('stock_data_y2024m06',), ('stock_data_y2024m07',)]
+
+        archived = archive_partitions(cursor, 'stock_data', retention_months=2, tablespace='cold')
+
+        self.assertEqual(archived, ['stock_data_y2024m05'])
+        executed = [c.args[0] for c in cursor.execute.call_args_list]
+        self.assertIn("ALTER TABLE stock_data DETACH PARTITION stock_data_y2024m05", executed)
+        self.assertIn("ALTER TABLE stock_data_y2024m05 SET SCHEMA archive", executed)
+        self.assertIn("ALTER TABLE archive.stock_data_y2024m05 SET TABLESPACE cold", executed)
+        self.assertNotIn("ALTER TABLE stock_data DETACH PARTITION stock_data_default", executed)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_sharding.py
+# deactivate
+
+import unittest
+import sys
+import os
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from collector.sharding import jump_consistent_hash, shard_for, select_shard, shard_settings
+
+TICKERS = [f"T{i:04d}" for i in range(3000)]
+
+class ShardingTestCase(unittest.TestCase):
+
+    def test_jump_consistent_hash_is_monotonic(self):
+        for key in (0, 1, 12345, 2**63, 2**64 - 1):
+            self.assertEqual(jump_consistent_hash(key, 1), 0)
+            for buckets in range(1, 50):
+                previous = jump_consistent_hash(key, buckets)
+                current = jump_consistent_hash(key, buckets + 1)
+                self.assertTrue(0 <= current <= buckets)
+                self.assertIn(current, (previous, buckets))
+
+    def test_shards_partition_the_universe(self):
+        shards = [select_shard(TICKERS, index, 4) for index in range(4)]
+        self.assertEqual(sorted(t for shard in shards for t in shard), TICKERS)
+        for shard in shards:
+            self.assertGreater(len(shard), 600)
+            self.assertLess(len(shard), 900)
+
+    def test_rebalancing_only_moves_tickers_to_the_new_shard(self):
+        before = {t: shard_for(t, 4) for t in TICKERS}
+        after = {t: shard_for(t, 5) for t in TICKERS}
+        moved = [t for t in TICKERS if before[t] != after[t]]
+        self.assertTrue(all(after[t] == 4 for t in moved))
+        self.assertLess(len(moved), len(TICKERS) * 0.3)
+
+    def test_shard_settings(self):
+        config = {'shard': {'index': 1, 'count': 3}}
+        self.assertEqual(shard_settings(config, environ={}), (1, 3))
+        self.assertEqual(shard_settings(config, environ={'STOCKVISION_SHARD_INDEX': '2'}), (2, 3))
+        self.assertEqual(shard_settings({}, environ={}), (0, 1))
+        with self.assertRaises(ValueError):
+            select_shard(TICKERS, 3, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_sources.py
+# deactivate
+
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from collector.sources import ReplaySource, YahooFinanceSource, create_source, bars_to_records
+
+class ReplaySourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        pd.DataFrame({
+            'Symbol': ['AAPL', 'MSFT', 'AAPL', 'MSFT'],
+            'Date': ['2024-07-01 09:30:00', '2024-07-01 09:30:00', '2024-07-01 09:31:00', '2024-07-01 09:31:00'],
+            'Open': [100.0, 200.0, 101.0, 201.0],
+            'High': [110.0, 210.0, 111.0, 211.0],
+            'Low': [90.0, 190.0, 91.0, 191.0],
+            'Close': [105.0, 205.0, 106.0, 206.0],
+            'Volume': [1000, 2000, 1100, 2100],
+        }).to_csv(os.path.join(self.tmpdir.name, 'bars.csv'), index=False)
+        self.pattern = os.path.join(self.tmpdir.name, '*.csv')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_stream_replays_groups_in_timestamp_order(self):
+        source = ReplaySource([self.pattern], speedup=0)
+        groups = list(source.stream())
+
+        self.assertEqual(len(groups), 2)
+        self.assertEqual([r['ticker'] for r in groups[0]], ['AAPL', 'MSFT'])
+        self.assertEqual(groups[1][0]['close'], 106.0)
+        self.assertEqual(groups[1][0]['timestamp'], '2024-07-01T09:31:00')
+        self.assertIsInstance(groups[1][0]['volume'], int)
+
+    def test_stream_filters_tickers_and_paces_by_speedup(self):
+        # One minute between the two groups replayed 600x faster takes 0.1s
+        source = ReplaySource([self.pattern], speedup=600)
+        started = time.monotonic()
+        groups = list(source.stream(['MSFT']))
+        elapsed = time.monotonic() - started
+
+        self.assertEqual([[r['ticker'] for r in g] for g in groups], [['MSFT'], ['MSFT']])
+        self.assertGreaterEqual(elapsed, 0.09)
+
+    def test_fetch_batch_advances_the_replay(self):
+        source = ReplaySource([self.pattern])
+        self.assertEqual([r['close'] for r in source.fetch_batch(['AAPL'])], [105.0])
+        self.assertEqual(source.fetch('AAPL')['close'], 105.0)
+        self.assertEqual([r['close'] for r in source.fetch_batch(['AAPL'])], [106.0])
+        self.assertEqual(source.fetch_batch(['AAPL']), [])
+
+    def test_missing_files(self):
+        with self.assertRaises(FileNotFoundError):
+            ReplaySource([os.path.join(self.tmpdir.name, '*.parquet')])
+
+    def test_create_source(self):
+        self.assertIsInstance(create_source({'source': 'yahoo'}), YahooFinanceSource)
+        source = create_source({'source': 'replay', 'replay': {'paths': [self.pattern], 'speedup': 100}})
+        self.assertIsInstance(source, ReplaySource)
+        self.assertEqual(len(source), 4)
+        with self.assertRaises(ValueError):
+            create_source({'source': 'unknown'})
+
+class IntradayBarsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        index = pd.date_range('2024-07-01 09:30', periods=4, freq='1min', tz='America/New_York')
+        self.hist = pd.DataFrame({
+            'Open': [1.0, 2.0, 3.0, 4.0], 'High': [1.5, 2.5, 3.5, 4.5], 'Low': [0.5, 1.5, 2.5, 3.5],
+            'Close': [1.2, 2.2, 3.2, 4.2], 'Volume': [10, 20, 30, 40]
+        }, index=index)
+        self.now = pd.Timestamp('2024-07-01 09:33:30', tz='America/New_York')
+
+    def test_only_completed_bars_newer_than_the_watermark(self):
+        records = bars_to_records(self.hist, 'AAPL', '1m', since='2024-07-01T09:30:00', now=self.now)
+
+        self.assertEqual([r['timestamp'] for r in records], ['2024-07-01T09:31:00', '2024-07-01T09:32:00'])
+        self.assertEqual(records[0]['interval'], '1m')
+        self.assertEqual(records[0]['volume'], 20)
+
+    def test_without_watermark(self):
+        records = bars_to_records(self.hist, 'AAPL', '1m', now=self.now)
+        self.assertEqual(len(records), 3)
+
+    @patch('collector.sources.yf.Ticker')
+    def test_fetch_intraday_requests_only_bars_after_the_watermark(self, mock_ticker):
+        mock_ticker.return_value.history.return_value = self.hist.iloc[:0]
+        since = (pd.Timestamp.now() - pd.Timedelta(hours=1)).floor('min')
+
+        YahooFinanceSource().fetch_intraday('AAPL', '5m', since=since.isoformat())
+
+        kwargs = mock_ticker.return_value.history.call_args.kwargs
+        self.assertEqual(kwargs['start'], (since + pd.Timedelta(minutes=5)).to_pydatetime())
+        self.assertEqual(kwargs['interval'], '5m')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_spool.py
+# deactivate
+
+import unittest
+from unittest.mock import Mock, patch
+import json
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from recorder.spool import DiskSpool
+
+def batch(start, count):
+    return [{'ticker': 'AAPL', 'close': float(i), 'timestamp': f'2024-07-01T10:{i:02d}:00'}
+            for i in range(start, start + count)]
+
+class DiskSpoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, 'stock_data_queue')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_drain_replays_segments_in_order(self):
+        spool = DiskSpool(self.directory, segment_bytes=1, fsync=False)
+        for start in range(0, 9, 3):
+            spool.append(batch(start, 3))
+        self.assertEqual(spool.segments(), 3)
+
+        stored = []
+        replayed = spool.drain(stored.extend, max_records=4)
+
+        self.assertEqual(replayed, 9)
+        self.assertEqual([r['close'] for r in stored], [float(i) for i in range(9)])
+        self.assertTrue(spool.is_empty())
+
+    @patch('recorder.spool.os.fsync')
+    def test_fsync_interval_batches_flushes_to_disk(self, mock_fsync):
+        spool = DiskSpool(self.directory, fsync=True, fsync_interval=3600)
+        for start in range(0, 9, 3):
+            spool.append(batch(start, 3))
+        # Only the first append of the interval waits for the disk
+        self.assertEqual(mock_fsync.call_count, 1)
+
+        spool.close()
+        self.assertEqual(mock_fsync.call_count, 2)
+
+        every = DiskSpool(os.path.join(self.tmpdir.name, 'every'), fsync=True)
+        every.append(batch(0, 1))
+        every.append(batch(1, 1))
+        self.assertEqual(mock_fsync.call_count, 4)
+        every.close()
+
+    def test_failed_drain_keeps_the_segment(self):
+        spool = DiskSpool(self.directory, fsync=False)
+        spool.append(batch(0, 2))
+
+        with self.assertRaises(ConnectionError):
+            spool.drain(Mock(side_effect=ConnectionError("database is down")))
+        self.assertFalse(spool.is_empty())
+
+        # Appends after the drain started go to a new segment behind the sealed one
+        spool.append(batch(2, 1))
+        self.assertEqual(spool.segments(), 2)
+        stored = []
+        spool.drain(stored.extend)
+        self.assertEqual([r['close'] for r in stored], [0.0, 1.0, 2.0])
+
+    def test_record_that_cannot_be_stored_is_quarantined(self):
+        spool = DiskSpool(self.directory, fsync=False)
+        spool.append(batch(0, 3))
+        spool.append(batch(3, 1))
+        stored = []
+
+        def store(records):
+            if any(r['close'] == 1.0 for r in records):
+                raise ValueError("value too long for type character varying(10)")
+            stored.extend(records)
+
+        replayed = spool.drain(store, transient_errors=(ConnectionError,))
+
+        # The bad record no longer holds up the segment or the records behind it
+        self.assertEqual(replayed, 3)
+        self.assertEqual([r['close'] for r in stored], [0.0, 2.0, 3.0])
+        self.assertTrue(spool.is_empty())
+        with open(os.path.join(self.directory, 'quarantine.jsonl')) as quarantine_file:
+            quarantined = [json.loads(line) for line in quarantine_file]
+        self.assertEqual([r['close'] for q in quarantined for r in q['records']], [1.0])
+        self.assertIn('character varying', quarantined[0]['error'])
+
+    def test_spool_survives_a_restart_with_a_torn_line(self):
+        spool = DiskSpool(self.directory, fsync=False)
+        spool.append(batch(0, 2))
+        spool.close()
+        segment = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(segment, 'ab') as segment_file:
+            segment_file.write(b'[{"ticker": "AA')
+
+        restarted = DiskSpool(self.directory, fsync=False)
+        restarted.append(batch(2, 1))
+        stored = []
+        restarted.drain(stored.extend)
+
+        self.assertEqual([r['close'] for r in stored], [0.0, 1.0, 2.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install -r requirements.txt
+# python -m unittest tests/test_watermarks.py
+# deactivate
+
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from collector.watermarks import WatermarkStore
+
+class WatermarkStoreTestCase(unittest.TestCase):
+
+    def test_watermarks_advance_only_when_confirmed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'watermarks.json')
+            watermarks = WatermarkStore(path)
+            self.assertIsNone(watermarks.get('AAPL'))
+
+            watermarks.stage('AAPL', '2024-07-01T09:31:00')
+            watermarks.discard()
+            self.assertIsNone(watermarks.get('AAPL'))
+
+            watermarks.stage('AAPL', '2024-07-01T09:32:00')
+            watermarks.stage('AAPL', '2024-07-01T09:31:00')  # Never moves backwards
+            watermarks.confirm()
+            self.assertEqual(watermarks.get('AAPL'), '2024-07-01T09:32:00')
+
+            self.assertEqual(WatermarkStore(path).get('AAPL'), '2024-07-01T09:32:00')
+
+if __name__ == '__main__':
+    unittest.main()